@@ -0,0 +1,232 @@
+"""Regression gate for the engine stages.
+
+Runs the pipeline.json stage graph on a fixed synthetic month, offline (trip_data and
+location_data are stubbed like tests/test_main_pipeline.py), and compares the wall time
+and peak traced memory of every stage with benchmarks/baseline.json. Exits 1 with a diff
+table when a stage regresses past the tolerance. Timings are scaled by a fixed reference
+workload timed in the same run, so a slower or busier host does not read as a regression.
+Usage: ``python -m benchmarks.stages [--rows 200000] [--repeat 5] [--update]``
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+SEED = 20250101
+# Relative slack before a stage counts as regressed, and absolute floors below which
+# differences are noise (tiny stages jitter by milliseconds)
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+MIN_SECONDS = 0.02
+MIN_MB = 1.0
+# Upper bound of each synthetic fee in cents
+FEE_CENTS_MAX = {'fare_amount': 6000, 'extra': 350, 'mta_tax': 50, 'tip_amount': 1500, 'tolls_amount': 700,
+                 'improvement_surcharge': 100, 'total_amount': 9000, 'congestion_surcharge': 250,
+                 'Airport_fee': 175, 'cbd_congestion_fee': 75}
+
+def synthetic_trips(rows, seed=SEED, fee_cents=False):
+    """A fixed yellow-taxi month (January 2025) as trip_data returns it"""
+    import numpy as np
+    import pandas as pd
+    from engine.schema import conform_to_schema
+    rng = np.random.default_rng(seed)
+    pickup = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 31 * 86400, rows), unit='s')
+    raw = pd.DataFrame({
+        'VendorID': rng.choice([1, 2, 6, 7], rows).astype('int32'),
+        'tpep_pickup_datetime': pickup,
+        # Mostly plausible trips, plus some the cleaner has to drop
+        'tpep_dropoff_datetime': pickup + pd.to_timedelta(rng.integers(30, 12000, rows), unit='s'),
+        'passenger_count': rng.choice([1.0, 2.0, 3.0, np.nan], rows),
+        'trip_distance': rng.gamma(2.0, 1.6, rows).round(2),
+        'RatecodeID': rng.choice([1.0, 2.0, 3.0, 5.0, 99.0], rows),
+        'store_and_fwd_flag': rng.choice(['Y', 'N'], rows),
+        'PULocationID': rng.integers(1, 266, rows).astype('int32'),
+        'DOLocationID': rng.integers(1, 266, rows).astype('int32'),
+        'payment_type': rng.choice([0, 1, 2, 3, 4], rows),
+        # Fees in whole cents, a few negative ones for clean_negative_fees
+        **{column: rng.integers(-5, high, rows) / 100 for column, high in FEE_CENTS_MAX.items()}
+    })
+    return conform_to_schema(raw, 'yellow', fee_cents)
+
+def synthetic_zones():
+    import pandas as pd
+    return pd.DataFrame({'location_id': range(1, 266), 'zone': [f'Zone {i}' for i in range(1, 266)],
+                         'borough': 'Manhattan', 'service_zone': 'Yellow Zone'})
+
+def calibrate(rows=200000, seed=SEED):
+    """Seconds of a fixed pandas/NumPy workload (sort, groupby, Parquet round trip), the host speed unit"""
+    import io
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({'key': rng.integers(0, 1000, rows), 'value': rng.random(rows)})
+    start = time.perf_counter()
+    frame.sort_values('value').groupby('key')['value'].agg(['sum', 'max'])
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, engine='pyarrow', index=False)
+    pd.read_parquet(io.BytesIO(buffer.getvalue()))
+    return time.perf_counter() - start
+
+def run_pipeline(trips, zones, config, trace_memory=False):
+    """One pass over the stage graph in a scratch base_dir: {stage: seconds} or {stage: peak MB}.
+
+    Stages run one at a time so each measurement belongs to a single stage. Memory is the
+    tracemalloc peak above the stage's starting point (Python and NumPy allocations; Arrow
+    buffers are not traced), measured in its own pass because tracing slows stages down.
+    """
+    import main
+    from engine.runner import run_stages
+    main._load_stages()
+    peaks = {}
+
+    def resolve(fn_name):
+        fn = main._resolve_stage(fn_name)
+        if not trace_memory:
+            return fn
+        def traced(*args, **kwargs):
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                peaks[fn_name] = (tracemalloc.get_traced_memory()[1] - start) / 1024 ** 2
+        return traced
+
+    base_dir = tempfile.mkdtemp(prefix='stage_bench_')
+    stages = [stage for stage in config['stages'] if stage.get('enabled', True)]
+    names = {stage['fn']: stage['name'] for stage in stages}
+    variables = {'base_dir': base_dir, 'append_mode': config['append_mode'], 'strict_quality': False,
+                 'fee_cents': config['fee_cents'], 'exports': config['exports'], 'period': 'yellow_tripdata_2025-01'}
+    # No network: the loaders hand out the synthetic month, a fresh copy per pass
+    with patch('main.trip_data', side_effect=lambda url, **kwargs: trips.copy()), \
+         patch('main.location_data', side_effect=lambda: zones.copy()):
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            result = run_stages(stages, resolve=resolve, seeds={'url': 'synthetic',
+                                                               'fname': 'yellow_tripdata_2025-01.parquet'},
+                                variables=variables, max_workers=1)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            shutil.rmtree(base_dir, ignore_errors=True)
+    if trace_memory:
+        return {names[fn_name]: peak for fn_name, peak in peaks.items()}
+    return result['timings']
+
+def measure(rows, repeat=5, config_path=None):
+    """Fastest seconds and peak MB per stage over repeat timed passes and one traced pass.
+
+    The minimum is the least noisy estimate of a stage's cost: slower passes only add
+    scheduler and cache interference. The reference workload is timed before every pass.
+    """
+    from engine.config import load_config
+    config = load_config(config_path)
+    trips, zones = synthetic_trips(rows, fee_cents=config['fee_cents']), synthetic_zones()
+    # Warm-up pass: first-call costs (imports, holiday calendars) are not stage costs
+    run_pipeline(trips, zones, config)
+    timings, calibration = [], []
+    for _ in range(repeat):
+        calibration.append(calibrate())
+        timings.append(run_pipeline(trips, zones, config))
+    peaks = run_pipeline(trips, zones, config, trace_memory=True)
+    return {'rows': rows, 'calibration_seconds': round(min(calibration), 4), 'stages': {name: {'seconds': round(min(run[name] for run in timings), 4),
+                                            'peak_mb': round(peaks.get(name, 0.0), 2)}
+                                     for name in timings[0]}}
+
+def host_speed(baseline, current):
+    """How much slower this host ran the reference workload than the baseline's (1.0 when unknown)"""
+    before, after = baseline.get('calibration_seconds'), current.get('calibration_seconds')
+    return after / before if before and after else 1.0
+
+def compare(baseline, current, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """Rows of (stage, metric, baseline, current, change, status); status is ok, REGRESSED, improved, new or missing.
+
+    Current seconds are divided by host_speed, so they are in the baseline host's time.
+    """
+    rows = []
+    speed = host_speed(baseline, current)
+    stages = list(baseline['stages']) + [name for name in current['stages'] if name not in baseline['stages']]
+    for name in stages:
+        before, after = baseline['stages'].get(name), current['stages'].get(name)
+        for metric, tolerance, floor in (('seconds', time_tolerance, MIN_SECONDS), ('peak_mb', memory_tolerance, MIN_MB)):
+            if before is None or after is None:
+                value = before[metric] if before else after[metric]
+                rows.append((name, metric, before and value, after and value, None, 'missing' if after is None else 'new'))
+                continue
+            old, new = before[metric], after[metric]
+            if metric == 'seconds':
+                new = round(new / speed, 4)
+            change = (new - old) / old if old else None
+            if new - old > max(old * tolerance, floor):
+                status = 'REGRESSED'
+            elif old - new > max(old * tolerance, floor):
+                status = 'improved'
+            else:
+                status = 'ok'
+            rows.append((name, metric, old, new, change, status))
+    return rows
+
+def format_diff(rows):
+    lines = [f"{'stage':<18} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}  status"]
+    for name, metric, old, new, change, status in rows:
+        old = '-' if old is None else f'{old:.3f}'
+        new = '-' if new is None else f'{new:.3f}'
+        change = '' if change is None else f'{change:+.0%}'
+        lines.append(f"{name:<18} {metric:<8} {old:>10} {new:>10} {change:>8}  {status}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=None, help="synthetic trips (default: the baseline's, else 200000)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--config', default=None, help="stage graph to benchmark (default pipeline.json)")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument('--update', action='store_true', help="write the measurements as the new baseline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    rows = args.rows or (baseline or {}).get('rows', 200000)
+    # Stage logs would bury the diff; warnings and errors still come through
+    logging.disable(logging.INFO)
+    start = time.perf_counter()
+    current = measure(rows, repeat=args.repeat, config_path=args.config)
+    print(f"Benchmarked {len(current['stages'])} stages on {rows:,} synthetic trips "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    if args.update or baseline is None:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline.get('rows') != rows:
+        print(f"Baseline was measured on {baseline.get('rows'):,} trips, not {rows:,}: re-run with --update")
+        return 2
+    speed = host_speed(baseline, current)
+    if speed != 1.0:
+        print(f"Host ran the reference workload {speed:.2f}x the baseline's time, current seconds are scaled by it")
+    diff = compare(baseline, current, args.time_tolerance, args.memory_tolerance)
+    print(format_diff(diff))
+    regressed = sorted({row[0] for row in diff if row[5] == 'REGRESSED'})
+    if regressed:
+        print(f"Regressed: {', '.join(regressed)}")
+        return 1
+    print("No stage regressed")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Cold-start benchmark for the pipeline entry point.
+
+Runs the "no new files" path in fresh interpreters with ``python -X importtime``
+and reports wall time, the slowest imports, and whether heavy dependencies were
+loaded. Usage: ``python -m benchmarks.startup_time [--runs 5] [--top 10]``
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'pyarrow', 'numpy', 'holidays']
+
+# Discovery is stubbed so the benchmark runs offline and measures only startup cost
+NOOP_RUN = """
+import sys
+import main
+main.get_all_new_tripdata_urls = lambda: []
+main.main()
+print('HEAVY:' + ','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+def parse_importtime(stderr):
+    """Cumulative microseconds per top-level import from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        # Nested imports are indented by two extra spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            totals[name.strip()] = int(parts[1])
+    return totals
+
+def run_once(python=sys.executable):
+    start = time.perf_counter()
+    proc = subprocess.run([python, '-X', 'importtime', '-c', NOOP_RUN.format(heavy=HEAVY_MODULES)],
+                          cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    heavy = [line for line in proc.stdout.splitlines() if line.startswith('HEAVY:')]
+    heavy = heavy[-1][len('HEAVY:'):].split(',') if heavy and heavy[-1] != 'HEAVY:' else []
+    return elapsed, parse_importtime(proc.stderr), heavy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    timings, imports, heavy = [], {}, []
+    for _ in range(args.runs):
+        elapsed, imports, heavy = run_once()
+        timings.append(elapsed)
+
+    print(f"No-op pipeline run: median {statistics.median(timings) * 1000:.0f} ms "
+          f"(min {min(timings) * 1000:.0f} ms, {args.runs} runs)")
+    print(f"Heavy modules imported: {', '.join(heavy) if heavy else 'none'}")
+    print(f"Top {args.top} top-level imports (cumulative):")
+    for name, micros in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+    return 1 if heavy else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,310 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+import numpy as np
 from engine.logger_config import setup_logger, log_execution_time
+from engine.schema import to_dollars
 
 logger = setup_logger('checker')
 
-# Check for missing foreign keys
-@log_execution_time
-def key_validator(trip_fact):
-    logger.info("🔍 Data Quality Check - Missing Foreign Keys:")
-    
-    quality_checks = {
-        'vendor_key': trip_fact['vendor_key'].isnull().sum(),
-        'ratecode_key': trip_fact['ratecode_key'].isnull().sum(),
-        'payment_key': trip_fact['payment_key'].isnull().sum(),
-        'distance_key': trip_fact['distance_key'].isnull().sum(),
-        'pickup_location_key': trip_fact['pickup_location_key'].isnull().sum(),
-        'dropoff_location_key': trip_fact['dropoff_location_key'].isnull().sum(),
-        'datetime_key': trip_fact['datetime_key'].isnull().sum()
+# Foreign key in trip_fact -> (dimension name, key column in that dimension)
+DIMENSION_KEYS = {
+    'vendor_key': ('vendor_dim', 'vendor_key'),
+    'ratecode_key': ('ratecode_dim', 'ratecode_key'),
+    'payment_key': ('payment_dim', 'payment_key'),
+    'distance_key': ('distance_dim', 'distance_key'),
+    'pickup_location_key': ('location_dim', 'location_key'),
+    'dropoff_location_key': ('location_dim', 'location_key'),
+    'datetime_key': ('datetime_dim', 'datetime_key')
+}
+KEY_COLUMNS = list(DIMENSION_KEYS)
+
+# Plausible upper bounds for fee columns, values above are reported as warnings
+FEE_RANGES = {
+    'fare_amount': (0, 1000),
+    'extra': (0, 50),
+    'mta_tax': (0, 10),
+    'tip_amount': (0, 500),
+    'tolls_amount': (0, 200),
+    'improvement_surcharge': (0, 10),
+    'total_amount': (0, 2000),
+    'congestion_surcharge': (0, 10),
+    'airport_fee': (0, 10),
+    'cbd_congestion_fee': (0, 10)
+}
+FEE_GROUP_SIZE = 3
+
+# Sampled quality mode (PIPELINE_QUALITY_MODE=sampled)
+QUALITY_MODE = os.environ.get('PIPELINE_QUALITY_MODE', 'exhaustive')
+SAMPLE_SIZE = 100_000
+SAMPLE_CONFIDENCE = 0.99
+# Upper confidence bound on a violation rate above which the exhaustive check runs
+SAMPLE_RATE_THRESHOLD = 1e-4
+SAMPLE_STRATA = 'vendor_key'
+
+# Month-over-month drift: fixed histogram bins so summaries stay comparable
+DRIFT_BINS = [0, 1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200, np.inf]
+DRIFT_PSI_THRESHOLD = 0.2
+SUMMARY_DIR = os.path.join('quality', 'summaries')
+
+# Orphan checks use a bitmap over the batch's key range while it spans at most this many
+# entries per key checked (or BITMAP_MIN_SPAN), binary search otherwise
+BITMAP_SPAN_FACTOR = 4
+BITMAP_MIN_SPAN = 1 << 16
+
+def _null_counts(trip_fact, columns):
+    # One vectorized pass over all key columns instead of one .isnull().sum() per key
+    return {col: int(count) for col, count in trip_fact[columns].isna().sum().items()}
+
+def _orphan_count(values, dim_keys):
+    """Non-null foreign keys that do not exist in the dimension"""
+    values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if len(values) == 0:
+        return 0
+    values = values.astype(np.int64)
+    dim_keys = dim_keys[~np.isnan(dim_keys)] if dim_keys.dtype.kind == 'f' else dim_keys
+    dim_keys = dim_keys.astype(np.int64)
+    if len(dim_keys) == 0:
+        return len(values)
+    # Keys keep growing across months, so the bitmap only spans the range of this batch's keys
+    low, high = int(values.min()), int(values.max())
+    span = high - low + 1
+    if span <= max(BITMAP_MIN_SPAN, BITMAP_SPAN_FACTOR * len(values)):
+        # A month's surrogate keys are a dense range, a bitmap beats hashing
+        present = np.zeros(span, dtype=bool)
+        in_range = dim_keys[(dim_keys >= low) & (dim_keys <= high)]
+        present[in_range - low] = True
+        return int((~present[values - low]).sum())
+    # Sparse keys (or a stray huge value): binary search in the sorted dimension keys
+    dim_keys = np.unique(dim_keys)
+    positions = np.minimum(np.searchsorted(dim_keys, values), len(dim_keys) - 1)
+    return int((dim_keys[positions] != values).sum())
+
+def _fee_profile(trip_fact, columns, fee_ranges):
+    profile = {}
+    for col in columns:
+        # Ranges are in dollars, cent columns are scaled back before comparing
+        values = to_dollars(trip_fact[col])
+        low, high = fee_ranges.get(col, (0, np.inf))
+        valid = values[~np.isnan(values)]
+        profile[col] = {
+            'nulls': int(len(values) - len(valid)),
+            'min': float(valid.min()) if len(valid) else None,
+            'max': float(valid.max()) if len(valid) else None,
+            'mean': float(valid.mean()) if len(valid) else None,
+            'std': float(valid.std()) if len(valid) else None,
+            'p50': float(np.percentile(valid, 50)) if len(valid) else None,
+            'p99': float(np.percentile(valid, 99)) if len(valid) else None,
+            'below_range': int((valid < low).sum()),
+            'above_range': int((valid > high).sum())
+        }
+    return profile
+
+def quality_report(trip_fact, dimensions=None, fee_ranges=None, max_workers=None):
+    """Null, referential-integrity and fee range checks, column groups run in parallel threads"""
+    dimensions = dimensions or {}
+    fee_ranges = fee_ranges or FEE_RANGES
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    key_columns = [col for col in KEY_COLUMNS if col in trip_fact.columns]
+    fee_columns = [col for col in fee_ranges if col in trip_fact.columns]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # NumPy releases the GIL in the reductions below, so the groups overlap
+        null_future = pool.submit(_null_counts, trip_fact, key_columns)
+        orphan_futures = {}
+        for col in key_columns:
+            dim_name, dim_key = DIMENSION_KEYS[col]
+            dim = dimensions.get(dim_name)
+            if dim is not None and dim_key in dim.columns:
+                orphan_futures[col] = pool.submit(_orphan_count, trip_fact[col].to_numpy(),
+                                                  dim[dim_key].to_numpy())
+        fee_futures = [pool.submit(_fee_profile, trip_fact, fee_columns[i:i + FEE_GROUP_SIZE], fee_ranges)
+                       for i in range(0, len(fee_columns), FEE_GROUP_SIZE)]
+
+        null_keys = null_future.result()
+        orphans = {col: future.result() for col, future in orphan_futures.items()}
+        fees = {}
+        for future in fee_futures:
+            fees.update(future.result())
+
+    failures = [f"{col}: {count:,} missing values" for col, count in null_keys.items() if count]
+    failures += [f"{col}: {count:,} keys not found in {DIMENSION_KEYS[col][0]}" for col, count in orphans.items() if count]
+    failures += [f"{col}: {stats['below_range']:,} values below {fee_ranges[col][0]}" for col, stats in fees.items() if stats['below_range']]
+    warnings = [f"{col}: {stats['above_range']:,} values above {fee_ranges[col][1]}" for col, stats in fees.items() if stats['above_range']]
+    return {
+        'rows': len(trip_fact),
+        'null_keys': null_keys,
+        'referential_integrity': orphans,
+        'fees': fees,
+        'failures': failures,
+        'warnings': warnings,
+        'passed': not failures
     }
 
-    for key_name, missing_count in quality_checks.items():
+def stratified_sample(trip_fact, sample_size=SAMPLE_SIZE, strata=SAMPLE_STRATA, seed=None):
+    """Proportional stratified random sample, returns sorted row positions"""
+    total = len(trip_fact)
+    if total <= sample_size:
+        return np.arange(total)
+    rng = np.random.default_rng(seed)
+    if strata in trip_fact.columns:
+        codes = trip_fact[strata].factorize(use_na_sentinel=False)[0]
+    else:
+        codes = np.zeros(total, dtype=np.int64)
+    # Random order inside each stratum, then take each stratum's proportional share
+    order = np.lexsort((rng.random(total), codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sizes = np.diff(np.r_[starts, total])
+    takes = np.maximum(1, np.round(sizes * sample_size / total).astype(np.int64))
+    positions = np.concatenate([order[start:start + take] for start, take in zip(starts, takes)])
+    return np.sort(positions)
+
+def rate_interval(violations, sample_rows, population_rows, confidence=SAMPLE_CONFIDENCE):
+    """Wilson score interval for a violation rate, with finite population correction"""
+    if sample_rows == 0:
+        return 0.0, 0.0, 1.0
+    p = violations / sample_rows
+    if sample_rows >= population_rows:
+        return p, p, p
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    fpc = (population_rows - sample_rows) / (population_rows - 1) if population_rows > 1 else 0.0
+    z2n = z * z / sample_rows
+    center = (p + z2n / 2) / (1 + z2n)
+    margin = z * np.sqrt(fpc * (p * (1 - p) / sample_rows + z2n / (4 * sample_rows))) / (1 + z2n)
+    return p, max(0.0, center - margin), min(1.0, center + margin)
+
+def sampled_quality_report(trip_fact, dimensions=None, sample_size=SAMPLE_SIZE, confidence=SAMPLE_CONFIDENCE,
+                           rate_threshold=SAMPLE_RATE_THRESHOLD, strata=SAMPLE_STRATA, seed=None, max_workers=None):
+    """Estimate violation rates from a stratified sample, exhaustive check only when a bound crosses the threshold"""
+    positions = stratified_sample(trip_fact, sample_size=sample_size, strata=strata, seed=seed)
+    sample = trip_fact.take(positions)
+    sample_report = quality_report(sample, dimensions=dimensions, max_workers=max_workers)
+    population, sampled = len(trip_fact), len(sample)
+
+    estimates = {}
+    counts = {f'null:{col}': count for col, count in sample_report['null_keys'].items()}
+    counts.update({f'orphan:{col}': count for col, count in sample_report['referential_integrity'].items()})
+    counts.update({f'below_range:{col}': stats['below_range'] for col, stats in sample_report['fees'].items()})
+    for name, count in counts.items():
+        rate, low, high = rate_interval(count, sampled, population, confidence)
+        estimates[name] = {'rate': rate, 'lower': low, 'upper': high}
+    crossed = [name for name, estimate in estimates.items() if estimate['upper'] > rate_threshold]
+
+    if crossed:
+        logger.info("🔁 Sampled bounds crossed %s for %s, running exhaustive checks", rate_threshold, crossed)
+        report = quality_report(trip_fact, dimensions=dimensions, max_workers=max_workers)
+        report['mode'] = 'exhaustive_fallback'
+    else:
+        report = sample_report
+        report['rows'] = population
+        report['mode'] = 'sampled'
+    report.update({'sample_rows': sampled, 'confidence': confidence, 'estimates': estimates})
+    return report, sample
+
+def fee_summary(trip_fact, columns=None):
+    """Per-fee summary statistics and fixed-bin histograms used for drift detection"""
+    columns = [col for col in (columns or FEE_RANGES) if col in trip_fact.columns]
+    summary = {'rows': len(trip_fact), 'columns': {}}
+    for col in columns:
+        values = to_dollars(trip_fact[col])
+        values = values[~np.isnan(values)]
+        if not len(values):
+            continue
+        histogram = np.histogram(np.clip(values, DRIFT_BINS[0], None), bins=DRIFT_BINS)[0]
+        summary['columns'][col] = {
+            'mean': float(values.mean()),
+            'std': float(values.std()),
+            'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)),
+            'histogram': histogram.tolist()
+        }
+    return summary
+
+def _summary_dir(base_dir):
+    return os.path.join(base_dir, SUMMARY_DIR)
+
+def save_summary(summary, period, base_dir='data'):
+    os.makedirs(_summary_dir(base_dir), exist_ok=True)
+    with open(os.path.join(_summary_dir(base_dir), f'{period}.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+def load_previous_summary(period, base_dir='data'):
+    """Latest stored summary of the same series (e.g. yellow_tripdata_) before this period"""
+    summary_dir = _summary_dir(base_dir)
+    if not os.path.isdir(summary_dir):
+        return None, None
+    series = period.rsplit('_', 1)[0]
+    earlier = sorted(name[:-5] for name in os.listdir(summary_dir)
+                     if name.endswith('.json') and name.rsplit('_', 1)[0] == series and name[:-5] < period)
+    if not earlier:
+        return None, None
+    with open(os.path.join(summary_dir, f'{earlier[-1]}.json'), 'r') as f:
+        return earlier[-1], json.load(f)
+
+def _psi(current, previous):
+    current = np.asarray(current, dtype=np.float64) + 0.5
+    previous = np.asarray(previous, dtype=np.float64) + 0.5
+    current, previous = current / current.sum(), previous / previous.sum()
+    return float(((current - previous) * np.log(current / previous)).sum())
+
+def drift_report(current, previous):
+    """Compare two fee summaries: relative mean/p95 change and population stability index"""
+    drift = {}
+    for col, stats in current['columns'].items():
+        before = previous['columns'].get(col)
+        if before is None:
+            continue
+        psi = _psi(stats['histogram'], before['histogram'])
+        drift[col] = {
+            'mean_change': (stats['mean'] - before['mean']) / before['mean'] if before['mean'] else None,
+            'p95_change': (stats['p95'] - before['p95']) / before['p95'] if before['p95'] else None,
+            'psi': psi,
+            'drifted': psi > DRIFT_PSI_THRESHOLD
+        }
+    return drift
+
+# Check for missing foreign keys, orphan keys and fee ranges
+@log_execution_time
+def key_validator(trip_fact, dimensions=None, strict=False, max_workers=None, mode=None, period=None,
+                  base_dir='data', sample_size=SAMPLE_SIZE, confidence=SAMPLE_CONFIDENCE):
+    mode = mode or QUALITY_MODE
+    logger.info("🔍 Data Quality Check (%s) - Missing Foreign Keys:", mode)
+    if mode == 'sampled':
+        report, summary_source = sampled_quality_report(trip_fact, dimensions=dimensions, sample_size=sample_size,
+                                                        confidence=confidence, max_workers=max_workers)
+        logger.info("🎲 Estimated from %s of %s rows at %.0f%% confidence (%s)",
+                    report['sample_rows'], report['rows'], confidence * 100, report['mode'])
+    else:
+        report = quality_report(trip_fact, dimensions=dimensions, max_workers=max_workers)
+        report['mode'] = 'exhaustive'
+        summary_source = trip_fact
+
+    for key_name, missing_count in report['null_keys'].items():
         status = "✅" if missing_count == 0 else "⚠️"
-        logger.info(f"{status} {key_name}: {missing_count:,} missing values")
+        logger.info("%s %s: %s missing values", status, key_name, missing_count)
+    for key_name, orphan_count in report['referential_integrity'].items():
+        status = "✅" if orphan_count == 0 else "⚠️"
+        logger.info("%s %s: %s keys without dimension row", status, key_name, orphan_count)
+    for warning in report['warnings']:
+        logger.warning("⚠️ %s", warning)
+
+    if period:
+        summary = fee_summary(summary_source)
+        previous_period, previous = load_previous_summary(period, base_dir)
+        if previous is not None:
+            report['drift'] = drift_report(summary, previous)
+            report['drift_baseline'] = previous_period
+            for col, drift in report['drift'].items():
+                if drift['drifted']:
+                    logger.warning("⚠️ %s drifted vs %s: PSI %.3f", col, previous_period, drift['psi'])
+        save_summary(summary, period, base_dir)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n📋 Sample Fact Table:\n%s", trip_fact.head())
 
-    # Show sample of fact table
-    logger.info("\n📋 Sample Fact Table:")
-    logger.info(trip_fact.head())
-    return quality_checks
\ No newline at end of file
+    if strict and not report['passed']:
+        raise ValueError(f"Data quality gate failed: {'; '.join(report['failures'])}")
+    return report
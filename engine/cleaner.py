@@ -1,11 +1,19 @@
+import numpy as np
 from engine.logger_config import setup_logger, log_execution_time
+from engine.rejects import REJECT_REASONS
 
 logger = setup_logger('cleaner')
 
+# Average speeds above this are treated as bad clock or distance data
+MAX_AVG_MPH = 100
+
+# Every cleaner stage takes an optional RejectCollector (engine.rejects); the rows it drops
+# are handed over with the reason bits of the mask it already computed
+
 @log_execution_time
-def clean_negative_fees(df):
+def clean_negative_fees(df, rejects=None):
     df = df.copy()
-    logger.info(f"Initial records: {len(df):,}")
+    logger.info("Initial records: %s", len(df))
     # Count negative values in fee columns
     fee_cols = ['fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
     'improvement_surcharge', 'airport_fee', 'cbd_congestion_fee', 'congestion_surcharge']
@@ -14,31 +22,64 @@ def clean_negative_fees(df):
     invalid_count = (df['fee_invalid'] == True).sum()
 
     # Print the counts
-    logger.info(f"Valid records (no negative fees): {valid_count:,}")
-    logger.info(f"Invalid records (has negative fees): {invalid_count:,}")
+    logger.info("Valid records (no negative fees): %s", valid_count)
+    logger.info("Invalid records (has negative fees): %s", invalid_count)
 
-    # Clean negative fees
-    df = df[df['fee_invalid'] == False].copy().reset_index(drop=True)
-    logger.info(f"Valid records in df: {len(df):,}")
+    if rejects is not None:
+        rejects.add(df.loc[df['fee_invalid'], df.columns.drop('fee_invalid')],
+                    np.full(invalid_count, REJECT_REASONS['negative_fee']))
+
+    # Clean negative fees; the helper flag is not part of the trip record
+    df = df[df['fee_invalid'] == False].drop(columns='fee_invalid').reset_index(drop=True)
+    logger.info("Valid records in df: %s", len(df))
     return df
 
 @log_execution_time
-def clean_trip_duration(df):
-    # Add column trip duration for Filter
-    df.loc[:, 'duration'] = ((df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60).round().astype(int)
+def clean_trip_duration(df, max_mph=MAX_AVG_MPH, rejects=None):
+    # Trip duration (seconds) and average speed from the raw timestamp values in one pass;
+    # both are kept as fact measures, so nobody has to recompute them from datetime_dim
+    seconds = (df['dropoff_datetime'].to_numpy() - df['pickup_datetime'].to_numpy()) / np.timedelta64(1, 's')
+    if 'trip_distance' in df.columns:
+        distance = df['trip_distance'].to_numpy(dtype='float64', na_value=np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mph = np.where(seconds > 0, distance / (seconds / 3600), np.nan)
+    else:
+        mph = np.full(len(df), np.nan)
 
     # Filter out less than 2 minutes and more than 3 hours duration trips
-    logger.info(f"Records before duration filter: {len(df):,}")
-    valid_duration = df['duration'].between(2, 180, inclusive='neither')
-    invalid_duration_count = (~valid_duration).sum()
-    logger.info(f"Invalid records with duration less than 2 minutes and more than 3 hours: {invalid_duration_count:,}")
-    df = df[valid_duration].copy().reset_index(drop=True)
-    logger.info(f"Valid records after duration filter: {len(df):,}")
+    logger.info("Records before duration filter: %s", len(df))
+    minutes = np.rint(seconds / 60)
+    valid_duration = (minutes > 2) & (minutes < 180)
+    invalid_duration_count = int((~valid_duration).sum())
+    logger.info("Invalid records with duration less than 2 minutes and more than 3 hours: %s", invalid_duration_count)
+    # Implausible speeds are clock or odometer errors; unknown distances are kept
+    valid_speed = ~(mph > max_mph)
+    invalid_speed_count = int((valid_duration & ~valid_speed).sum())
+    logger.info("Invalid records with average speed above %s mph: %s", max_mph, invalid_speed_count)
+
+    valid = valid_duration & valid_speed
+    if rejects is not None:
+        reasons = (np.where(minutes <= 2, REJECT_REASONS['short_trip'], 0)
+                   | np.where(minutes >= 180, REJECT_REASONS['long_trip'], 0)
+                   | np.where(valid_speed, 0, REJECT_REASONS['implausible_speed'])
+                   | np.where(np.isnan(minutes), REJECT_REASONS['missing_time'], 0))
+        # Bad clocks can be decades off, so rejected durations stay float
+        rejects.add(df[~valid].assign(duration_sec=seconds[~valid], avg_mph=mph[~valid]), reasons[~valid])
+    df = df[valid].reset_index(drop=True)
+    df['duration_sec'] = seconds[valid].astype('int32')
+    df['avg_mph'] = mph[valid].astype('float32')
+    logger.info("Valid records after duration filter: %s", len(df))
     return df
 
 @log_execution_time
-def remove_duplicates(df):
-    df = df.drop_duplicates().reset_index(drop=True)
-    logger.info(f"Records after removing duplicates: {len(df):,}")
+def remove_duplicates(df, rejects=None):
+    if rejects is None:
+        df = df.drop_duplicates().reset_index(drop=True)
+    else:
+        # Same rows as drop_duplicates, with the dropped copies kept for the quarantine
+        duplicated = df.duplicated().to_numpy()
+        rejects.add(df[duplicated], np.full(int(duplicated.sum()), REJECT_REASONS['duplicate']))
+        df = df[~duplicated].reset_index(drop=True)
+    logger.info("Records after removing duplicates: %s", len(df))
     logger.info("Index reset after removing duplicates")
     return df
\ No newline at end of file
@@ -0,0 +1,30 @@
+import json
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, 'pipeline.json')
+
+DEFAULTS = {
+    'base_dir': 'data',
+    'append_mode': True,
+    'max_workers': 4,
+    'cache_dir': os.path.join('data', 'cache', 'stages'),
+    'keep_cache': False,
+    'strict_quality': False,
+    'fee_cents': False,
+    'exports': [],
+    'stages': []
+}
+
+def load_config(path=None):
+    """Pipeline config from PIPELINE_CONFIG / pipeline.json, merged over the defaults"""
+    path = path or os.environ.get('PIPELINE_CONFIG', DEFAULT_CONFIG_PATH)
+    with open(path, 'r', encoding='utf-8') as f:
+        config = {**DEFAULTS, **json.load(f)}
+    if os.environ.get('PIPELINE_STRICT_QUALITY') == '1':
+        config['strict_quality'] = True
+    if os.environ.get('PIPELINE_FEE_CENTS') == '1':
+        config['fee_cents'] = True
+    if os.environ.get('PIPELINE_EXPORTS') is not None:
+        config['exports'] = [fmt.strip() for fmt in os.environ['PIPELINE_EXPORTS'].split(',') if fmt.strip()]
+    return config
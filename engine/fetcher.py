@@ -1,53 +1,152 @@
-import requests
-import json
+import hashlib
 import os
 from datetime import datetime
+from engine.schema import get_fleets
+from engine.logger_config import setup_logger
+from engine import registry
 
-REGISTER = os.path.join("data", "stored_files.json")
+logger = setup_logger('fetcher')
+
+TRIPDATA_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/{fname}"
+RAW_DIR = os.path.join("data", "raw")
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+_session = None
+
+def get_session():
+    """Process-wide HTTP session, keeps connections to CloudFront alive between probes"""
+    global _session
+    if _session is None:
+        # requests is only imported once the network is actually probed
+        import requests
+        _session = requests.Session()
+    return _session
 
 def is_parquet_available(url):
     try:
-        resp = requests.head(url, timeout=5)
+        resp = get_session().head(url, timeout=5)
         return resp.status_code == 200
     except Exception:
         return False
 
+def remote_version(url):
+    """ETag / Last-Modified / size of a published file from a HEAD request, None if missing"""
+    try:
+        resp = get_session().head(url, timeout=5)
+    except Exception:
+        return None
+    if resp.status_code != 200:
+        return None
+    return {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified'),
+            'content_length': resp.headers.get('Content-Length')}
+
+def load_registry():
+    """{fname: entry} of stored source files (version, row counts, timings)"""
+    return registry.stored_files()
+
 def get_stored_files():
-    os.makedirs(os.path.dirname(REGISTER), exist_ok=True)
-    if os.path.exists(REGISTER):
-        with open(REGISTER, "r") as f:
-            return set(json.load(f))
-    return set()
-
-def mark_file_as_stored(fname):
-    files = get_stored_files()
-    files.add(fname)
-    os.makedirs(os.path.dirname(REGISTER), exist_ok=True)
-    with open(REGISTER, "w") as f:
-        json.dump(list(files), f)
-
-def get_new_tripdata_url():
-    base_url = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{}-{:02d}.parquet"
+    return set(load_registry())
+
+def mark_file_as_stored(fname, **fields):
+    registry.commit_file(fname, **fields)
+
+def has_changed(stored, remote):
+    """Whether a stored source was republished; entries without validators are trusted"""
+    if remote is None:
+        return False
+    if stored.get('etag') and remote.get('etag'):
+        return stored['etag'] != remote['etag']
+    if stored.get('last_modified') and remote.get('last_modified'):
+        return stored['last_modified'] != remote['last_modified']
+    return False
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def download_source(url, fname, stored=None):
+    """Download a source file unless it is unchanged since it was stored.
+
+    Uses a conditional GET (If-None-Match / If-Modified-Since) and the content hash, so
+    a republished month is only processed when its bytes actually differ. Returns
+    (local_path, version), local_path is None when the stored copy is current.
+    """
+    stored = stored or {}
+    if not str(url).startswith(('http://', 'https://')):
+        version = {'sha256': file_sha256(url)}
+        return (None if stored.get('sha256') == version['sha256'] else url), version
+
+    headers = {}
+    if stored.get('etag'):
+        headers['If-None-Match'] = stored['etag']
+    elif stored.get('last_modified'):
+        headers['If-Modified-Since'] = stored['last_modified']
+    os.makedirs(RAW_DIR, exist_ok=True)
+    local_path = os.path.join(RAW_DIR, fname)
+    tmp_path = local_path + '.part'
+    digest = hashlib.sha256()
+    with get_session().get(url, headers=headers, stream=True, timeout=60) as resp:
+        if resp.status_code == 304:
+            return None, {key: stored.get(key) for key in ('etag', 'last_modified', 'content_length', 'sha256')}
+        resp.raise_for_status()
+        with open(tmp_path, 'wb') as f:
+            for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        version = {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified'),
+                   'content_length': resp.headers.get('Content-Length'), 'sha256': digest.hexdigest()}
+    os.replace(tmp_path, local_path)
+    if stored.get('sha256') == version['sha256']:
+        # New validators, same bytes: nothing to reprocess
+        os.remove(local_path)
+        return None, version
+    return local_path, version
+
+def remove_raw(fname):
+    """Delete the downloaded copy of a source file once it is stored (local sources are never touched)"""
+    try:
+        os.remove(os.path.join(RAW_DIR, fname))
+    except FileNotFoundError:
+        pass
+
+def tripdata_fname(fleet, year, month):
+    return f"{fleet}_tripdata_{year}-{month:02d}.parquet"
+
+def get_new_tripdata_url(fleets=None):
     stored = get_stored_files()
     current_year = datetime.now().year
     # Cek dari 2015 sampai tahun depan
-    for year in range(2025, current_year + 2):
-        for month in range(1, 13):
-            fname = f"yellow_tripdata_{year}-{month:02d}.parquet"
-            url = base_url.format(year, month)
-            if is_parquet_available(url) and fname not in stored:
-                return url, fname
+    for fleet in fleets or get_fleets():
+        for year in range(2025, current_year + 2):
+            for month in range(1, 13):
+                fname = tripdata_fname(fleet, year, month)
+                url = TRIPDATA_URL.format(fname=fname)
+                if is_parquet_available(url) and fname not in stored:
+                    return url, fname
     return None, None
 
-def get_all_new_tripdata_urls():
-    base_url = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{}-{:02d}.parquet"
-    stored = get_stored_files()
+def get_all_new_tripdata_urls(fleets=None):
+    """New source files plus stored ones TLC has republished since (one HEAD request each)"""
+    stored = load_registry()
     current_year = datetime.now().year
     new_files = []
-    for year in range(2025, current_year + 1):
-        for month in range(1, 3):
-            fname = f"yellow_tripdata_{year}-{month:02d}.parquet"
-            url = base_url.format(year, month)
-            if is_parquet_available(url) and fname not in stored:
-                new_files.append((url, fname))
-    return new_files
\ No newline at end of file
+    for fleet in fleets or get_fleets():
+        for year in range(2025, current_year + 1):
+            for month in range(1, 3):
+                fname = tripdata_fname(fleet, year, month)
+                url = TRIPDATA_URL.format(fname=fname)
+                remote = remote_version(url)
+                if remote is None:
+                    continue
+                if fname not in stored:
+                    new_files.append((url, fname))
+                elif has_changed(stored[fname], remote):
+                    logger.info("♻️ %s was republished (ETag/Last-Modified changed)", fname)
+                    new_files.append((url, fname))
+                elif not (stored[fname].get('etag') or stored[fname].get('last_modified')):
+                    # Entry from before versions were tracked: the current version becomes the baseline
+                    registry.update_version(fname, remote)
+    return new_files
@@ -1,52 +1,127 @@
+import os
+from contextlib import closing, contextmanager
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from engine.logger_config import setup_logger, log_execution_time
+from engine.schema import conform_to_schema, fleet_from_source, raw_columns, FEE_CENTS
+from engine.zones import load_zone_lookup
+from engine.memory import get_governor, MIN_BATCH_SIZE
+from engine.streams import prefetch
 
 logger = setup_logger('loader')
 
+DEFAULT_BATCH_SIZE = 1_000_000
+
+@contextmanager
+def _open_source(source):
+    """Open a local or remote TLC Parquet file as a pyarrow ParquetFile"""
+    if not str(source).startswith(('http://', 'https://')):
+        yield pq.ParquetFile(source)
+        return
+    # pyarrow cannot stream over plain HTTP: the fetcher spools the download to data/raw/,
+    # and the copy is removed once the file has been read
+    from engine.fetcher import download_source, remove_raw
+    fname = os.path.basename(source)
+    local_path, _ = download_source(source, fname)
+    try:
+        yield pq.ParquetFile(local_path)
+    finally:
+        remove_raw(fname)
+
+def iter_trip_batches(source, fleet=None, batch_size=DEFAULT_BATCH_SIZE, governor=None, fee_cents=False):
+    """Stream a TLC trip file of any fleet as DataFrames already mapped to the common schema.
+
+    With a governor, batch_size is only the starting point: batches are sized from the
+    calibrated per-row cost and shrink when RSS approaches the memory budget. That bounds
+    the memory of decoding and conforming, not of a consumer that keeps every batch. With
+    fee_cents, fee columns are converted to int32 cents batch by batch. Row groups are read
+    and decompressed in a reader thread (up to PIPELINE_QUEUE_DEPTH batches ahead) while
+    the previous batch is being conformed.
+    """
+    fleet = fleet or fleet_from_source(source)
+    with _open_source(source) as parquet_file:
+        yield from _conformed_batches(parquet_file, fleet, batch_size, governor, fee_cents)
+
+def _conformed_batches(parquet_file, fleet, batch_size, governor, fee_cents):
+    available = set(parquet_file.schema_arrow.names)
+    columns = [col for col in raw_columns(fleet) if col in available]
+    if governor is None:
+        with closing(prefetch(parquet_file.iter_batches(batch_size=batch_size, columns=columns),
+                              name='trip-reader')) as batches:
+            for batch in batches:
+                yield conform_to_schema(batch.to_pandas(), fleet, fee_cents)
+        return
+
+    # Small Arrow slices are grouped into pandas batches of whatever size currently fits
+    target = governor.batch_size('trips', batch_size)
+    pending, pending_rows = [], 0
+    with closing(prefetch(parquet_file.iter_batches(batch_size=min(batch_size, MIN_BATCH_SIZE), columns=columns),
+                          name='trip-reader')) as batches:
+        for batch in batches:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= target:
+                frame = conform_to_schema(pa.Table.from_batches(pending).to_pandas(), fleet, fee_cents)
+                pending, pending_rows = [], 0
+                governor.record('trips', frame)
+                yield frame
+                target = governor.batch_size('trips', batch_size)
+    if pending:
+        frame = conform_to_schema(pa.Table.from_batches(pending).to_pandas(), fleet, fee_cents)
+        governor.record('trips', frame)
+        yield frame
+
 @log_execution_time
-def trip_data(url):
+def trip_data(url, fleet=None, batch_size=None, fee_cents=None):
     try:
-        logger.info(f"🚀 Loading trip data from {url}...")
-        df = pd.read_parquet(url)
-        logger.info(f"✅ Trip data loaded successfully: {len(df):,} records")
-
-        # Rename columns for consistency in fact table
-        logger.info("🔄 Renaming columns for consistency...")
-        df.rename(columns={'VendorID': 'vendor_id',
-                    'tpep_pickup_datetime': 'pickup_datetime',
-                    'tpep_dropoff_datetime': 'dropoff_datetime',
-                    'RatecodeID': 'ratecode_id',
-                    'store_and_fwd_flag': 'store_and_fwd',
-                    'PULocationID': 'pickup_location_id',
-                    'DOLocationID': 'dropoff_location_id',
-                    'payment_type': 'payment_id',
-                    'Airport_fee': 'airport_fee'}, inplace=True)
-        logger.info(f"✅ Column renaming completed. Shape: {df.shape}")
-        logger.debug(f"Columns: {list(df.columns)}")
+        fleet = fleet or fleet_from_source(url)
+        logger.info("🚀 Loading %s trip data from %s...", fleet, url)
+        # Each batch is projected and mapped to the common schema before concatenation,
+        # so raw fleet-specific columns never sit in memory for the whole month
+        # Without an explicit batch_size the memory governor picks (and adapts) it
+        governor = get_governor() if batch_size is None else None
+        # Fees as int32 cents when enabled in the config or with PIPELINE_FEE_CENTS=1
+        fee_cents = FEE_CENTS if fee_cents is None else fee_cents
+        if governor is not None and os.path.exists(str(url)):
+            # The assembled month is the largest allocation of a run: a month that cannot fit
+            # the budget fails here, before loading, instead of being OOM-killed halfway
+            governor.check_fits('trips', pq.ParquetFile(url).metadata.num_rows)
+        # Conformed batches are kept as Arrow tables and their pandas frames released as they
+        # arrive. The month is converted once at the end, column by column (self_destruct frees
+        # each Arrow column once converted), so it is never held twice like with pd.concat
+        tables = [pa.Table.from_pandas(batch, preserve_index=False)
+                  for batch in iter_trip_batches(url, fleet, batch_size=batch_size or DEFAULT_BATCH_SIZE,
+                                                 governor=governor, fee_cents=fee_cents)]
+        if tables:
+            month = pa.concat_tables(tables, promote_options='default')
+            del tables
+            df = month.to_pandas(split_blocks=True, self_destruct=True)
+            del month
+        else:
+            df = conform_to_schema(pd.DataFrame(), fleet, fee_cents)
+        logger.info("✅ Trip data loaded successfully: %s records", len(df))
+        logger.info("✅ Column mapping for %s completed. Shape: %s", fleet, df.shape)
+        logger.debug("Columns: %s", list(df.columns))
 
         return df
     
     except Exception as e:
-        logger.error(f"❌ Error loading trip data: {str(e)}")
+        logger.error("❌ Error loading trip data: %s", e)
         raise
 
 @log_execution_time
 def location_data():
     try:
         logger.info("🚀 Loading location data...")
-        location_dim = pd.read_csv("https://d37ci6vzurychx.cloudfront.net/misc/taxi_zone_lookup.csv")
-        logger.info(f"✅ Location data loaded successfully: {len(location_dim):,} records")
-
-        # Rename columns for consistency in location dimension
-        logger.info("🔄 Renaming columns for consistency...")
-        location_dim.rename(columns={
-            'LocationID': 'location_id',
-            'Borough': 'borough',
-            'Zone': 'zone'}, inplace=True)
-        logger.info(f"✅ Column renaming completed. Shape: {location_dim.shape}")
+        # Served from the local versioned cache, only revalidated with a conditional request
+        location_dim, meta = load_zone_lookup()
+        logger.info("✅ Location data loaded successfully: %s records (version %s)",
+                    len(location_dim), meta.get('version'))
+        logger.info("✅ Column renaming completed. Shape: %s", location_dim.shape)
         
         return location_dim
     
     except Exception as e:
-        logger.error(f"❌ Error loading location data: {str(e)}")
+        logger.error("❌ Error loading location data: %s", e)
         raise
\ No newline at end of file
@@ -1,69 +1,161 @@
+import atexit
+import io
+import json
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
 from functools import wraps
 import time
 
-def setup_logger(name='data_pipeline'):
-    """Centralized logger for Data Pipeline"""
+# Opt-in logging modes, read once at import time
+#   PIPELINE_LOG_MODE=queue   handlers run on a background QueueListener thread
+#   PIPELINE_LOG_FORMAT=json  one JSON object per line in the log file
+#   PIPELINE_LOG_LEVEL=DEBUG  enables expensive diagnostics (DataFrame.info(), samples)
+LOG_MODE = os.environ.get('PIPELINE_LOG_MODE', 'sync')
+LOG_FORMAT = os.environ.get('PIPELINE_LOG_FORMAT', 'text')
+LOG_LEVEL = getattr(logging, os.environ.get('PIPELINE_LOG_LEVEL', 'INFO').upper(), logging.INFO)
 
-    # Create logs directory if not exists
-    os.makedirs('logs', exist_ok=True)
-    
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Prevent duplicate handlers if logger already exists
-    if logger.handlers:
-        return logger
-    
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-    )
+_queue = None
+_listener = None
+_handlers = None
+# Set by engine.profiling while a profiled run is active; None keeps stages unwrapped
+_profile_hook = None
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON documents"""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'logger': record.name,
+            'level': record.levelname,
+            'function': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves %-formatting to the listener thread"""
+
+    def prepare(self, record):
+        # Same-process queue: the record is handed over as-is, so message merging,
+        # formatting and I/O all happen off the data path
+        return record
+
+def _build_handlers():
+    """File and console handlers, built once per process and shared by every logger"""
+    global _handlers
+    if _handlers is not None:
+        return _handlers
+    if LOG_FORMAT == 'json':
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+        )
     console_formatter = logging.Formatter(
         '%(levelname)s - %(funcName)s - %(message)s'
     )
-    
+
     # File handler - dengan timestamp + PID untuk uniqueness
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     pid = os.getpid()
     file_handler = logging.FileHandler(f'logs/pipeline_{timestamp}_{pid}.log', encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(LOG_LEVEL)
     file_handler.setFormatter(file_formatter)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(LOG_LEVEL)
     console_handler.setFormatter(console_formatter)
+    _handlers = [file_handler, console_handler]
+    return _handlers
+
+def _get_queue():
+    """Start the process-wide QueueListener on first use"""
+    global _queue, _listener
+    if _listener is None:
+        _queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(_queue, *_build_handlers(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    return _queue
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logger(name='data_pipeline'):
+    """Centralized logger for Data Pipeline"""
+
+    # Create logs directory if not exists
+    os.makedirs('logs', exist_ok=True)
+    
+    # Create logger
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    
+    # Prevent duplicate handlers if logger already exists
+    if logger.handlers:
+        return logger
     
+    if LOG_MODE == 'queue':
+        # Only the enqueue happens on the calling thread
+        logger.addHandler(_DeferredQueueHandler(_get_queue()))
+        return logger
+
     # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    for handler in _build_handlers():
+        logger.addHandler(handler)
     return logger
 
+def log_frame_info(logger, df, name='DataFrame'):
+    """Log DataFrame.info() at DEBUG only; rendering it scans every column"""
+    if logger.isEnabledFor(logging.DEBUG):
+        buffer = io.StringIO()
+        df.info(buf=buffer)
+        logger.debug("%s info:\n%s", name, buffer.getvalue())
+
+def set_profile_hook(hook):
+    """Route every @log_execution_time call through hook(name, func, args, kwargs), None to stop"""
+    global _profile_hook
+    _profile_hook = hook
+
 def log_execution_time(func):
     """Decorator for logging execution time of functions"""
 
+    # Use the module's configured logger (setup_logger name), not the bare module name
+    logger = func.__globals__.get('logger')
+    if not isinstance(logger, logging.Logger):
+        logger = logging.getLogger(func.__module__)
+    name = func.__name__
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = datetime.now()
-        # Get the logger from the function's module
-        logger = logging.getLogger(func.__module__)
-        
         start_time = time.time()
-        logger.info(f"⏱️ Start timing {func.__name__} process")
+        logger.info("⏱️ Start timing %s process", name)
         
         try:
-            result = func(*args, **kwargs)
+            if _profile_hook is None:
+                result = func(*args, **kwargs)
+            else:
+                result = _profile_hook(name, func, args, kwargs)
             end_time = time.time()
             duration = end_time - start_time
-            logger.info(f"✅ {func.__name__} completed in {duration:.2f} seconds")
+            logger.info("✅ %s completed in %.2f seconds", name, duration)
             return result
         except Exception as e:
             end_time = time.time()
             duration = end_time - start_time
-            logger.error(f"❌ {func.__name__} failed after {duration:.2f} seconds: {str(e)}")
+            logger.error("❌ %s failed after %.2f seconds: %s", name, duration, e)
             raise
     return wrapper
\ No newline at end of file
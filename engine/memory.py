@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from engine.logger_config import setup_logger
+
+logger = setup_logger('memory')
+
+# Memory budget of a run, e.g. "1536M" or "2G"; defaults to the cgroup (container) limit,
+# or physical RAM when the process is not limited
+MEMORY_BUDGET = os.environ.get('PIPELINE_MEMORY_BUDGET')
+# Fraction of the budget RSS may reach before batches shrink and new stages wait
+HIGH_WATER = float(os.environ.get('PIPELINE_MEMORY_HIGH_WATER', 0.85))
+CALIBRATION_PATH = os.path.join('data', 'memory', 'calibration.json')
+
+# Arrow batch + pandas conversion + conformed copy are alive at the same time while loading
+BATCH_OVERHEAD = 3
+MIN_BATCH_SIZE = 50_000
+MAX_BATCH_SIZE = 2_000_000
+
+_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def parse_size(text):
+    """'2G', '1536M', '1073741824' -> bytes"""
+    text = str(text).strip().upper().rstrip('B')
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+def cgroup_memory_limit(root='/sys/fs/cgroup'):
+    """Memory limit of the container in bytes, None when unlimited or not in a cgroup"""
+    for name in ('memory.max', os.path.join('memory', 'memory.limit_in_bytes')):
+        try:
+            with open(os.path.join(root, name), 'r') as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value == 'max':
+            return None
+        limit = int(value)
+        # cgroup v1 reports "unlimited" as a page-rounded huge number
+        return limit if limit < 2 ** 60 else None
+    return None
+
+def physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def current_rss():
+    """Resident set size of this process in bytes (0 when the platform does not expose it)"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Peak, not current, but still an upper bound; kilobytes on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+class MemoryGovernor:
+    """Keeps a run under its memory budget.
+
+    Per-row cost of each stage is calibrated from the frames it produces and persisted,
+    so the next run sizes its load batches from real numbers; RSS is checked between
+    batches and before new stages start.
+    """
+
+    def __init__(self, budget=None, high_water=HIGH_WATER, calibration_path=CALIBRATION_PATH, rss=current_rss):
+        if budget is None:
+            budget = parse_size(MEMORY_BUDGET) if MEMORY_BUDGET else (cgroup_memory_limit() or physical_memory())
+        self.budget = budget
+        self.high_water = high_water
+        self.calibration_path = calibration_path
+        self.rss = rss
+        self.row_costs = {}
+        self._batch_sizes = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def limit(self):
+        return self.budget * self.high_water if self.budget else None
+
+    def load(self):
+        if self.calibration_path and os.path.exists(self.calibration_path):
+            with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                self.row_costs.update(json.load(f))
+
+    def save(self):
+        if not self.calibration_path:
+            return
+        os.makedirs(os.path.dirname(self.calibration_path), exist_ok=True)
+        tmp_path = self.calibration_path + '.tmp'
+        with self._lock:
+            costs = dict(self.row_costs)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(costs, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.calibration_path)
+
+    def record(self, stage, frame):
+        """Calibrate a stage from its output frame: bytes per row, the largest seen wins"""
+        if not hasattr(frame, 'memory_usage') or len(frame) == 0:
+            return None
+        rows = len(frame)
+        cost = float(frame.memory_usage(index=False).sum()) / rows
+        with self._lock:
+            self.row_costs[stage] = max(cost, self.row_costs.get(stage, 0.0))
+        return cost
+
+    def under_pressure(self):
+        limit = self.limit
+        return limit is not None and self.rss() >= limit
+
+    def can_start(self, running):
+        """Whether another stage may start next to `running` ones"""
+        if running == 0 or not self.under_pressure():
+            return True
+        logger.warning("⚠️ RSS %.0f MB is near the budget, holding new stages until one of %s finishes",
+                       self.rss() / 1024 ** 2, running)
+        return False
+
+    def batch_size(self, stage, default, min_rows=MIN_BATCH_SIZE, max_rows=MAX_BATCH_SIZE):
+        """Rows per batch for a stage: what fits in the free budget, halved under pressure"""
+        with self._lock:
+            previous = self._batch_sizes.get(stage)
+            cost = self.row_costs.get(stage)
+        limit = self.limit
+        if previous is not None and self.under_pressure():
+            size = max(min_rows, previous // 2)
+            if size < previous:
+                logger.warning("⚠️ RSS near the budget, shrinking %s batches to %s rows", stage, size)
+        elif cost and limit:
+            free = max(limit - self.rss(), 0)
+            size = int(free / (cost * BATCH_OVERHEAD))
+            size = min(max(size, min_rows), max_rows)
+            if previous is not None:
+                # Never grow back within a run once memory got tight
+                size = min(size, previous)
+        else:
+            size = previous or default
+        with self._lock:
+            self._batch_sizes[stage] = size
+        return size
+
+    def check_fits(self, stage, rows):
+        """Raise MemoryError when rows of a stage's output, at its calibrated cost, exceed the free budget.
+
+        Returns the projected bytes, None while the stage is not calibrated or there is no budget.
+        """
+        with self._lock:
+            cost = self.row_costs.get(stage)
+        limit = self.limit
+        if not cost or not limit:
+            return None
+        needed = rows * cost
+        free = max(limit - self.rss(), 0)
+        if needed > free:
+            raise MemoryError(f"{stage} needs ~{needed / 1024 ** 2:,.0f} MB for {rows:,} rows, "
+                              f"only {free / 1024 ** 2:,.0f} MB of the memory budget is free")
+        return needed
+
+    def reset(self):
+        """Start the next file with fresh batch sizes (calibration is kept)"""
+        with self._lock:
+            self._batch_sizes.clear()
+
+_governor = None
+
+def get_governor():
+    """Process-wide governor, the budget is read once"""
+    global _governor
+    if _governor is None:
+        _governor = MemoryGovernor()
+        budget = f"{_governor.budget / 1024 ** 2:,.0f} MB" if _governor.budget else "unknown"
+        logger.info("🧠 Memory budget %s, high-water mark %.0f%%", budget, _governor.high_water * 100)
+    return _governor
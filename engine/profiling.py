@@ -0,0 +1,193 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from engine.logger_config import setup_logger, set_profile_hook
+
+logger = setup_logger('profiling')
+
+# Profiling mode of a run (PIPELINE_PROFILE or main.py --profile):
+#   cprofile      cProfile stats of every @log_execution_time stage (also "1")
+#   pyinstrument  sampling profiler flamegraph (HTML) per stage, needs pyinstrument installed
+# Both hook the interpreter's profile function, so a run uses one of them. Without a mode
+# stages are called directly and cProfile/pstats are never imported
+PROFILE = os.environ.get('PIPELINE_PROFILE')
+PROFILE_MODES = ('cprofile', 'pyinstrument')
+PROFILE_DIR = os.path.join('logs', 'profiles')
+TOP_N = int(os.environ.get('PIPELINE_PROFILE_TOP', 15))
+# From Python 3.12 cProfile is built on sys.monitoring, which allows one active profiler per
+# process: a second one raises "Another profiling tool is already active"
+SINGLE_PROFILER = sys.version_info >= (3, 12)
+
+class ProfileSession:
+    """Per-stage profiles of one run, written to logs/profiles/<run>/.
+
+    Stages nest (store_to_parquet calls replace_partition) and run on several
+    threads. Each thread keeps its own stack: the outer stage's profiler is paused
+    while an inner stage runs, so every function is attributed to its innermost stage.
+    With SINGLE_PROFILER, one thread at a time profiles; stages that start on other
+    threads meanwhile are only timed (main runs stages one at a time to avoid that).
+    """
+
+    def __init__(self, run_dir, mode='cprofile'):
+        self.run_dir = run_dir
+        self.mode = mode
+        self.profiles = {}
+        self.timings = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiler_lock = threading.Lock()
+
+    @property
+    def single_threaded(self):
+        """Whether stages have to run one at a time to all be profiled"""
+        return self.mode == 'cprofile' and SINGLE_PROFILER
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def __call__(self, name, func, args, kwargs):
+        if self.mode == 'pyinstrument':
+            return self._sample(name, func, args, kwargs)
+        import cProfile
+        stack = self._stack()
+        owner = self.single_threaded and not stack
+        if owner and not self._profiler_lock.acquire(blocking=False):
+            # Another thread's stage holds the process-wide profiler
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - start)
+        profile = cProfile.Profile()
+        enabled = False
+        start = time.perf_counter()
+        try:
+            if stack:
+                stack[-1].disable()
+            stack.append(profile)
+            profile.enable()
+            enabled = True
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            if stack and stack[-1] is profile:
+                stack.pop()
+            if owner:
+                self._profiler_lock.release()
+            self._record(name, elapsed, profile if enabled else None)
+            if stack:
+                stack[-1].enable()
+
+    def _sample(self, name, func, args, kwargs):
+        stack = self._stack()
+        if stack:
+            # The sampler of the outermost stage on this thread already covers nested stages
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - start)
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        started = False
+        start = time.perf_counter()
+        try:
+            stack.append(profiler)
+            profiler.start()
+            started = True
+            return func(*args, **kwargs)
+        finally:
+            if started:
+                profiler.stop()
+            stack.pop()
+            self._record(name, time.perf_counter() - start, profiler if started else None)
+
+    def _record(self, name, elapsed, profile=None):
+        with self._lock:
+            calls, total = self.timings.get(name, (0, 0.0))
+            self.timings[name] = (calls + 1, total + elapsed)
+            if profile is not None:
+                self.profiles.setdefault(name, []).append(profile)
+
+    def stage_stats(self):
+        """{stage: pstats.Stats} with every call of a stage merged"""
+        import pstats
+        stats = {}
+        for name, profiles in self.profiles.items():
+            stats[name] = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats[name].add(profile)
+        return stats
+
+    def hotspots(self, top_n=TOP_N):
+        """Functions with the most own time across all stages: (tottime, cumtime, calls, stage, location)"""
+        rows = []
+        for name, stats in self.stage_stats().items():
+            for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+                rows.append((tottime, cumtime, calls, name, f"{os.path.basename(filename)}:{line}({function})"))
+        return sorted(rows, reverse=True)[:top_n]
+
+    def summary(self, top_n=TOP_N):
+        lines = ["Stage wall time:"]
+        for name, (calls, total) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {total:9.3f}s  {calls:4d}x  {name}")
+        hotspots = self.hotspots(top_n)
+        if hotspots:
+            lines.append(f"Top {len(hotspots)} hotspots by own time:")
+            lines.append(f"  {'tottime':>9}  {'cumtime':>9}  {'calls':>9}  stage / location")
+            for tottime, cumtime, calls, name, location in hotspots:
+                lines.append(f"  {tottime:9.3f}  {cumtime:9.3f}  {calls:9d}  {name} / {location}")
+        return '\n'.join(lines)
+
+    def save(self, top_n=TOP_N):
+        """Write <stage>.prof (or <stage>.html flamegraphs) and summary.txt, returns the summary"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        if self.mode == 'pyinstrument':
+            for name, profilers in self.profiles.items():
+                for i, profiler in enumerate(profilers):
+                    suffix = f'.{i + 1}' if len(profilers) > 1 else ''
+                    with open(os.path.join(self.run_dir, f'{name}{suffix}.html'), 'w', encoding='utf-8') as f:
+                        f.write(profiler.output_html())
+        else:
+            for name, stats in self.stage_stats().items():
+                stats.dump_stats(os.path.join(self.run_dir, f'{name}.prof'))
+        summary = self.summary(top_n)
+        with open(os.path.join(self.run_dir, 'summary.txt'), 'w', encoding='utf-8') as f:
+            f.write(summary + '\n')
+        return summary
+
+_session = None
+
+def start_profiling(mode=None, profile_dir=PROFILE_DIR):
+    """Start profiling every decorated stage; returns the session, None when profiling is off"""
+    global _session
+    mode = mode or PROFILE
+    if not mode or mode == '0':
+        return None
+    mode = 'cprofile' if mode == '1' else mode
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {PROFILE_MODES}")
+    if mode == 'pyinstrument':
+        # Fail before the run starts rather than in the first stage
+        import pyinstrument  # noqa: F401
+    run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+    _session = ProfileSession(os.path.join(profile_dir, run_id), mode)
+    set_profile_hook(_session)
+    logger.info("🔬 Profiling stages with %s, output in %s", mode, _session.run_dir)
+    return _session
+
+def stop_profiling(top_n=TOP_N):
+    """Stop profiling, write the profiles and log the hotspot summary"""
+    global _session
+    session, _session = _session, None
+    set_profile_hook(None)
+    if session is None:
+        return None
+    summary = session.save(top_n)
+    logger.info("🔬 Profiles written to %s\n%s", session.run_dir, summary)
+    return summary
@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+from engine.schema import FEE_COLUMNS
+
+# Static dimensions are small and read by every stage, so they are also kept
+# uncompressed in Arrow IPC (Feather v2) format next to the Parquet copies
+DIMENSION_TABLES = ['vendor_dim', 'ratecode_dim', 'payment_dim', 'location_dim']
+
+# Appended tables are stored per source file in year=/month= partitions; _sources.json
+# lists the current file and key ranges of every source and is the commit point of a write
+PARTITIONED_TABLES = ['trip_fact', 'datetime_dim', 'distance_dim']
+SOURCE_MANIFEST = '_sources.json'
+# Partition of rows whose pickup date cannot belong to their source file (<table>/quarantine/)
+QUARANTINE = 'quarantine'
+
+# Views of the fee columns on read: as stored, int32 cents, float64 dollars or exact decimals
+FEE_VIEWS = (None, 'cents', 'float', 'decimal')
+FEE_DECIMAL = pa.decimal128(12, 2)
+
+_lock = threading.Lock()
+_table_cache = {}
+
+def star_schema_dir(base_dir='data'):
+    return os.path.join(base_dir, 'parquet', 'star_schema')
+
+def parquet_path(table_name, base_dir='data'):
+    return os.path.join(star_schema_dir(base_dir), f'{table_name}.parquet')
+
+def load_source_manifest(table_dir):
+    path = os.path.join(table_dir, SOURCE_MANIFEST)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def source_ranges(entry):
+    """Key ranges of a manifest entry (early entries held only the ranges themselves)"""
+    if 'ranges' in entry:
+        return entry['ranges']
+    return {table: value for table, value in entry.items() if isinstance(value, list)}
+
+def partition_key(period):
+    """'YYYY-MM' manifest key of a (year, month) partition, QUARANTINE for None"""
+    return QUARANTINE if period is None else f'{period[0]:04d}-{period[1]:02d}'
+
+def partition_period(key):
+    """(year, month) of a manifest partition key, None for the quarantine partition"""
+    if key == QUARANTINE:
+        return None
+    year, month = key.split('-')
+    return int(year), int(month)
+
+def partition_files(entry, table_name):
+    """[(period, relative path)] of one table in a manifest entry, period None for quarantine.
+
+    Sources stored before rows were routed by pickup month hold one file in their own month.
+    """
+    files = entry.get('files', {}).get(table_name)
+    if files is None:
+        return []
+    if isinstance(files, str):
+        return [((entry['year'], entry['month']), files)]
+    return [(partition_period(key), path) for key, path in sorted(files.items())]
+
+def stored_table_files(table_name, base_dir='data', periods=None):
+    """Current files of a stored table; periods limits partitioned tables to (year, month) slices.
+
+    Quarantined rows have no month and are only read when no periods are given.
+    """
+    # Static dimensions are read from their memory-mappable Arrow IPC copy when there is one
+    if table_name in DIMENSION_TABLES and os.path.exists(arrow_path(table_name, base_dir)):
+        return [arrow_path(table_name, base_dir)]
+    table_dir = star_schema_dir(base_dir)
+    files = []
+    legacy_path = parquet_path(table_name, base_dir)
+    # Single-file tables written before partitioning hold rows of unknown month
+    if os.path.exists(legacy_path) and periods is None:
+        files.append(legacy_path)
+    manifest = load_source_manifest(table_dir)
+    for source in sorted(manifest):
+        for period, path in partition_files(manifest[source], table_name):
+            if periods is None or period in periods:
+                files.append(os.path.join(table_dir, path))
+    return files
+
+def fee_view(table, fees):
+    """Fee columns of an Arrow table as 'cents' (int32), 'float' (dollars) or 'decimal' (decimal128(12, 2))"""
+    if fees not in FEE_VIEWS:
+        raise ValueError(f"Unknown fee view {fees!r}, expected one of {FEE_VIEWS}")
+    for column in FEE_COLUMNS:
+        if fees is None or column not in table.column_names:
+            continue
+        index = table.schema.get_field_index(column)
+        values = table.column(index)
+        cents = pa.types.is_integer(values.type)
+        if fees == 'cents' and not cents:
+            values = pc.cast(pc.round(pc.multiply(values, 100.0)), pa.int32())
+        elif fees == 'float' and cents:
+            values = pc.divide(pc.cast(values, pa.float64()), 100.0)
+        elif fees == 'decimal':
+            # cents / 100 is the closest double to the amount, so the cast to 2 decimals is exact
+            dollars = pc.divide(pc.cast(values, pa.float64()), 100.0) if cents else pc.round(values, 2)
+            values = pc.cast(dollars, FEE_DECIMAL)
+        else:
+            continue
+        # Stored pandas dtypes (e.g. Int32) no longer describe the column
+        table = table.set_column(index, column, values).replace_schema_metadata(None)
+    return table
+
+def read_stored_table(table_name, base_dir='data', columns=None, periods=None, arrow_dtypes=True, fees=None):
+    """Read a stored table across all its partitions (or only the given (year, month) periods).
+
+    fees picks the view of the fee columns (see fee_view); months stored with a different
+    fee representation are read as float dollars unless a view is asked for.
+    """
+    tables = [read_arrow_table(path, columns=columns) for path in stored_table_files(table_name, base_dir, periods)]
+    if not tables:
+        return None
+    if fees is None and len({tuple(table.schema.field(col).type for col in FEE_COLUMNS
+                                   if col in table.column_names) for table in tables}) > 1:
+        fees = 'float'
+    table = pa.concat_tables([fee_view(table, fees) for table in tables], promote_options='default')
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+def stored_max_key(table_name, key_column, base_dir='data', manifest=None):
+    """Largest key stored so far, from the manifest ranges and any single-file table"""
+    if manifest is None:
+        manifest = load_source_manifest(star_schema_dir(base_dir))
+    maxima = [source_ranges(entry)[table_name][1]
+              for entry in manifest.values()
+              if table_name in source_ranges(entry) and 'files' in entry]
+    legacy_path = parquet_path(table_name, base_dir)
+    if os.path.exists(legacy_path):
+        legacy_max = max_value(legacy_path, key_column)
+        if legacy_max is not None:
+            maxima.append(int(legacy_max))
+    return max(maxima) if maxima else 0
+
+def arrow_path(table_name, base_dir='data'):
+    return os.path.join(base_dir, 'arrow', 'star_schema', f'{table_name}.arrow')
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+def read_arrow_table(file_path, columns=None):
+    """Open a stored table memory-mapped, Arrow IPC files are cached per file version"""
+    if file_path.endswith(('.arrow', '.feather')):
+        signature = _file_signature(file_path)
+        with _lock:
+            cached = _table_cache.get(file_path)
+            if cached is None or cached[0] != signature:
+                # Uncompressed IPC buffers point straight into the mapped file (zero-copy)
+                table = pa.ipc.open_file(pa.memory_map(file_path, 'r')).read_all()
+                cached = (signature, table)
+                _table_cache[file_path] = cached
+        table = cached[1]
+        return table.select(columns) if columns else table
+    return pq.read_table(file_path, columns=columns, memory_map=True)
+
+def read_table(file_path, columns=None, arrow_dtypes=True, fees=None):
+    """Read a stored table as pandas, Arrow-backed (pd.ArrowDtype) unless arrow_dtypes=False"""
+    table = fee_view(read_arrow_table(file_path, columns=columns), fees)
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+def write_dimension_arrow(table_df, table_name, base_dir='data'):
+    """Write an uncompressed Arrow IPC copy of a dimension, replacing the old one atomically"""
+    file_path = arrow_path(table_name, base_dir)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = file_path + '.tmp'
+    feather.write_feather(table_df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, file_path)
+    return file_path
+
+def max_value(file_path, column):
+    """Max of a column, answered from Parquet row-group statistics when available"""
+    if file_path.endswith('.parquet'):
+        metadata = pq.ParquetFile(file_path).metadata
+        if metadata.num_rows == 0:
+            return None
+        position = metadata.schema.to_arrow_schema().get_field_index(column)
+        maxima = []
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(position).statistics
+            if statistics is None or not statistics.has_min_max:
+                maxima = None
+                break
+            maxima.append(statistics.max)
+        if maxima:
+            return max(maxima)
+    values = read_arrow_table(file_path, columns=[column]).column(column)
+    return pc.max(values).as_py()
@@ -0,0 +1,179 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from engine.logger_config import setup_logger
+
+logger = setup_logger('registry')
+
+# One row per TLC source file; SQLite serializes writers across processes, so a manual
+# backfill and the resident service can share the registry and split months between them
+REGISTRY_DB = os.environ.get('PIPELINE_REGISTRY_DB', os.path.join('data', 'registry.sqlite3'))
+# JSON registry of earlier versions, imported once on first use
+LEGACY_REGISTER = os.path.join('data', 'stored_files.json')
+# A claim older than this is considered abandoned by a crashed worker
+CLAIM_TIMEOUT = int(os.environ.get('PIPELINE_CLAIM_TIMEOUT', 6 * 3600))
+
+VERSION_FIELDS = ('etag', 'last_modified', 'content_length', 'sha256')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_files (
+    fname          TEXT PRIMARY KEY,
+    status         TEXT NOT NULL,
+    etag           TEXT,
+    last_modified  TEXT,
+    content_length TEXT,
+    sha256         TEXT,
+    claimed_by     TEXT,
+    claimed_at     REAL,
+    started_at     TEXT,
+    finished_at    TEXT,
+    duration_sec   REAL,
+    rows_loaded    INTEGER,
+    rows_stored    INTEGER,
+    error          TEXT,
+    stored_at      TEXT
+)
+"""
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def connect(path=None):
+    path = path or REGISTRY_DB
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(_SCHEMA)
+    _import_legacy(conn)
+    return conn
+
+@contextmanager
+def _using(conn=None):
+    """Use the caller's connection, or open one for this call and close it afterwards"""
+    if conn is not None:
+        yield conn
+        return
+    conn = connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+@contextmanager
+def _transaction(conn):
+    # IMMEDIATE takes the write lock up front, so read-check-write sequences are atomic
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+def _import_legacy(conn, legacy_path=None):
+    legacy_path = legacy_path or LEGACY_REGISTER
+    try:
+        with open(legacy_path, 'r') as f:
+            legacy = json.load(f)
+    except FileNotFoundError:
+        return
+    # Oldest format was a plain list of file names
+    if isinstance(legacy, list):
+        legacy = {fname: {} for fname in legacy}
+    with _transaction(conn):
+        for fname, version in legacy.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO source_files (fname, status, etag, last_modified, content_length, sha256, stored_at) "
+                "VALUES (?, 'stored', ?, ?, ?, ?, ?)",
+                (fname, *(version.get(field) for field in VERSION_FIELDS), version.get('stored_at')))
+    try:
+        os.replace(legacy_path, legacy_path + '.migrated')
+    except FileNotFoundError:
+        # Another process imported it at the same time (INSERT OR IGNORE kept that harmless)
+        return
+    logger.info("📦 Imported %s entries from %s into the registry", len(legacy), legacy_path)
+
+def stored_files(conn=None):
+    """{fname: row} of every stored source file"""
+    with _using(conn) as conn:
+        rows = conn.execute("SELECT * FROM source_files WHERE status = 'stored'").fetchall()
+    return {row['fname']: dict(row) for row in rows}
+
+def get_file(fname, conn=None):
+    with _using(conn) as conn:
+        row = conn.execute("SELECT * FROM source_files WHERE fname = ?", (fname,)).fetchone()
+    return dict(row) if row else None
+
+def claim_file(fname, worker=None, conn=None, claim_timeout=CLAIM_TIMEOUT, seen=None):
+    """Atomically claim a source file for processing; False when another worker holds it.
+
+    seen is the stored entry the caller decided from (None for a file it found new). A file
+    stored by another worker since then is refused, so a finished month is not processed
+    again from stale validators. A stored file keeps its 'stored' status while it is
+    reprocessed; only the claim columns mark it as taken.
+    """
+    worker = worker or worker_id()
+    now = time.time()
+    with _using(conn) as conn, _transaction(conn):
+        row = conn.execute("SELECT * FROM source_files WHERE fname = ?", (fname,)).fetchone()
+        if (row is not None and row['claimed_by'] is not None and row['claimed_by'] != worker
+                and now - (row['claimed_at'] or 0) < claim_timeout):
+            return False
+        if row is not None and row['status'] == 'stored':
+            if seen is None or any(row[field] != seen.get(field) for field in VERSION_FIELDS + ('stored_at',)):
+                return False
+        conn.execute(
+            "INSERT INTO source_files (fname, status, claimed_by, claimed_at, started_at) "
+            "VALUES (?, 'running', ?, ?, ?) "
+            "ON CONFLICT(fname) DO UPDATE SET "
+            "status = CASE WHEN status = 'stored' THEN 'stored' ELSE 'running' END, "
+            "claimed_by = excluded.claimed_by, claimed_at = excluded.claimed_at, started_at = excluded.started_at",
+            (fname, worker, now, _now()))
+        return True
+
+def _finish(conn, fname, status, fields):
+    row = conn.execute("SELECT claimed_at FROM source_files WHERE fname = ?", (fname,)).fetchone()
+    duration = time.time() - row['claimed_at'] if row and row['claimed_at'] else None
+    fields = {**fields, 'status': status, 'finished_at': _now(), 'duration_sec': duration,
+              'claimed_by': None, 'claimed_at': None}
+    columns = ', '.join(fields)
+    placeholders = ', '.join('?' for _ in fields)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in fields)
+    conn.execute(f"INSERT INTO source_files (fname, {columns}) VALUES (?, {placeholders}) "
+                 f"ON CONFLICT(fname) DO UPDATE SET {updates}", (fname, *fields.values()))
+
+def commit_file(fname, conn=None, rows_loaded=None, rows_stored=None, **version):
+    """Record a source file as stored, with its version, row counts and timing"""
+    fields = {field: version.get(field) for field in VERSION_FIELDS}
+    fields.update(rows_loaded=rows_loaded, rows_stored=rows_stored, error=None, stored_at=_now())
+    with _using(conn) as conn, _transaction(conn):
+        _finish(conn, fname, 'stored', fields)
+
+def fail_file(fname, error, conn=None):
+    """Release a claim after a failure; the file is picked up again by the next poll.
+
+    A previously stored file stays 'stored' (its rows are still the committed version),
+    the failure is only recorded in its error column.
+    """
+    with _using(conn) as conn, _transaction(conn):
+        row = conn.execute("SELECT status FROM source_files WHERE fname = ?", (fname,)).fetchone()
+        if row is not None and row['status'] == 'stored':
+            conn.execute("UPDATE source_files SET error = ?, claimed_by = NULL, claimed_at = NULL WHERE fname = ?",
+                         (str(error)[:2000], fname))
+            return
+        _finish(conn, fname, 'failed', {'error': str(error)[:2000]})
+
+def update_version(fname, version, conn=None):
+    """Fill in validators of a stored entry without touching its status"""
+    with _using(conn) as conn:
+        conn.execute("UPDATE source_files SET etag = ?, last_modified = ?, content_length = ? WHERE fname = ?",
+                     (version.get('etag'), version.get('last_modified'), version.get('content_length'), fname))
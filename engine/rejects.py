@@ -0,0 +1,122 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from engine.logger_config import setup_logger, log_execution_time
+from engine.storer import source_period
+
+logger = setup_logger('rejects')
+
+# Why the cleaner rejected a row; reject_reason holds the OR of every rule the row failed
+# in the stage that dropped it
+REJECT_REASONS = {
+    'negative_fee': 1,
+    'short_trip': 2,
+    'long_trip': 4,
+    'implausible_speed': 8,
+    'duplicate': 16,
+    'missing_time': 32
+}
+REJECTS_TABLE = 'rejected_trips'
+
+def rejects_dir(base_dir='data'):
+    return os.path.join(base_dir, 'parquet', REJECTS_TABLE)
+
+def rejects_path(source, base_dir='data'):
+    year, month = source_period(source)
+    stem = os.path.basename(source).replace('.parquet', '')
+    return os.path.join(rejects_dir(base_dir), f'year={year:04d}', f'month={month:02d}', f'{stem}.parquet')
+
+def reason_names(mask):
+    """['negative_fee', 'duplicate'] for the reason bitmask 17"""
+    return [name for name, bit in REJECT_REASONS.items() if int(mask) & bit]
+
+class RejectCollector:
+    """Rows the cleaner stages dropped in one run, kept until store_rejects writes them once.
+
+    Stages hand over the rows and the reason codes they already computed for their filter,
+    so collecting costs no extra pass over the month. Every cleaner run calls add, also
+    with no rows, so an empty collector whose cleaners never ran (their output came from
+    the stage cache) is told apart from a month with nothing to reject.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.cleaned = False
+        self._lock = threading.Lock()
+
+    def add(self, rows, reasons):
+        self.cleaned = True
+        if not len(rows):
+            return
+        rows = rows.reset_index(drop=True)
+        rows['reject_reason'] = np.asarray(reasons, dtype=np.uint8)
+        with self._lock:
+            self.frames.append(rows)
+
+    def __len__(self):
+        return sum(len(frame) for frame in self.frames)
+
+    def to_frame(self):
+        if not self.frames:
+            return pd.DataFrame({'reject_reason': pd.Series(dtype=np.uint8)})
+        frame = pd.concat(self.frames, ignore_index=True)
+        frame['reject_reason'] = frame['reject_reason'].astype(np.uint8)
+        return frame
+
+def collect_rejects():
+    """Pipeline stage: the collector the cleaner stages add their rejected rows to"""
+    return RejectCollector()
+
+@log_execution_time
+def store_rejects(rejects, source=None, base_dir='data'):
+    """Pipeline stage: write a month's rejected rows to rejected_trips/year=/month=/<source>.parquet.
+
+    One file per source, replaced when a republished month is cleaned again. When no
+    cleaner stage ran, the stored file is left as it is.
+    """
+    try:
+        if not rejects.cleaned:
+            # The cleaned month came from the stage cache: the stored file is still current
+            logger.warning("⚠️ Cleaner stages did not run, stored rejected rows of %s kept", source)
+            return None
+        frame = rejects.to_frame()
+        counts = {name: int((frame['reject_reason'].to_numpy() & bit).astype(bool).sum())
+                  for name, bit in REJECT_REASONS.items()}
+        logger.info("🚫 %s rejected rows: %s", len(frame),
+                    ", ".join(f"{name} {count:,}" for name, count in counts.items() if count))
+        if source is None:
+            logger.warning("⚠️ No source file name, rejected rows not persisted")
+            return counts
+        path = rejects_path(source, base_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        frame.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(tmp_path, path)
+        logger.info("✅ Rejected rows of %s stored in %s", source, path)
+        return counts
+
+    except Exception as e:
+        logger.error("❌ Error storing rejected rows: %s", e)
+        raise
+
+def read_rejects(base_dir='data', periods=None, reasons=None):
+    """Stored rejected rows, optionally for (year, month) periods and with any of the named reasons"""
+    directory = rejects_dir(base_dir)
+    frames = []
+    for root, _, names in sorted(os.walk(directory)):
+        for name in sorted(names):
+            if not name.endswith('.parquet'):
+                continue
+            if periods is not None and source_period(name) not in set(map(tuple, periods)):
+                continue
+            frame = pd.read_parquet(os.path.join(root, name))
+            frame['source'] = name
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame({'reject_reason': pd.Series(dtype=np.uint8), 'source': pd.Series(dtype=object)})
+    frame = pd.concat(frames, ignore_index=True)
+    if reasons:
+        mask = np.bitwise_or.reduce([REJECT_REASONS[name] for name in reasons])
+        frame = frame[(frame['reject_reason'].to_numpy() & mask) != 0].reset_index(drop=True)
+    return frame
@@ -0,0 +1,220 @@
+import os
+import numpy as np
+import pandas as pd
+from engine.logger_config import setup_logger, log_execution_time
+from engine.schema import to_dollars
+from engine.storer import manifest_lock, source_period
+
+logger = setup_logger('routes')
+
+# Dense pickup x dropoff matrix over the TLC zones, indexed by location_key - 1
+ZONE_COUNT = 265
+# Summed per zone pair; averages are derived on query
+MEASURES = ('trips', 'duration_sec', 'trip_distance', 'fare_amount', 'total_amount')
+ROUTES_DIR = 'zone_pairs'
+
+def routes_dir(base_dir='data'):
+    return os.path.join(base_dir, ROUTES_DIR)
+
+def _month_path(source, base_dir='data'):
+    stem = os.path.basename(source).replace('.parquet', '')
+    return os.path.join(routes_dir(base_dir), 'months', f'{stem}.npy')
+
+def _total_path(base_dir='data'):
+    return os.path.join(routes_dir(base_dir), 'total.npy')
+
+def _save(path, values):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, values)
+    os.replace(tmp_path, path)
+
+def _lookup(keys, dim, key_column, value_column):
+    """dim[value_column] for each key and whether the key was found (binary search on the keys)"""
+    keys = np.nan_to_num(np.asarray(keys, dtype=np.float64), nan=-1).astype(np.int64)
+    values = dim[value_column].to_numpy()
+    if len(values) == 0:
+        return np.zeros(len(keys), dtype=values.dtype), np.zeros(len(keys), dtype=bool)
+    dim_keys = dim[key_column].to_numpy(dtype=np.int64)
+    order = np.argsort(dim_keys, kind='stable')
+    dim_keys, values = dim_keys[order], values[order]
+    positions = np.minimum(np.searchsorted(dim_keys, keys), len(dim_keys) - 1)
+    return values[positions], dim_keys[positions] == keys
+
+class ZonePairMatrix:
+    """Aggregates per (pickup zone, dropoff zone): trips, and sums of duration, distance and fares.
+
+    values has shape (len(MEASURES), ZONE_COUNT, ZONE_COUNT); a pair is answered by
+    indexing, so queries never touch trip_fact.
+    """
+
+    def __init__(self, values=None):
+        if values is None:
+            values = np.zeros((len(MEASURES), ZONE_COUNT, ZONE_COUNT), dtype=np.float64)
+        self.values = values
+
+    def __add__(self, other):
+        return ZonePairMatrix(self.values + other.values)
+
+    def __sub__(self, other):
+        return ZonePairMatrix(self.values - other.values)
+
+    def measure(self, name):
+        return self.values[MEASURES.index(name)]
+
+    def pair(self, pickup_location_key, dropoff_location_key):
+        """Sums and averages of one zone pair"""
+        cell = self.values[:, pickup_location_key - 1, dropoff_location_key - 1]
+        result = {name: float(value) for name, value in zip(MEASURES, cell)}
+        result['trips'] = int(result['trips'])
+        trips, hours = result['trips'], result['duration_sec'] / 3600
+        result['avg_duration_sec'] = result['duration_sec'] / trips if trips else None
+        result['avg_fare'] = result['fare_amount'] / trips if trips else None
+        result['avg_mph'] = result['trip_distance'] / hours if hours else None
+        result['fare_per_mile'] = result['fare_amount'] / result['trip_distance'] if result['trip_distance'] else None
+        return result
+
+    def to_frame(self):
+        """Long format of the non-empty pairs: one row per (pickup, dropoff) with sums and averages"""
+        trips = self.measure('trips')
+        pickup, dropoff = np.nonzero(trips)
+        frame = pd.DataFrame({'pickup_location_key': pickup + 1, 'dropoff_location_key': dropoff + 1})
+        for name in MEASURES:
+            frame[name] = self.measure(name)[pickup, dropoff]
+        frame['trips'] = frame['trips'].astype(np.int64)
+        frame['avg_duration_sec'] = frame['duration_sec'] / frame['trips']
+        frame['avg_mph'] = frame['trip_distance'] / (frame['duration_sec'] / 3600).replace(0, np.nan)
+        frame['fare_per_mile'] = frame['fare_amount'] / frame['trip_distance'].replace(0, np.nan)
+        return frame
+
+    def top_routes(self, n=10, measure='trips'):
+        frame = self.to_frame()
+        return frame.nlargest(n, measure).reset_index(drop=True)
+
+def zone_pair_matrix(trip_fact, datetime_dim, distance_dim):
+    """Aggregate one batch of the fact table into a zone-pair matrix with one bincount per measure"""
+    pickup = trip_fact['pickup_location_key'].to_numpy(dtype=np.float64, na_value=np.nan)
+    dropoff = trip_fact['dropoff_location_key'].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = (pickup >= 1) & (pickup <= ZONE_COUNT) & (dropoff >= 1) & (dropoff <= ZONE_COUNT)
+    dropped = int((~valid).sum())
+    if dropped:
+        logger.warning("⚠️ %s trips without a known zone pair left out of the matrix", dropped)
+    cells = ((pickup[valid] - 1) * ZONE_COUNT + (dropoff[valid] - 1)).astype(np.int64)
+
+    if 'duration_sec' in trip_fact.columns:
+        duration = trip_fact['duration_sec'].to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        # Facts stored before the cleaner kept durations: map back through datetime_dim
+        pickups, found_pickup = _lookup(trip_fact['datetime_key'], datetime_dim, 'datetime_key', 'pickup_datetime')
+        dropoffs, found_dropoff = _lookup(trip_fact['datetime_key'], datetime_dim, 'datetime_key', 'dropoff_datetime')
+        duration = (pd.to_datetime(dropoffs) - pd.to_datetime(pickups)).total_seconds().to_numpy()
+        duration = np.where(found_pickup & found_dropoff, duration, np.nan)
+    # Distance lives in distance_dim, mapped back through the fact's keys
+    distance, found_distance = _lookup(trip_fact['distance_key'], distance_dim, 'distance_key', 'trip_distance')
+    distance = np.where(found_distance, distance.astype(np.float64), np.nan)
+    weights = {
+        'trips': None,
+        'duration_sec': duration,
+        'trip_distance': distance,
+        'fare_amount': to_dollars(trip_fact['fare_amount']),
+        'total_amount': to_dollars(trip_fact['total_amount'])
+    }
+    matrix = ZonePairMatrix()
+    for position, name in enumerate(MEASURES):
+        measure = weights[name]
+        if measure is not None:
+            measure = np.nan_to_num(measure[valid], nan=0.0)
+        matrix.values[position] = np.bincount(cells, weights=measure,
+                                              minlength=ZONE_COUNT * ZONE_COUNT).reshape(ZONE_COUNT, ZONE_COUNT)
+    return matrix
+
+def _month_files(base_dir='data'):
+    """Paths of the stored month matrices (left-over temporary files are skipped)"""
+    months_dir = os.path.join(routes_dir(base_dir), 'months')
+    names = sorted(os.listdir(months_dir)) if os.path.isdir(months_dir) else []
+    return [os.path.join(months_dir, name) for name in names
+            if name.endswith('.npy') and not name.endswith('.tmp.npy')]
+
+def _total_is_current(base_dir='data'):
+    """Whether the running total was saved after every month matrix.
+
+    A month is saved before the total, so a month newer than the total means a run stopped
+    in between and the total misses (or double-counts) that month.
+    """
+    total_path = _total_path(base_dir)
+    if not os.path.exists(total_path):
+        return not _month_files(base_dir)
+    saved = os.stat(total_path).st_mtime_ns
+    return all(os.stat(path).st_mtime_ns <= saved for path in _month_files(base_dir))
+
+def _sum_months(base_dir='data'):
+    total = ZonePairMatrix()
+    for path in _month_files(base_dir):
+        total += ZonePairMatrix(np.load(path))
+    return total
+
+def load_zone_pairs(base_dir='data', periods=None):
+    """Zone-pair matrix over everything stored, or summed over the given (year, month) periods.
+
+    The running total is memory-mapped, so single-pair lookups read a few pages only. A total
+    older than one of the months is not trusted; the months are summed instead.
+    """
+    if periods is None:
+        if not _total_is_current(base_dir):
+            return _sum_months(base_dir)
+        path = _total_path(base_dir)
+        if not os.path.exists(path):
+            return ZonePairMatrix()
+        return ZonePairMatrix(np.load(path, mmap_mode='r'))
+    periods = set(map(tuple, periods))
+    matrix = ZonePairMatrix()
+    for path in _month_files(base_dir):
+        if source_period(os.path.basename(path)[:-4]) in periods:
+            matrix += ZonePairMatrix(np.load(path))
+    return matrix
+
+@log_execution_time
+def update_zone_pairs(trip_fact, datetime_dim, distance_dim, source=None, base_dir='data'):
+    """Pipeline stage: store this month's zone-pair matrix and fold it into the running total.
+
+    A republished month first takes its previous matrix back out of the total, so the
+    update costs one 265x265 matrix per month however many months are stored.
+    """
+    try:
+        logger.info("Updating zone-pair matrix...")
+        matrix = zone_pair_matrix(trip_fact, datetime_dim, distance_dim)
+        if source is None:
+            logger.warning("⚠️ No source file name, zone-pair matrix not persisted")
+            return matrix
+        directory = routes_dir(base_dir)
+        os.makedirs(directory, exist_ok=True)
+        month_path = _month_path(source, base_dir)
+        # Several workers may store months at once; the total is a read-modify-write
+        with manifest_lock(directory):
+            if _total_is_current(base_dir):
+                total = ZonePairMatrix(np.array(load_zone_pairs(base_dir).values))
+            else:
+                logger.warning("⚠️ Zone-pair total is older than a stored month, rebuilding it from the months")
+                total = _sum_months(base_dir)
+            if os.path.exists(month_path):
+                total -= ZonePairMatrix(np.load(month_path))
+            total += matrix
+            # Month first: after a crash in between, the month is newer than the total and the
+            # next update (or read) sums the months again instead of applying it twice
+            _save(month_path, matrix.values)
+            _save(_total_path(base_dir), total.values)
+        pairs = int(np.count_nonzero(matrix.measure('trips')))
+        logger.info("✅ Zone-pair matrix updated: %s pairs this month, %s trips in total",
+                    pairs, int(total.measure('trips').sum()))
+        return matrix
+
+    except Exception as e:
+        logger.error("❌ Error updating zone-pair matrix: %s", e)
+        raise
+
+def rebuild_zone_pairs(base_dir='data'):
+    """Recompute the running total from the stored month matrices"""
+    with manifest_lock(routes_dir(base_dir)):
+        total = _sum_months(base_dir)
+        _save(_total_path(base_dir), total.values)
+    return total
@@ -0,0 +1,205 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from engine.logger_config import setup_logger
+
+logger = setup_logger('runner')
+
+# Stage spec (pipeline.json):
+#   name    output name other stages refer to
+#   fn      function name, resolved by the caller (e.g. "trip_data", "storer.store_to_parquet")
+#   inputs  positional arguments: stage outputs or seed values (url, fname, ...)
+#   kwargs  keyword arguments; "@stage" refers to a stage output, "$var" to a run variable
+#   after   ordering-only dependencies
+#   cache   persist the DataFrame output so partial reruns can start from it
+#   enabled false to drop the stage from the graph
+
+def _references(value):
+    if isinstance(value, str) and value.startswith('@'):
+        return [value[1:]]
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _references(item)]
+    if isinstance(value, (list, tuple)):
+        return [ref for item in value for ref in _references(item)]
+    return []
+
+def _resolve(value, outputs, variables):
+    if isinstance(value, str) and value.startswith('@'):
+        return outputs[value[1:]]
+    if isinstance(value, str) and value.startswith('$'):
+        return variables[value[1:]]
+    if isinstance(value, dict):
+        return {key: _resolve(item, outputs, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve(item, outputs, variables) for item in value]
+    return value
+
+def data_dependencies(stage, seeds=()):
+    """Stage outputs this stage reads (seeds such as url are not stages)"""
+    refs = [name for name in stage.get('inputs', []) if name not in seeds]
+    refs += _references(stage.get('kwargs', {}))
+    return list(dict.fromkeys(refs))
+
+def validate_stages(stages, seeds=()):
+    """Check names, references and that the graph has no cycles"""
+    by_name = {}
+    for stage in stages:
+        if stage['name'] in by_name:
+            raise ValueError(f"Duplicate stage name: {stage['name']}")
+        by_name[stage['name']] = stage
+    for stage in stages:
+        for ref in data_dependencies(stage, seeds) + stage.get('after', []):
+            if ref not in by_name:
+                raise ValueError(f"Stage {stage['name']} depends on unknown stage {ref}")
+
+    visiting, done = set(), set()
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage graph has a cycle: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        stage = by_name[name]
+        for ref in data_dependencies(stage, seeds) + stage.get('after', []):
+            visit(ref, path + [name])
+        visiting.discard(name)
+        done.add(name)
+    for name in by_name:
+        visit(name, [])
+    return by_name
+
+def cache_path(cache_dir, run_key, name):
+    return os.path.join(cache_dir, run_key, f'{name}.parquet')
+
+def plan_stages(stages, seeds=(), only=None, skip=None, cache_dir=None, run_key=None):
+    """Decide per stage whether it runs, is loaded from the stage cache, or is left out"""
+    skip = set(skip or [])
+    by_name = validate_stages([stage for stage in stages if stage.get('enabled', True)], seeds)
+    # Skipping a stage also skips everything that reads its output
+    changed = True
+    while changed:
+        changed = False
+        for name, stage in by_name.items():
+            if name not in skip and any(ref in skip for ref in data_dependencies(stage, seeds)):
+                skip.add(name)
+                changed = True
+    targets = [name for name in (only or by_name) if name not in skip]
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {unknown}")
+
+    plan = {}
+    def need(name, is_target):
+        if name in plan and (plan[name] == 'run' or not is_target):
+            return
+        stage = by_name[name]
+        cached = (not is_target and stage.get('cache') and cache_dir and run_key
+                  and os.path.exists(cache_path(cache_dir, run_key, name)))
+        plan[name] = 'load' if cached else 'run'
+        if plan[name] == 'run':
+            for ref in data_dependencies(stage, seeds):
+                need(ref, False)
+    for name in targets:
+        need(name, True)
+    return plan, by_name
+
+def _write_cache(output, path):
+    import pandas as pd
+    if not isinstance(output, pd.DataFrame):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    output.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, path)
+    return True
+
+def _read_cache(path):
+    import pandas as pd
+    return pd.read_parquet(path)
+
+def clear_cache(cache_dir, run_key):
+    shutil.rmtree(os.path.join(cache_dir, run_key), ignore_errors=True)
+
+def run_stages(stages, resolve, seeds=None, variables=None, max_workers=4, only=None, skip=None,
+               cache_dir=None, run_key=None, governor=None):
+    """Run the stage graph, independent stages concurrently on a thread pool.
+
+    Returns {'outputs': ..., 'timings': ..., 'rows': ..., 'plan': ...}. Intermediate outputs are
+    released as soon as their last reader finishes; requested (only) stages and leaf
+    stages are kept in outputs. With a memory governor, stage outputs calibrate its
+    per-row costs and no new stage starts next to running ones while RSS is near the budget.
+    """
+    seeds = dict(seeds or {})
+    variables = {**seeds, **(variables or {})}
+    plan, by_name = plan_stages(stages, seeds, only=only, skip=skip, cache_dir=cache_dir, run_key=run_key)
+    keep = set(only or [])
+    outputs = dict(seeds)
+    timings, rows = {}, {}
+
+    # How many planned stages still have to read each output
+    readers = {name: 0 for name in plan}
+    for name, action in plan.items():
+        if action == 'run':
+            for ref in data_dependencies(by_name[name], seeds):
+                readers[ref] += 1
+
+    def release(name):
+        for ref in data_dependencies(by_name[name], seeds):
+            readers[ref] -= 1
+            if readers[ref] == 0 and ref not in keep:
+                outputs.pop(ref, None)
+
+    def execute(name):
+        stage = by_name[name]
+        start = time.perf_counter()
+        if plan[name] == 'load':
+            result = _read_cache(cache_path(cache_dir, run_key, name))
+        else:
+            fn = resolve(stage['fn'])
+            args = [outputs[ref] for ref in stage.get('inputs', [])]
+            kwargs = _resolve(stage.get('kwargs', {}), outputs, variables)
+            result = fn(*args, **kwargs)
+            if stage.get('cache') and cache_dir and run_key:
+                _write_cache(result, cache_path(cache_dir, run_key, name))
+        return result, time.perf_counter() - start
+
+    def ready(name):
+        deps = data_dependencies(by_name[name], seeds) if plan[name] == 'run' else []
+        deps += [ref for ref in by_name[name].get('after', []) if ref in plan]
+        return all(ref in finished for ref in deps)
+
+    pending, finished, running = set(plan), set(), {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            for name in sorted(name for name in pending if ready(name)):
+                if governor is not None and not governor.can_start(len(running)):
+                    break
+                pending.discard(name)
+                running[pool.submit(execute, name)] = name
+            if not running:
+                raise RuntimeError(f"Stages can never become ready: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+                outputs[name] = result
+                timings[name] = elapsed
+                if hasattr(result, 'columns'):
+                    rows[name] = len(result)
+                if governor is not None:
+                    governor.record(name, result)
+                finished.add(name)
+                if plan[name] == 'run':
+                    release(name)
+
+    summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in
+                        sorted(timings.items(), key=lambda item: item[1], reverse=True))
+    logger.info("⏱️ Stage timings: %s", summary)
+    return {'outputs': {name: value for name, value in outputs.items() if name in plan},
+            'timings': timings, 'rows': rows, 'plan': plan}
@@ -0,0 +1,129 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from engine.logger_config import setup_logger
+
+logger = setup_logger('scheduler')
+
+POLL_INTERVAL = int(os.environ.get('PIPELINE_POLL_INTERVAL', 3600))
+MAX_BACKOFF = int(os.environ.get('PIPELINE_MAX_BACKOFF', 6 * 3600))
+HEALTH_HOST = os.environ.get('PIPELINE_HEALTH_HOST', '127.0.0.1')
+HEALTH_PORT = int(os.environ.get('PIPELINE_HEALTH_PORT', 8080))
+# Consecutive failed cycles before /health reports the daemon as unhealthy
+UNHEALTHY_AFTER = 3
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+def next_delay(consecutive_failures, interval=POLL_INTERVAL, max_backoff=MAX_BACKOFF):
+    """Seconds to wait before the next cycle: the poll interval, doubled per failure up to max_backoff"""
+    if consecutive_failures == 0:
+        return interval
+    return min(interval * 2 ** consecutive_failures, max_backoff)
+
+class SchedulerStatus:
+    """Thread-safe status shared between the poll loop and the health endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {
+            'state': 'starting',
+            'started_at': _now(),
+            'cycles': 0,
+            'consecutive_failures': 0,
+            'last_run_started': None,
+            'last_run_finished': None,
+            'last_result': None,
+            'last_error': None,
+            'next_run': None
+        }
+
+    def update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._status)
+
+    @property
+    def healthy(self):
+        return self.snapshot()['consecutive_failures'] < UNHEALTHY_AFTER
+
+def _make_handler(status):
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                code = 200 if status.healthy else 503
+                body = {'status': 'ok' if code == 200 else 'failing'}
+            elif self.path == '/status':
+                code, body = 200, status.snapshot()
+            else:
+                code, body = 404, {'error': 'not found'}
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # Health probes every few seconds would flood the pipeline log
+            pass
+    return HealthHandler
+
+def start_health_server(status, host=HEALTH_HOST, port=HEALTH_PORT):
+    """Serve /health and /status from a daemon thread, returns the server"""
+    server = ThreadingHTTPServer((host, port), _make_handler(status))
+    thread = threading.Thread(target=server.serve_forever, name='health-server', daemon=True)
+    thread.start()
+    logger.info("🩺 Health endpoint listening on http://%s:%s/health", host, server.server_address[1])
+    return server
+
+def run_scheduler(run_cycle, interval=POLL_INTERVAL, max_backoff=MAX_BACKOFF, health_port=HEALTH_PORT,
+                  stop_event=None, max_cycles=None):
+    """Keep the process alive and run run_cycle every interval, backing off after failures"""
+    stop_event = stop_event or threading.Event()
+    status = SchedulerStatus()
+    server = start_health_server(status, port=health_port) if health_port is not None else None
+
+    def _stop(signum, frame):
+        logger.info("🛑 Received signal %s, stopping after the current cycle", signum)
+        stop_event.set()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+    logger.info("🔁 Scheduler started: polling every %ss (max backoff %ss)", interval, max_backoff)
+    try:
+        while not stop_event.is_set():
+            status.update(state='running', last_run_started=_now())
+            failures = status.snapshot()['consecutive_failures']
+            try:
+                result = run_cycle()
+                failures = 0
+                status.update(last_result=result, last_error=None)
+            except Exception as e:
+                failures += 1
+                logger.error("❌ Scheduler cycle failed (%s in a row): %s", failures, e)
+                status.update(last_error=str(e))
+
+            cycles = status.snapshot()['cycles'] + 1
+            delay = next_delay(failures, interval, max_backoff)
+            status.update(state='idle', cycles=cycles, consecutive_failures=failures, last_run_finished=_now(),
+                          next_run=datetime.fromtimestamp(time.time() + delay).isoformat(timespec='seconds'))
+            if max_cycles is not None and cycles >= max_cycles:
+                break
+            logger.info("💤 Next poll in %ss", delay)
+            stop_event.wait(delay)
+    finally:
+        status.update(state='stopped')
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    logger.info("👋 Scheduler stopped")
+    return status.snapshot()
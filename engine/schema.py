@@ -0,0 +1,220 @@
+import os
+from engine.logger_config import setup_logger
+
+logger = setup_logger('schema')
+
+# Common column layout every fleet is conformed to before cleaning/transforming
+FEE_COLUMNS = ['fare_amount', 'extra', 'mta_tax', 'tip_amount', 'tolls_amount',
+               'improvement_surcharge', 'total_amount', 'congestion_surcharge',
+               'airport_fee', 'cbd_congestion_fee']
+
+COMMON_DTYPES = {
+    'vendor_id': 'int32',
+    'pickup_datetime': 'datetime64[ns]',
+    'dropoff_datetime': 'datetime64[ns]',
+    'passenger_count': 'float64',
+    'trip_distance': 'float64',
+    'ratecode_id': 'float64',
+    'store_and_fwd': 'object',
+    'pickup_location_id': 'int32',
+    'dropoff_location_id': 'int32',
+    'payment_id': 'int32',
+    **{col: 'float64' for col in FEE_COLUMNS},
+}
+COMMON_COLUMNS = list(COMMON_DTYPES)
+
+# Opt-in fixed-point fees: int32 cents instead of float64 dollars (PIPELINE_FEE_CENTS=1).
+# Halves memory and Parquet size of the largest group of fact columns, and makes
+# remove_duplicates and sums exact
+FEE_CENTS = os.environ.get('PIPELINE_FEE_CENTS') == '1'
+CENTS_LIMIT = 2 ** 31 - 1
+
+# Zone 264 is TLC's "Unknown" zone, used when a fleet leaves location ids empty
+UNKNOWN_LOCATION_ID = 264
+
+def _hvfhv_total_amount(raw):
+    # HVFHV files have no total_amount, rebuild it from the rider-paid components
+    parts = ['base_passenger_fare', 'tolls', 'bcf', 'sales_tax', 'congestion_surcharge',
+             'airport_fee', 'tips', 'cbd_congestion_fee']
+    present = [col for col in parts if col in raw.columns]
+    return raw[present].sum(axis=1, min_count=1)
+
+# Per-fleet mapping from raw TLC columns to the common schema.
+#   rename   : raw column -> common column
+#   values   : common column -> mapping applied to raw values (e.g. license codes)
+#   derived  : common column -> callable(raw frame) for columns with no raw equivalent
+#   defaults : common column -> constant used when the fleet has no such column
+FLEET_SCHEMAS = {
+    'yellow': {
+        'rename': {'VendorID': 'vendor_id',
+                   'tpep_pickup_datetime': 'pickup_datetime',
+                   'tpep_dropoff_datetime': 'dropoff_datetime',
+                   'passenger_count': 'passenger_count',
+                   'trip_distance': 'trip_distance',
+                   'RatecodeID': 'ratecode_id',
+                   'store_and_fwd_flag': 'store_and_fwd',
+                   'PULocationID': 'pickup_location_id',
+                   'DOLocationID': 'dropoff_location_id',
+                   'payment_type': 'payment_id',
+                   'Airport_fee': 'airport_fee',
+                   'airport_fee': 'airport_fee',
+                   **{col: col for col in FEE_COLUMNS if col != 'airport_fee'}},
+    },
+    'green': {
+        'rename': {'VendorID': 'vendor_id',
+                   'lpep_pickup_datetime': 'pickup_datetime',
+                   'lpep_dropoff_datetime': 'dropoff_datetime',
+                   'passenger_count': 'passenger_count',
+                   'trip_distance': 'trip_distance',
+                   'RatecodeID': 'ratecode_id',
+                   'store_and_fwd_flag': 'store_and_fwd',
+                   'PULocationID': 'pickup_location_id',
+                   'DOLocationID': 'dropoff_location_id',
+                   'payment_type': 'payment_id',
+                   **{col: col for col in FEE_COLUMNS if col != 'airport_fee'}},
+        'defaults': {'airport_fee': 0.0},
+    },
+    'fhv': {
+        'rename': {'pickup_datetime': 'pickup_datetime',
+                   'dropOff_datetime': 'dropoff_datetime',
+                   'PUlocationID': 'pickup_location_id',
+                   'DOlocationID': 'dropoff_location_id'},
+        'defaults': {'vendor_id': 100, 'payment_id': 5, 'ratecode_id': 99},
+    },
+    'fhvhv': {
+        'rename': {'hvfhs_license_num': 'vendor_id',
+                   'pickup_datetime': 'pickup_datetime',
+                   'dropoff_datetime': 'dropoff_datetime',
+                   'trip_miles': 'trip_distance',
+                   'PULocationID': 'pickup_location_id',
+                   'DOLocationID': 'dropoff_location_id',
+                   'base_passenger_fare': 'fare_amount',
+                   'tips': 'tip_amount',
+                   'tolls': 'tolls_amount',
+                   'congestion_surcharge': 'congestion_surcharge',
+                   'airport_fee': 'airport_fee',
+                   'cbd_congestion_fee': 'cbd_congestion_fee'},
+        'values': {'vendor_id': {'HV0002': 102, 'HV0003': 103, 'HV0004': 104, 'HV0005': 105}},
+        'derived': {'total_amount': _hvfhv_total_amount},
+        'extra_columns': ['bcf', 'sales_tax'],
+        'defaults': {'payment_id': 5, 'ratecode_id': 99, 'extra': 0.0, 'mta_tax': 0.0,
+                     'improvement_surcharge': 0.0},
+    },
+}
+
+# Vendor names for ids that only exist outside the yellow/green feeds
+FLEET_VENDOR_NAMES = {100: 'FHV Dispatch Base', 102: 'Juno', 103: 'Uber', 104: 'Via', 105: 'Lyft'}
+
+DEFAULT_FLEETS = ('yellow',)
+
+def get_fleets():
+    """Fleets to ingest, overridable with TLC_FLEETS=yellow,green,..."""
+    fleets = os.environ.get('TLC_FLEETS')
+    if not fleets:
+        return list(DEFAULT_FLEETS)
+    fleets = [fleet.strip() for fleet in fleets.split(',') if fleet.strip()]
+    unknown = [fleet for fleet in fleets if fleet not in FLEET_SCHEMAS]
+    if unknown:
+        raise ValueError(f"Unknown fleet(s) in TLC_FLEETS: {unknown}")
+    return fleets
+
+def fleet_from_source(source):
+    """Infer the fleet from a TLC file name or URL, e.g. fhvhv_tripdata_2025-01.parquet"""
+    fname = os.path.basename(str(source))
+    prefix = fname.split('_tripdata')[0]
+    if prefix not in FLEET_SCHEMAS:
+        raise ValueError(f"Cannot infer fleet from source name: {fname}")
+    return prefix
+
+def raw_columns(fleet):
+    """Raw columns needed from the source file for this fleet (used for column projection)"""
+    spec = FLEET_SCHEMAS[fleet]
+    columns = list(spec['rename']) + spec.get('extra_columns', [])
+    return list(dict.fromkeys(columns))
+
+def conform_to_schema(raw, fleet, fee_cents=False):
+    """Map a raw TLC frame of any fleet onto the common fact schema (fees as cents with fee_cents)"""
+    # Imported here so fleet discovery (fetcher) does not load pandas
+    import numpy as np
+    import pandas as pd
+    spec = FLEET_SCHEMAS[fleet]
+    rename = {src: dst for src, dst in spec['rename'].items() if src in raw.columns}
+    df = pd.DataFrame(index=raw.index)
+    for src, dst in rename.items():
+        # Older yellow files use airport_fee, newer ones Airport_fee: keep the first present
+        if dst not in df.columns:
+            df[dst] = raw[src]
+
+    for column, mapping in spec.get('values', {}).items():
+        if column in df.columns:
+            df[column] = df[column].map(mapping)
+    for column, derive in spec.get('derived', {}).items():
+        df[column] = derive(raw)
+    for column, value in spec.get('defaults', {}).items():
+        if column not in df.columns:
+            df[column] = value
+
+    for column, dtype in COMMON_DTYPES.items():
+        if column not in df.columns:
+            df[column] = np.nan if dtype != 'object' else None
+        if column.endswith('_location_id'):
+            df[column] = df[column].fillna(UNKNOWN_LOCATION_ID)
+        elif column == 'vendor_id':
+            df[column] = df[column].fillna(0)
+        elif column == 'payment_id':
+            df[column] = df[column].fillna(5)
+        if str(df[column].dtype) != dtype:
+            df[column] = df[column].astype(dtype)
+
+    if fee_cents:
+        df = fees_to_cents(df)
+    df['fleet'] = pd.Series(fleet, index=df.index, dtype='category')
+    return df[COMMON_COLUMNS + ['fleet']]
+
+def is_cents(values):
+    """Whether a fee column holds integer cents rather than float dollars"""
+    return values.dtype.kind in 'iu'
+
+def to_cents(values):
+    """Float dollars -> int32 cents (nullable Int32 when values are missing).
+
+    Values with fractions of a cent are rounded to the nearest cent and counted in a
+    warning; values that do not fit in int32 raise.
+    """
+    import numpy as np
+    import pandas as pd
+    dollars = values.to_numpy(dtype='float64', na_value=np.nan)
+    cents = np.rint(dollars * 100)
+    valid = ~np.isnan(cents)
+    if np.abs(cents[valid]).max(initial=0) > CENTS_LIMIT:
+        raise ValueError(f"{values.name}: values beyond ±{CENTS_LIMIT / 100:,.2f} do not fit in int32 cents")
+    # Tolerance covers binary representation error only (0.1 + 0.2), not real sub-cent amounts
+    sub_cent = int((np.abs(dollars[valid] * 100 - cents[valid]) > 1e-6).sum())
+    if sub_cent:
+        logger.warning("⚠️ %s: %s values with fractions of a cent rounded to the nearest cent", values.name, sub_cent)
+    if valid.all():
+        return pd.Series(cents.astype('int32'), index=values.index, name=values.name)
+    return pd.Series(pd.arrays.IntegerArray(np.where(valid, cents, 0).astype('int32'), ~valid),
+                     index=values.index, name=values.name)
+
+def to_dollars(values):
+    """Fee column as float64 dollars, whichever representation it holds"""
+    import numpy as np
+    dollars = values.to_numpy(dtype='float64', na_value=np.nan)
+    return dollars / 100 if is_cents(values) else dollars
+
+def fees_to_cents(df, columns=FEE_COLUMNS):
+    """Frame with its float fee columns converted to int32 cents (other columns are shared)"""
+    converted = {col: to_cents(df[col]) for col in columns if col in df.columns and not is_cents(df[col])}
+    return df.assign(**converted) if converted else df
+
+def fees_to_dollars(df, columns=FEE_COLUMNS):
+    """Frame with its cent fee columns converted back to float64 dollars"""
+    converted = {col: to_dollars(df[col]) for col in columns if col in df.columns and is_cents(df[col])}
+    return df.assign(**converted) if converted else df
+
+def fees_like(df, reference, columns=FEE_COLUMNS):
+    """Frame in the fee representation of reference, so appended rows match a stored file"""
+    if any(is_cents(reference[col]) for col in columns if col in reference.columns):
+        return fees_to_cents(df, columns)
+    return fees_to_dollars(df, columns)
@@ -0,0 +1,159 @@
+import os
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+from engine.logger_config import setup_logger
+
+logger = setup_logger('shared')
+
+# Frames handed between worker processes are written once as uncompressed Arrow IPC
+# files under the scratch dir; workers memory-map them, so every process reads the
+# same page-cache copy instead of unpickling its own
+SCRATCH_DIR = os.environ.get('PIPELINE_SCRATCH_DIR', os.path.join('data', 'scratch', 'shared'))
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        # Exists but not ours, or no way to tell (Windows): keep the reference
+        return True
+    return True
+
+class SharedFrame:
+    """Picklable handle to a DataFrame published in the scratch dir.
+
+    Every publish/attach holds one reference, recorded as a marker file so that
+    separate processes can count them; the data file is deleted when the last
+    reference is released. Only the name and directory travel when pickled.
+    """
+
+    def __init__(self, name, scratch_dir=SCRATCH_DIR):
+        self.name = name
+        self.scratch_dir = scratch_dir
+        self._token = None
+        self._table = None
+
+    def __getstate__(self):
+        # A reference belongs to the process that took it
+        return {'name': self.name, 'scratch_dir': self.scratch_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['scratch_dir'])
+
+    def __repr__(self):
+        return f"SharedFrame({self.name!r}, {self.scratch_dir!r})"
+
+    @property
+    def path(self):
+        return os.path.join(self.scratch_dir, f'{self.name}.arrow')
+
+    @property
+    def refs_dir(self):
+        return os.path.join(self.scratch_dir, f'{self.name}.refs')
+
+    def references(self):
+        """Number of references currently held, across all processes"""
+        try:
+            return len(os.listdir(self.refs_dir))
+        except FileNotFoundError:
+            return 0
+
+    def _acquire(self):
+        if self._token is None:
+            token = f'{os.getpid()}-{uuid.uuid4().hex}'
+            open(os.path.join(self.refs_dir, token), 'w').close()
+            self._token = token
+
+    def attach(self, columns=None, arrow_dtypes=True):
+        """Map the frame into this process and take a reference.
+
+        With arrow_dtypes (the default) columns stay backed by the mapped buffers, so
+        nothing is copied; arrow_dtypes=False converts to NumPy-backed columns (copies).
+        """
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Shared frame {self.name} is no longer published")
+        self._acquire()
+        if self._table is None:
+            self._table = pa.ipc.open_file(pa.memory_map(self.path, 'r')).read_all()
+        table = self._table.select(columns) if columns else self._table
+        if arrow_dtypes:
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        return table.to_pandas()
+
+    def release(self):
+        """Drop this process' reference, the last one removes the data file"""
+        if self._token is None:
+            return
+        try:
+            os.remove(os.path.join(self.refs_dir, self._token))
+        except FileNotFoundError:
+            pass
+        self._token = None
+        self._table = None
+        if self.references() == 0:
+            _remove_files(self)
+
+    @contextmanager
+    def attached(self, columns=None, arrow_dtypes=True):
+        """with handle.attached() as df: ... releases the reference afterwards"""
+        try:
+            yield self.attach(columns=columns, arrow_dtypes=arrow_dtypes)
+        finally:
+            self.release()
+
+def _remove_files(handle):
+    try:
+        os.remove(handle.path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        # Windows keeps mapped files open; sweep_scratch removes them later
+        logger.warning("⚠️ Shared frame %s is still mapped, leaving it for the next sweep", handle.name)
+        return False
+    try:
+        os.rmdir(handle.refs_dir)
+    except OSError:
+        pass
+    logger.info("🧹 Shared frame %s released", handle.name)
+    return True
+
+def publish(df, name=None, scratch_dir=SCRATCH_DIR):
+    """Write df once as an uncompressed Arrow IPC file and return a handle holding one reference"""
+    handle = SharedFrame(name or uuid.uuid4().hex, scratch_dir)
+    os.makedirs(handle.refs_dir, exist_ok=True)
+    handle._acquire()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = handle.path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, handle.path)
+    logger.info("📤 Published %s rows as shared frame %s (%.1f MB)",
+                table.num_rows, handle.name, table.nbytes / 1024 ** 2)
+    return handle
+
+def sweep_scratch(scratch_dir=SCRATCH_DIR):
+    """Drop references of processes that died and remove frames nobody holds any more"""
+    if not os.path.isdir(scratch_dir):
+        return []
+    removed = []
+    for entry in sorted(os.listdir(scratch_dir)):
+        if not entry.endswith('.arrow'):
+            continue
+        handle = SharedFrame(entry[:-len('.arrow')], scratch_dir)
+        if os.path.isdir(handle.refs_dir):
+            for token in os.listdir(handle.refs_dir):
+                pid = int(token.split('-', 1)[0])
+                if not _is_alive(pid):
+                    try:
+                        os.remove(os.path.join(handle.refs_dir, token))
+                    except FileNotFoundError:
+                        pass
+        if handle.references() == 0 and _remove_files(handle):
+            removed.append(handle.name)
+    return removed
@@ -0,0 +1,206 @@
+import os
+import numpy as np
+import pandas as pd
+from engine.logger_config import setup_logger, log_execution_time
+from engine.schema import FEE_COLUMNS, to_dollars
+from engine.storer import source_period
+
+logger = setup_logger('sketches')
+
+# HyperLogLog with 2^14 one-byte registers: ~0.8% standard error, 16 KB per counter
+HLL_PRECISION = 14
+# Distinct counters: name -> columns of the cleaned trips hashed together
+DISTINCT_KEYS = {
+    'zone_pairs': ('pickup_location_id', 'dropoff_location_id'),
+    'pickup_zones': ('pickup_location_id',),
+    'dropoff_zones': ('dropoff_location_id',)
+}
+# Quantile sketches: fees (in dollars), distance and duration
+QUANTILE_COLUMNS = tuple(FEE_COLUMNS) + ('trip_distance', 'duration_sec')
+# Log-bucketed quantile sketch: every value is answered within 1% relative error.
+# Buckets cover magnitudes from MIN_VALUE to MAX_VALUE; smaller ones count as zero
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-2
+MAX_VALUE = 1e7
+SKETCHES_DIR = 'sketches'
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_OFFSET = int(np.floor(np.log(MIN_VALUE) / np.log(_GAMMA)))
+BUCKETS = int(np.ceil(np.log(MAX_VALUE) / np.log(_GAMMA))) - _OFFSET + 1
+
+def sketches_dir(base_dir='data'):
+    return os.path.join(base_dir, SKETCHES_DIR)
+
+def _month_path(source, base_dir='data'):
+    stem = os.path.basename(source).replace('.parquet', '')
+    return os.path.join(sketches_dir(base_dir), f'{stem}.npz')
+
+def hash_rows(df, columns):
+    """One 64-bit hash per row of the given columns"""
+    return pd.util.hash_pandas_object(df[list(columns)], index=False).to_numpy()
+
+class HyperLogLog:
+    """Distinct counter; merging two counters is an element-wise max of their registers"""
+
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        if registers is None:
+            registers = np.zeros(1 << precision, dtype=np.uint8)
+        self.registers = registers
+        self.precision = int(np.log2(len(registers)))
+
+    def add_hashes(self, hashes):
+        p = self.precision
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Position of the first 1-bit in the remaining 64 - p bits (frexp is exact below 2^53)
+        rank = (64 - p) - np.frexp(rest.astype(np.float64))[1] + 1
+        # Max rank per register without a Python loop: mark (register, rank) pairs, take the highest
+        seen = np.zeros(len(self.registers) * 64, dtype=bool)
+        seen[index * 64 + rank] = True
+        seen = seen.reshape(-1, 64)
+        highest = np.where(seen.any(axis=1), 63 - np.argmax(seen[:, ::-1], axis=1), 0).astype(np.uint8)
+        np.maximum(self.registers, highest, out=self.registers)
+        return self
+
+    def __or__(self, other):
+        return HyperLogLog(np.maximum(self.registers, other.registers))
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative-error guarantees (log-bucketed, DDSketch style).
+
+    counts holds [negative buckets..., zero, positive buckets...]; merging adds counts, so
+    months combine exactly as if their values had been sketched together.
+    """
+
+    def __init__(self, counts=None, bounds=None):
+        self.counts = np.zeros(2 * BUCKETS + 1, dtype=np.int64) if counts is None else counts
+        # Exact min and max, quantiles are clamped to them
+        self.bounds = np.array([np.inf, -np.inf]) if bounds is None else bounds
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        magnitude = np.abs(values)
+        index = np.clip(np.ceil(np.log(np.maximum(magnitude, MIN_VALUE)) / np.log(_GAMMA)).astype(np.int64)
+                        - _OFFSET, 1, BUCKETS)
+        index = np.where(magnitude < MIN_VALUE, 0, index)
+        # Negative buckets are mirrored below the zero bucket
+        position = BUCKETS + np.where(values < 0, -index, index)
+        self.counts += np.bincount(position, minlength=len(self.counts))
+        self.bounds = np.array([min(self.bounds[0], values.min()), max(self.bounds[1], values.max())])
+        return self
+
+    def __add__(self, other):
+        return QuantileSketch(self.counts + other.counts,
+                              np.array([min(self.bounds[0], other.bounds[0]), max(self.bounds[1], other.bounds[1])]))
+
+    def count(self):
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """Value at quantile q (0..1, or a list of them); None while the sketch is empty"""
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        total = self.count()
+        if not total:
+            return None if np.ndim(q) == 0 else [None] * len(qs)
+        position = np.searchsorted(np.cumsum(self.counts), np.floor(qs * (total - 1)), side='right')
+        index = position - BUCKETS
+        # Representative value of bucket i is the midpoint of (gamma^(i-1), gamma^i] in relative terms
+        magnitude = 2 * _GAMMA ** (np.abs(index) + _OFFSET) / (_GAMMA + 1)
+        values = np.clip(np.sign(index) * magnitude, *self.bounds)
+        return float(values[0]) if np.ndim(q) == 0 else values.tolist()
+
+class TripSketches:
+    """Per-month sketches of the cleaned trips: distinct counters and quantile sketches by name"""
+
+    def __init__(self, distinct=None, quantiles=None):
+        self.distinct = distinct if distinct is not None else {name: HyperLogLog() for name in DISTINCT_KEYS}
+        self.quantiles = quantiles if quantiles is not None else {name: QuantileSketch() for name in QUANTILE_COLUMNS}
+
+    def __add__(self, other):
+        return TripSketches({name: self.distinct[name] | other.distinct[name] for name in self.distinct},
+                            {name: self.quantiles[name] + other.quantiles[name] for name in self.quantiles})
+
+    def count_distinct(self, name):
+        return self.distinct[name].count()
+
+    def quantile(self, name, q):
+        return self.quantiles[name].quantile(q)
+
+    def summary(self, qs=(0.5, 0.95, 0.99)):
+        """{'distinct': {name: count}, 'quantiles': {column: {'p50': ..., ...}}}"""
+        return {'distinct': {name: sketch.count() for name, sketch in self.distinct.items()},
+                'quantiles': {name: {f'p{q * 100:g}': round(value, 2) for q, value in zip(qs, sketch.quantile(list(qs)))}
+                              for name, sketch in self.quantiles.items() if sketch.count()}}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path,
+                 distinct=np.stack([self.distinct[name].registers for name in DISTINCT_KEYS]),
+                 counts=np.stack([self.quantiles[name].counts for name in QUANTILE_COLUMNS]),
+                 bounds=np.stack([self.quantiles[name].bounds for name in QUANTILE_COLUMNS]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            return cls({name: HyperLogLog(registers) for name, registers in zip(DISTINCT_KEYS, stored['distinct'])},
+                       {name: QuantileSketch(counts, bounds) for name, counts, bounds
+                        in zip(QUANTILE_COLUMNS, stored['counts'], stored['bounds'])})
+
+def sketch_trips(df, sketches=None):
+    """Add a batch of cleaned trips to sketches (new ones when None), one vectorized pass per column"""
+    sketches = sketches or TripSketches()
+    for name, columns in DISTINCT_KEYS.items():
+        if all(column in df.columns for column in columns):
+            sketches.distinct[name].add_hashes(hash_rows(df, columns))
+    for name in QUANTILE_COLUMNS:
+        if name in df.columns:
+            values = to_dollars(df[name]) if name in FEE_COLUMNS else df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            sketches.quantiles[name].add(values)
+    return sketches
+
+@log_execution_time
+def update_sketches(df, source=None, base_dir='data'):
+    """Pipeline stage: sketch the month's cleaned trips and store them as sketches/<source>.npz.
+
+    A republished month replaces its file; ranges are answered by merging month files.
+    """
+    try:
+        logger.info("Updating trip sketches...")
+        sketches = sketch_trips(df)
+        if source is None:
+            logger.warning("⚠️ No source file name, sketches not persisted")
+            return sketches
+        sketches.save(_month_path(source, base_dir))
+        logger.info("✅ Trip sketches stored: ~%s zone pairs, median fare %s",
+                    sketches.count_distinct('zone_pairs'), sketches.quantile('fare_amount', 0.5))
+        return sketches
+
+    except Exception as e:
+        logger.error("❌ Error updating trip sketches: %s", e)
+        raise
+
+def load_sketches(base_dir='data', periods=None):
+    """Sketches merged over all stored months, or over the given (year, month) periods"""
+    directory = sketches_dir(base_dir)
+    periods = set(map(tuple, periods)) if periods is not None else None
+    merged = TripSketches()
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if name.endswith('.npz') and (periods is None or source_period(name[:-4]) in periods):
+            merged += TripSketches.load(os.path.join(directory, name))
+    return merged
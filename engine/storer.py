@@ -1,18 +1,275 @@
+import glob
+import json
 import os
+import time
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
+import pyarrow.feather as feather
 from engine.logger_config import setup_logger, log_execution_time
+from engine.streams import WriteBehind
+from engine.schema import fees_like, fees_to_dollars
+from engine.reader import (read_table, read_arrow_table, fee_view, write_dimension_arrow, load_source_manifest,
+                           source_ranges, stored_max_key, star_schema_dir, parquet_path, partition_files, partition_key,
+                           PARTITIONED_TABLES, DIMENSION_TABLES, SOURCE_MANIFEST, QUARANTINE)
 
 logger = setup_logger('storer')
 
+# Key ranges each source file added to the appended tables, so a republished month
+# replaces its own rows instead of being appended a second time
+SOURCE_KEYS = {'trip_fact': 'trip_id', 'datetime_dim': 'datetime_key', 'distance_dim': 'distance_key'}
+MANIFEST_LOCK_TIMEOUT = 60
+# Rows are stored in the partition of their pickup month. A source may hold stragglers from
+# up to PIPELINE_LATE_MONTHS months before its own and trips of the month after; any other
+# pickup date (missing, 2002, 2098) goes to the table's quarantine partition
+LATE_MONTHS = int(os.environ.get('PIPELINE_LATE_MONTHS', 2))
+# Tables with one row per trip, routed by pickup month; distance_dim is shared by all
+# months and stays in its source's month
+ROUTED_TABLES = ('trip_fact', 'datetime_dim')
+
+def save_source_manifest(table_dir, manifest):
+    path = os.path.join(table_dir, SOURCE_MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def manifest_lock(table_dir, timeout=MANIFEST_LOCK_TIMEOUT):
+    """Cross-process lock around a manifest read-modify-write (lock file created exclusively)"""
+    lock_path = os.path.join(table_dir, SOURCE_MANIFEST + '.lock')
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def key_ranges(append_tables):
+    """[min, max] of each appended table's key, empty tables are left out"""
+    ranges = {}
+    for table_name, table_df in append_tables.items():
+        key_column = SOURCE_KEYS[table_name]
+        if len(table_df) and key_column in table_df.columns:
+            ranges[table_name] = [int(table_df[key_column].min()), int(table_df[key_column].max())]
+    return ranges
+
+def stable_keys(append_tables, previous_ranges, stored_max=None):
+    """Move a replacement's keys back into the source's previous ranges when they fit.
+
+    The transformer numbers a reprocessed month after everything stored, which would
+    grow the key space on every republish. When the new rows fit into the old range
+    they reuse it, fact references (datetime_key, distance_key) shifted along with
+    their dimensions. Otherwise keys that overlap stored_max ({table: largest stored key},
+    read under the manifest lock) move after it: months transformed concurrently all
+    numbered from the same stored maximum, the commit decides who gets which range.
+    """
+    offsets = {}
+    for table_name, (first, last) in key_ranges(append_tables).items():
+        old = previous_ranges.get(table_name)
+        if old and last - first <= old[1] - old[0]:
+            if first != old[0]:
+                offsets[SOURCE_KEYS[table_name]] = old[0] - first
+        elif stored_max and first <= stored_max.get(table_name, 0):
+            offsets[SOURCE_KEYS[table_name]] = stored_max[table_name] + 1 - first
+    if not offsets:
+        return append_tables
+    return {table_name: table_df.assign(**{column: table_df[column] + offset
+                                            for column, offset in offsets.items() if column in table_df.columns})
+            for table_name, table_df in append_tables.items()}
+
+def source_period(source):
+    """(year, month) of a TLC source file, e.g. 'yellow_tripdata_2025-01.parquet' -> (2025, 1)"""
+    stem = os.path.basename(source).replace('.parquet', '')
+    year, month = stem.rsplit('_', 1)[-1].split('-')[:2]
+    return int(year), int(month)
+
+def partition_dir(table_name, year, month, base_dir='data'):
+    return os.path.join(star_schema_dir(base_dir), table_name, f'year={year:04d}', f'month={month:02d}')
+
+def quarantine_dir(table_name, base_dir='data'):
+    # Outside the year=/month= tree, so date-pruned scans never see it
+    return os.path.join(star_schema_dir(base_dir), table_name, QUARANTINE)
+
+def _month_index(year, month):
+    return (year - 1970) * 12 + month - 1
+
+def _index_period(index):
+    """(year, month) of a months-since-1970 index, None for the quarantine code -1"""
+    return None if index < 0 else (1970 + index // 12, index % 12 + 1)
+
+def pickup_months(pickups, year, month, late_months=LATE_MONTHS):
+    """Partition code of each pickup: months since 1970-01, -1 when it cannot belong to (year, month)"""
+    values = np.asarray(pd.to_datetime(pd.Series(pickups)).to_numpy(dtype='datetime64[ns]'))
+    # NaT turns into the smallest int64 and falls outside the window
+    months = values.astype('datetime64[M]').view(np.int64)
+    source = _month_index(year, month)
+    return np.where((months >= source - late_months) & (months <= source + 1), months, -1)
+
+def split_partitions(df, codes):
+    """{code: rows of df} with one stable argsort and one slice per partition, no per-row work"""
+    codes = np.asarray(codes)
+    if len(codes) == 0 or (codes == codes[0]).all():
+        return {int(codes[0]) if len(codes) else None: df}
+    order = np.argsort(codes, kind='stable')
+    ordered = codes[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    ends = np.r_[starts[1:], len(ordered)]
+    return {int(ordered[start]): df.take(order[start:end]).reset_index(drop=True)
+            for start, end in zip(starts, ends)}
+
+def route_by_pickup(append_tables, year, month, late_months=LATE_MONTHS):
+    """{table: {period: rows}} with trip rows split by pickup month (period None = quarantine).
+
+    Codes come from datetime_dim and reach trip_fact through its datetime_key, so both
+    tables place a trip in the same partition.
+    """
+    nominal = _month_index(year, month)
+    datetime_dim = append_tables.get('datetime_dim')
+    codes = {}
+    if datetime_dim is not None and 'pickup_datetime' in datetime_dim.columns:
+        datetime_codes = pickup_months(datetime_dim['pickup_datetime'], year, month, late_months)
+        codes['datetime_dim'] = datetime_codes
+        keys = datetime_dim['datetime_key'].to_numpy(dtype=np.int64)
+        trip_fact = append_tables.get('trip_fact')
+        if trip_fact is not None and 'datetime_key' in trip_fact.columns and len(keys):
+            fact_keys = trip_fact['datetime_key'].to_numpy(dtype=np.int64, na_value=-1)
+            if np.array_equal(fact_keys, keys):
+                # The transformer numbers both tables row by row, so usually no lookup is needed
+                codes['trip_fact'] = datetime_codes
+            else:
+                order = np.argsort(keys, kind='stable')
+                keys, datetime_codes = keys[order], datetime_codes[order]
+                positions = np.minimum(np.searchsorted(keys, fact_keys), len(keys) - 1)
+                codes['trip_fact'] = np.where(keys[positions] == fact_keys, datetime_codes[positions], -1)
+    routed = {}
+    for table_name, table_df in append_tables.items():
+        if table_name in ROUTED_TABLES and table_name in codes:
+            parts = split_partitions(table_df, codes[table_name])
+        else:
+            parts = {nominal: table_df}
+        routed[table_name] = {_index_period(nominal if code is None else code): part for code, part in parts.items()}
+    return routed
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _write_partition(part_df, file_path):
+    part_df.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
+
+@log_execution_time
+def replace_partition(year, month, source, append_tables, base_dir='data', keep_key_ranges=True):
+    """Atomically replace one source file's slice of the partitioned tables.
+
+    (year, month) is the source's own month; trip rows are written to the partition of
+    their pickup month (route_by_pickup), so a source may add files to a few partitions.
+    New files are written next to the current ones and the manifest swap is the commit,
+    so readers see either the old or the new slice; cost is proportional to the slice.
+    Keys are final only here, under the manifest lock (stable_keys). Returns the new
+    manifest entry.
+    """
+    table_dir = star_schema_dir(base_dir)
+    os.makedirs(table_dir, exist_ok=True)
+    stem = os.path.basename(source).replace('.parquet', '')
+    with manifest_lock(table_dir):
+        manifest = load_source_manifest(table_dir)
+        previous = manifest.get(source, {})
+        if keep_key_ranges:
+            stored_max = {table_name: stored_max_key(table_name, SOURCE_KEYS[table_name], base_dir, manifest)
+                          for table_name in append_tables}
+            append_tables = stable_keys(append_tables, source_ranges(previous), stored_max)
+        version = previous.get('version', 0) + 1
+        files, moved = {}, {}
+        routed = route_by_pickup(append_tables, year, month)
+        # One writer thread per table: the tables' files are compressed and written concurrently,
+        # and all of them are on disk before the manifest swap below
+        with WriteBehind({table_name: _write_partition for table_name in routed}, name='partition') as writer:
+            for table_name, partitions in routed.items():
+                files[table_name] = {}
+                for period, part_df in partitions.items():
+                    directory = (partition_dir(table_name, *period, base_dir) if period
+                                 else quarantine_dir(table_name, base_dir))
+                    os.makedirs(directory, exist_ok=True)
+                    file_path = os.path.join(directory, f'{stem}.v{version}.parquet')
+                    writer.submit(table_name, part_df, file_path)
+                    files[table_name][partition_key(period)] = os.path.relpath(file_path, table_dir).replace(os.sep, '/')
+                    if period != (year, month) and len(part_df):
+                        moved.setdefault(table_name, []).append(f"{partition_key(period)} {len(part_df):,}")
+        manifest[source] = {'year': year, 'month': month, 'version': version, 'files': files,
+                            'ranges': key_ranges(append_tables),
+                            'rows': {table_name: len(table_df) for table_name, table_df in append_tables.items()}}
+        save_source_manifest(table_dir, manifest)
+    # The previous version is unreachable once the manifest is swapped
+    for table_name in previous.get('files', {}):
+        for _, relative_path in partition_files(previous, table_name):
+            _remove_quietly(os.path.join(table_dir, relative_path))
+    for table_name, parts in moved.items():
+        logger.warning("⚠️ %s rows of %s outside %04d-%02d: %s", table_name, source, year, month, ', '.join(parts))
+    action = 'replaced' if previous else 'written'
+    logger.info("✅ Partition %04d-%02d of %s %s (version %s)", year, month, source, action, version)
+    return manifest[source]
+
+def migrate_legacy_tables(base_dir='data'):
+    """Move rows of known sources out of pre-partitioning single-file tables into partitions"""
+    table_dir = star_schema_dir(base_dir)
+    legacy_paths = {table_name: parquet_path(table_name, base_dir) for table_name in PARTITIONED_TABLES
+                    if os.path.exists(parquet_path(table_name, base_dir))}
+    manifest = load_source_manifest(table_dir)
+    pending = [source for source, entry in manifest.items() if 'files' not in entry]
+    if not legacy_paths or not pending:
+        return []
+    logger.info("📦 Moving %s source(s) from single-file tables into partitions", len(pending))
+    legacy = {table_name: read_table(path, arrow_dtypes=False) for table_name, path in legacy_paths.items()}
+    for source in pending:
+        ranges = source_ranges(manifest[source])
+        tables, moved = {}, {}
+        for table_name, table_df in legacy.items():
+            if table_name not in ranges:
+                continue
+            rows = table_df[SOURCE_KEYS[table_name]].between(*ranges[table_name])
+            tables[table_name] = table_df[rows].reset_index(drop=True)
+            moved[table_name] = rows
+        year, month = source_period(source)
+        replace_partition(year, month, source, tables, base_dir, keep_key_ranges=False)
+        for table_name, rows in moved.items():
+            legacy[table_name] = legacy[table_name][~rows]
+    for table_name, table_df in legacy.items():
+        if len(table_df):
+            table_df.to_parquet(legacy_paths[table_name], engine='pyarrow', compression='snappy', index=False)
+        else:
+            os.remove(legacy_paths[table_name])
+    return pending
+
 # To append dataframe to existing file
-def append_to_existing_file(new_df, file_path, file_format='parquet'):
+def append_to_existing_file(new_df, file_path, file_format='parquet', replace_range=None):
+    """Existing rows + new_df; replace_range=(key_column, first, last) drops a previous version first"""
     try:
         if os.path.exists(file_path):
             if file_format == 'parquet':
-                existing_df = pd.read_parquet(file_path)
+                # Memory-mapped read, plain NumPy dtypes so concat with the new batch stays cheap
+                existing_df = read_table(file_path, arrow_dtypes=False)
             else:  # CSV
                 existing_df = pd.read_csv(file_path, low_memory=False, 
                                           dtype={'store_and_fwd': 'str'})
+            if replace_range is not None:
+                key_column, first, last = replace_range
+                stale = existing_df[key_column].between(first, last)
+                logger.info("♻️ Replacing %s rows of the previous version in %s",
+                            int(stale.sum()), os.path.basename(file_path))
+                existing_df = existing_df[~stale]
+            # One fee representation per file: new rows follow what the file already holds
+            new_df = fees_like(new_df, existing_df)
             
             # Combine old and new data
             combined_df = pd.concat([existing_df, new_df], ignore_index=True)
@@ -20,13 +277,13 @@ def append_to_existing_file(new_df, file_path, file_format='parquet'):
         else:
             return new_df
     except Exception as e:
-        logger.warning(f"Could not read existing file {file_path}: {e}")
+        logger.warning("Could not read existing file %s: %s", file_path, e)
         return new_df
 
 # Store to Parquet format
 @log_execution_time
 def store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, 
-                     location_dim, base_dir='data', append_mode=True):
+                     location_dim, base_dir='data', append_mode=True, source=None):
     try:
         logger.info("🚀 Start parquet storage process...")
         parquet_dir = os.path.join(base_dir, 'parquet', 'star_schema')
@@ -49,28 +306,46 @@ def store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_
         }
 
         # Handle append tables
-        if append_mode:
+        entry = None
+        if append_mode and source:
+            # One partition per source file: storing (or re-storing) a month only touches its slice
+            migrate_legacy_tables(base_dir)
+            year, month = source_period(source)
+            entry = replace_partition(year, month, source, append_tables, base_dir)
+            for table_name, rows in entry['rows'].items():
+                logger.info("✅ %s stored: %s records in %s partition(s)",
+                            table_name, rows, len(entry['files'][table_name]))
+        elif append_mode:
             for table_name, table_df in append_tables.items():
                 file_path = os.path.join(parquet_dir, f'{table_name}.parquet')
                 combined_df = append_to_existing_file(table_df, file_path, 'parquet')
                 
                 combined_df.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
-                logger.info(f"✅ {table_name} appended: {len(combined_df):,} total records")
+                logger.info("✅ %s appended: %s total records", table_name, len(combined_df))
         
         # Handle static tables (overwrite)
         for table_name, table_df in static_tables.items():
             file_path = os.path.join(parquet_dir, f'{table_name}.parquet')
             table_df.to_parquet(file_path, engine='pyarrow', compression='snappy', index=False)
-            logger.info(f"✅ {table_name} saved: {table_df.shape}")
+            # Uncompressed Arrow IPC copy for zero-copy memory-mapped reads
+            write_dimension_arrow(table_df, table_name, base_dir)
+            logger.info("✅ %s saved: %s", table_name, table_df.shape)
+        # The committed manifest entry: its key ranges are final, other copies follow them
+        return entry
 
     except Exception as e:
-        logger.error(f"❌ Error during Parquet storage: {str(e)}")
+        logger.error("❌ Error during Parquet storage: %s", e)
         raise
 
 # Store to CSV format
 @log_execution_time
 def store_to_csv(vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, 
-                 trip_fact, location_dim, base_dir='data', append_mode=True):
+                 trip_fact, location_dim, base_dir='data', append_mode=True, source=None, partition=None):
+    """CSV copy of the star schema; partition is the source's entry returned by store_to_parquet.
+
+    Keys are only final once replace_partition committed them, so with partition the CSV
+    rows are moved to its key ranges and both copies agree on every key.
+    """
     try:
         # Create directory structure
         logger.info("🚀 Starting CSV storage process...")
@@ -95,18 +370,146 @@ def store_to_csv(vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_d
 
         # Handle append tables
         if append_mode:
-            for table_name, table_df in append_tables.items():
-                csv_path = os.path.join(csv_dir, f'{table_name}.csv')
-                combined_df = append_to_existing_file(table_df, csv_path, 'csv')
-                combined_df.to_csv(csv_path, index=False, encoding='utf-8')
-                logger.info(f"✅ {table_name} appended: {len(combined_df):,} total records")
+            # The CSV files are a read-modify-write shared by all workers
+            with manifest_lock(csv_dir):
+                manifest = load_source_manifest(csv_dir)
+                previous = manifest.get(source, {}) if source else {}
+                # The keys the Parquet partition committed; without it the same placement rule
+                final_ranges = source_ranges(partition) if partition else source_ranges(previous)
+                append_tables = stable_keys(append_tables, final_ranges)
+                # CSV consumers always get dollars, also when the fact holds int32 cents
+                append_tables['trip_fact'] = fees_to_dollars(append_tables['trip_fact'])
+                for table_name, table_df in append_tables.items():
+                    csv_path = os.path.join(csv_dir, f'{table_name}.csv')
+                    previous_range = source_ranges(previous).get(table_name)
+                    replace_range = (SOURCE_KEYS[table_name], *previous_range) if previous_range else None
+                    combined_df = append_to_existing_file(table_df, csv_path, 'csv', replace_range)
+                    combined_df.to_csv(csv_path, index=False, encoding='utf-8')
+                    logger.info("✅ %s appended: %s total records", table_name, len(combined_df))
+                if source:
+                    manifest[source] = key_ranges(append_tables)
+                    save_source_manifest(csv_dir, manifest)
         
         # Handle static tables (overwrite)
         for table_name, table_df in static_tables.items():
             csv_path = os.path.join(csv_dir, f'{table_name}.csv')
             table_df.to_csv(csv_path, index=False, encoding='utf-8')
-            logger.info(f"✅ {table_name} saved: {table_df.shape}")
+            logger.info("✅ %s saved: %s", table_name, table_df.shape)
+
+    except Exception as e:
+        logger.error("❌ Error during CSV export: %s", e)
+        raise
+
+def _write_arrow(table, path):
+    # Uncompressed Arrow IPC: memory-mapped without a copy by pyarrow, Polars or DuckDB
+    feather.write_feather(table, path, compression='uncompressed')
+
+def _write_feather(table, path):
+    feather.write_feather(table, path, compression='lz4')
+
+def _write_csv(table, path):
+    # Dollars and pandas formatting, the same text store_to_csv has always produced
+    fee_view(table, 'float').to_pandas().to_csv(path, index=False, encoding='utf-8')
+
+# Formats the stored Parquet tables can be exported to: name -> (file extension, writer).
+# A writer gets an Arrow table and a path; add a format by adding an entry here.
+EXPORT_FORMATS = {
+    'arrow': ('.arrow', _write_arrow),
+    'feather': ('.feather', _write_feather),
+    'csv': ('.csv', _write_csv)
+}
+
+def export_dir(fmt, base_dir='data'):
+    # Own root per format: data/arrow/ holds the dimension copies and data/csv/ the CSV store
+    return os.path.join(base_dir, 'exports', fmt)
+
+def month_range(first, last):
+    """[(year, month), ...] from first to last inclusive, both (year, month) tuples"""
+    months = []
+    year, month = first
+    while (year, month) <= tuple(last):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def _export_current(source_path, target_path):
+    """Whether an export is newer than the stored Parquet file it was written from"""
+    return os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path)
+
+def _export_file(fmt, table, target_path):
+    """Write one stored table (an Arrow table) in another format"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = target_path + '.tmp'
+    EXPORT_FORMATS[fmt][1](table, tmp_path)
+    os.replace(tmp_path, target_path)
+
+@log_execution_time
+def export_tables(formats, tables=None, periods=None, base_dir='data', sources=None):
+    """Export stored tables from Parquet to other formats, only what was asked for.
+
+    Partitioned tables keep the year=/month= layout (plus quarantine/) with one file per
+    source, limited to periods ((year, month) tuples) or source files when given;
+    dimensions are exported whole. Exports newer than their Parquet file are left alone,
+    so repeated calls only write changes. Each stored file is read once (memory-mapped) and
+    handed to one writer thread per format, which writes it while the next file is read.
+    Returns {format: [written paths]}.
+    """
+    try:
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown export format(s) {unknown}, expected {sorted(EXPORT_FORMATS)}")
+        table_dir = star_schema_dir(base_dir)
+        manifest = load_source_manifest(table_dir)
+        periods = set(map(tuple, periods)) if periods is not None else None
+        # Stored file -> [(format, target)] of the exports that are missing or out of date
+        stale_exports, checked = {}, {}
+        for fmt in formats:
+            extension = EXPORT_FORMATS[fmt][0]
+            target_dir = export_dir(fmt, base_dir)
+            pairs = []
+            for table_name in tables or PARTITIONED_TABLES + DIMENSION_TABLES:
+                if table_name not in PARTITIONED_TABLES:
+                    pairs.append((parquet_path(table_name, base_dir), os.path.join(target_dir, table_name + extension)))
+                    continue
+                for source, entry in sorted(manifest.items()):
+                    if sources is not None and source not in sources:
+                        continue
+                    stem = os.path.basename(source).replace('.parquet', '')
+                    targets = set()
+                    for period, relative_path in partition_files(entry, table_name):
+                        target = (os.path.join(target_dir, table_name, f"year={period[0]:04d}",
+                                               f"month={period[1]:02d}", stem + extension) if period
+                                  else os.path.join(target_dir, table_name, QUARANTINE, stem + extension))
+                        targets.add(target)
+                        if periods is None or period in periods:
+                            pairs.append((os.path.join(table_dir, relative_path), target))
+                    # A republished source may no longer have rows in a partition it exported before
+                    for stale in glob.glob(os.path.join(target_dir, table_name, '*', '*', stem + extension)) + \
+                                 glob.glob(os.path.join(target_dir, table_name, QUARANTINE, stem + extension)):
+                        if stale not in targets:
+                            _remove_quietly(stale)
+            checked[fmt] = len(pairs)
+            for source_path, target in pairs:
+                if os.path.exists(source_path) and not _export_current(source_path, target):
+                    stale_exports.setdefault(source_path, []).append((fmt, target))
+        written = {fmt: [] for fmt in formats}
+        with WriteBehind({fmt: _export_file for fmt in formats}, name='export') as writer:
+            for source_path, targets in stale_exports.items():
+                table = read_arrow_table(source_path)
+                for fmt, target in targets:
+                    writer.submit(fmt, fmt, table, target)
+                    written[fmt].append(target)
+        for fmt in formats:
+            logger.info("✅ %s export: %s file(s) written, %s already current",
+                        fmt, len(written[fmt]), checked[fmt] - len(written[fmt]))
+        return written
 
     except Exception as e:
-        logger.error(f"❌ Error during CSV export: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error("❌ Error during export: %s", e)
+        raise
+
+def export_source(formats=None, source=None, base_dir='data'):
+    """Pipeline stage: export the partitions of the source just stored (and the dimensions)"""
+    if not formats:
+        return {}
+    return export_tables(formats, base_dir=base_dir, sources=[source] if source else None)
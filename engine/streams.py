@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+from engine.logger_config import setup_logger
+
+logger = setup_logger('streams')
+
+# Items in flight between a producer and its consumer. A full queue blocks the producer, so
+# a fast reader or a slow writer holds at most this many batches; 0 runs everything inline
+QUEUE_DEPTH = int(os.environ.get('PIPELINE_QUEUE_DEPTH', 2))
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+def prefetch(iterable, depth=None, name='prefetch'):
+    """Iterate over iterable in a reader thread, at most depth items ahead of the consumer.
+
+    The reader's errors are raised in the consumer. A consumer that stops early (break or
+    close()) stops the reader before its next item.
+    """
+    depth = QUEUE_DEPTH if depth is None else depth
+    if depth <= 0:
+        yield from iterable
+        return
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+class WriteBehind:
+    """Writer threads, one per sink, each fed through its own bounded queue.
+
+    submit() returns as soon as the write is queued and blocks while that sink is depth
+    writes behind (backpressure). Leaving the with block waits for every queued write and
+    raises the first error; after an error the remaining queued writes are dropped.
+    """
+
+    def __init__(self, sinks, depth=None, name='writer'):
+        depth = QUEUE_DEPTH if depth is None else depth
+        self.sinks = sinks
+        self.inline = depth <= 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._queues, self._threads = {}, []
+        if self.inline:
+            return
+        for sink_name, write in sinks.items():
+            writes = queue.Queue(maxsize=depth)
+            thread = threading.Thread(target=self._drain, args=(writes, write), name=f'{name}-{sink_name}', daemon=True)
+            thread.start()
+            self._queues[sink_name] = writes
+            self._threads.append(thread)
+
+    def _drain(self, writes, write):
+        while True:
+            args = writes.get()
+            if args is _DONE:
+                return
+            if self.errors:
+                continue
+            try:
+                write(*args)
+            except BaseException as e:
+                with self._lock:
+                    self.errors.append(e)
+
+    def submit(self, sink, *args):
+        if self.errors:
+            raise self.errors[0]
+        if self.inline:
+            self.sinks[sink](*args)
+        else:
+            self._queues[sink].put(args)
+
+    def close(self):
+        for writes in self._queues.values():
+            writes.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        self._queues, self._threads = {}, []
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.close()
+        except BaseException as e:
+            if exc is None:
+                raise
+            # The error that stopped the producer is the one to report
+            logger.warning("⚠️ Queued write failed while handling another error: %s", e)
+        return False
@@ -1,7 +1,11 @@
 import os
+import numpy as np
 import pandas as pd
 import holidays
-from engine.logger_config import setup_logger, log_execution_time
+from engine.logger_config import setup_logger, log_execution_time, log_frame_info
+from engine.schema import FLEET_VENDOR_NAMES
+from engine.zones import get_location_index
+from engine.reader import max_value, stored_max_key, read_stored_table
 
 logger = setup_logger('transformer')
 
@@ -9,46 +13,65 @@ def get_last_key_from_file(file_path, key_column):
     """Ambil key terakhir dari file yang sudah ada"""
     try:
         if os.path.exists(file_path):
-            df_key = pd.read_parquet(file_path) if file_path.endswith('.parquet') else pd.read_csv(file_path)
+            if file_path.endswith('.parquet'):
+                # Answered from Parquet statistics, the table itself is never decompressed
+                last_key = max_value(file_path, key_column)
+                return int(last_key) if last_key is not None else 0
+            df_key = pd.read_csv(file_path, usecols=[key_column])
             return df_key[key_column].max() if not df_key.empty else 0
         return 0
     except Exception:
         return 0
 
+def keyed_ids(df, id_column, key_column, table_name, base_dir='data'):
+    """Distinct ids of df with their surrogate keys, merged with the stored dimension.
+
+    The static dimensions are overwritten on every store, and months of different fleets
+    hold different ids: stored ids keep their key (so stored facts still resolve) and ids
+    seen for the first time are numbered after the largest stored key.
+    """
+    ids = df[[id_column]].drop_duplicates().reset_index(drop=True)
+    stored = read_stored_table(table_name, base_dir, columns=[id_column, key_column], arrow_dtypes=False)
+    if stored is None or not len(stored):
+        ids[key_column] = range(1, len(ids) + 1)
+        return ids
+    new_ids = ids[~ids[id_column].isin(stored[id_column])].reset_index(drop=True)
+    last_key = int(stored[key_column].max())
+    new_ids[key_column] = range(last_key + 1, last_key + len(new_ids) + 1)
+    return pd.concat([stored, new_ids], ignore_index=True)
+
 # Creating Vendor Dimension
 @log_execution_time
-def vendor_creation(df):
+def vendor_creation(df, base_dir='data'):
     logger.info("Creating Vendor Dimension...")
-    vendor_mapping = {1: 'Creative Mobile Technologies LLC', 2: 'Curb Mobility LLC', 6: 'Myle Technologies Inc', 7: 'Helix'}
-    vendor_dim = df[['vendor_id']].drop_duplicates().reset_index(drop=True)
-    vendor_dim['vendor_key'] = range(1, len(vendor_dim) + 1)
+    vendor_mapping = {1: 'Creative Mobile Technologies LLC', 2: 'Curb Mobility LLC', 6: 'Myle Technologies Inc', 7: 'Helix',
+                      **FLEET_VENDOR_NAMES}
+    vendor_dim = keyed_ids(df, 'vendor_id', 'vendor_key', 'vendor_dim', base_dir)
     vendor_dim['vendor_name'] = vendor_dim['vendor_id'].map(vendor_mapping).fillna('Unknown')
     logger.info("Vendor Dimension created successfully ✅")
-    logger.info(vendor_dim.info())
+    log_frame_info(logger, vendor_dim, 'vendor_dim')
     return vendor_dim
 
 # Creating Ratecode Dimension
 @log_execution_time
-def ratecode_creation(df):
+def ratecode_creation(df, base_dir='data'):
     logger.info("Creating Ratecode Dimension...")
     ratecode_mapping = {1: 'Standard Rate', 2: 'JFK', 3: 'Newark', 4: 'Nassau or Westchester', 5: 'Negotiated Fare', 6: 'Group Ride', 99: 'Unknown'}
-    ratecode_dim = df[['ratecode_id']].drop_duplicates().reset_index(drop=True)
-    ratecode_dim['ratecode_key'] = range(1, len(ratecode_dim) + 1)
+    ratecode_dim = keyed_ids(df, 'ratecode_id', 'ratecode_key', 'ratecode_dim', base_dir)
     ratecode_dim['ratecode_name'] = ratecode_dim['ratecode_id'].map(ratecode_mapping).fillna('Unknown')
     logger.info("Ratecode Dimension created successfully ✅")
-    logger.info(ratecode_dim.info())
+    log_frame_info(logger, ratecode_dim, 'ratecode_dim')
     return ratecode_dim
 
 # Creating Payment Dimension
 @log_execution_time
-def payment_creation(df):
+def payment_creation(df, base_dir='data'):
     logger.info("Creating Payment Dimension...")
     payment_mapping = {0: 'Flex Fare trip', 1: 'Credit card', 2: 'Cash', 3: 'No charge', 4: 'Dispute', 5: 'Unknown', 6: 'Voided trip'}
-    payment_dim = df[['payment_id']].drop_duplicates().reset_index(drop=True)
-    payment_dim['payment_key'] = range(1, len(payment_dim) + 1)
+    payment_dim = keyed_ids(df, 'payment_id', 'payment_key', 'payment_dim', base_dir)
     payment_dim['payment_type'] = payment_dim['payment_id'].map(payment_mapping).fillna('Unknown')
     logger.info("Payment Dimension created successfully ✅")
-    logger.info(payment_dim.info())
+    log_frame_info(logger, payment_dim, 'payment_dim')
     return payment_dim
 
 # Defining holidays for datetime dimension
@@ -56,23 +79,29 @@ us_ny_holidays = holidays.country_holidays('US', subdiv='NY')
 def is_holiday(date):
     return date.date() in us_ny_holidays
 
+def holiday_flags(datetimes):
+    """Vectorized is_holiday: the calendar is only consulted once per distinct day"""
+    days = datetimes.dt.normalize()
+    holiday_days = [day for day in days.dropna().unique() if is_holiday(day)]
+    return days.isin(holiday_days)
+
 # Creating Datetime Dimension
 @log_execution_time
 def datetime_creation(df, base_dir = 'data'):
     logger.info("Creating Datetime Dimension...")
     datetime_dim = df[['pickup_datetime', 'dropoff_datetime']].copy()
-    # Get last key from existing datetime dimension file
-    datetime_file = os.path.join(base_dir, 'parquet', 'star_schema', 'datetime_dim.parquet')
-    last_datetime_key = get_last_key_from_file(datetime_file, 'datetime_key')
+    # Provisional keys after what is stored now; replace_partition moves them under the
+    # manifest lock if another worker committed the same range first
+    last_datetime_key = stored_max_key('datetime_dim', 'datetime_key', base_dir)
     # Apply last key to new datetime dimension and continue datetime creation
     datetime_dim['datetime_key'] = range(last_datetime_key + 1, last_datetime_key + len(datetime_dim) + 1)
     datetime_dim['pickup_hour'] = datetime_dim['pickup_datetime'].dt.hour
     datetime_dim['pickup_day'] = datetime_dim['pickup_datetime'].dt.day
     datetime_dim['pickup_weekday'] = datetime_dim['pickup_datetime'].dt.weekday
     datetime_dim['pickup_month'] = datetime_dim['pickup_datetime'].dt.month
-    datetime_dim['is_holiday'] = datetime_dim['pickup_datetime'].apply(is_holiday)
+    datetime_dim['is_holiday'] = holiday_flags(datetime_dim['pickup_datetime'])
     logger.info("Datetime Dimension created successfully ✅")
-    logger.info(datetime_dim.info())
+    log_frame_info(logger, datetime_dim, 'datetime_dim')
     return datetime_dim
 
 # Defining distance category
@@ -81,21 +110,26 @@ def distance_category(distance):
     elif 2 < distance <= 6: return 'Medium'
     else: return 'Long'
 
+def distance_categories(distances):
+    """Vectorized distance_category (NaN falls through to Long, like the scalar version)"""
+    values = distances.to_numpy(dtype='float64', na_value=np.nan)
+    categories = np.select([values <= 2, values <= 6], ['Short', 'Medium'], default='Long')
+    return pd.Series(categories, index=distances.index, dtype=object)
+
 # Creating Distance Dimension
 @log_execution_time
 def distance_creation(df, base_dir = 'data'):
     logger.info("Creating Distance Dimension...")
-    distance_dim = df[['trip_distance']].copy()
-    distance_dim['distance_category'] = distance_dim['trip_distance'].apply(distance_category)
-    distance_dim = distance_dim.drop_duplicates().reset_index(drop=True)
+    # The category is a function of the distance, so deduplicate first and categorize the uniques
+    distance_dim = df[['trip_distance']].drop_duplicates().reset_index(drop=True)
+    distance_dim['distance_category'] = distance_categories(distance_dim['trip_distance'])
     # Get last key from existing distance dimension file
-    distance_file = os.path.join(base_dir, 'parquet', 'star_schema', 'distance_dim.parquet')
-    last_distance_key = get_last_key_from_file(distance_file, 'distance_key')
+    last_distance_key = stored_max_key('distance_dim', 'distance_key', base_dir)
     # Apply last key to new distance dimension and continue distance creation
     distance_dim['distance_key'] = range(last_distance_key + 1, last_distance_key + len(distance_dim) + 1)
     distance_dim = distance_dim[['distance_key', 'trip_distance', 'distance_category']]
     logger.info("Distance Dimension created successfully ✅")
-    logger.info(distance_dim.info())
+    log_frame_info(logger, distance_dim, 'distance_dim')
     return distance_dim
 
 # Creating Location Dimension
@@ -105,7 +139,7 @@ def location_creation(location_dim):
     location_dim['location_key'] = range(1, len(location_dim) + 1)
     location_dim = location_dim[['location_key', 'location_id', 'zone', 'borough', 'service_zone']]
     logger.info("Location Dimension created successfully ✅")
-    logger.info(location_dim.info())
+    log_frame_info(logger, location_dim, 'location_dim')
     return location_dim
 
 # Creating Fact Table
@@ -113,12 +147,12 @@ def location_creation(location_dim):
 def trip_fact_creation(df, datetime_dim, vendor_dim, ratecode_dim, payment_dim, distance_dim, location_dim,
                        base_dir = 'data'):
     logger.info("Creating Trip Fact Table...")
-    trip_fact = df.copy()
+    # Shallow copy: the new key columns are added without duplicating df's column data
+    trip_fact = df.copy(deep=False)
     # Getting last trip_id from existing trip_fact file
-    fact_file = os.path.join(base_dir, 'parquet', 'star_schema', 'trip_fact')
-    last_trip_id = get_last_key_from_file(fact_file, 'trip_id')
+    last_trip_id = stored_max_key('trip_fact', 'trip_id', base_dir)
     # Apply last trip_id to new trip_fact and continue fact creation
-    logger.info(f"Trip IDs: {last_trip_id + 1} to {last_trip_id + len(trip_fact)}")
+    logger.info("Trip IDs: %s to %s", last_trip_id + 1, last_trip_id + len(trip_fact))
     trip_fact['trip_id'] = range(last_trip_id + 1, last_trip_id + len(trip_fact) + 1)
     logger.info("Trip ID assignment completed")
     logger.info("Creating datetime_key for fact table")
@@ -130,18 +164,11 @@ def trip_fact_creation(df, datetime_dim, vendor_dim, ratecode_dim, payment_dim,
     trip_fact = trip_fact.merge(ratecode_dim[['ratecode_id', 'ratecode_key']], on='ratecode_id', how='left')
     trip_fact = trip_fact.merge(payment_dim[['payment_id', 'payment_key']], on='payment_id', how='left')
     trip_fact = trip_fact.merge(distance_dim[['trip_distance', 'distance_key']], on='trip_distance', how='left')
-    trip_fact = trip_fact.merge(
-        location_dim[['location_id', 'location_key']], 
-        left_on='pickup_location_id', 
-        right_on='location_id', 
-        how='left'
-        ).rename(columns={'location_key': 'pickup_location_key'}).drop('location_id', axis=1)
-    trip_fact = trip_fact.merge(
-        location_dim[['location_id', 'location_key']], 
-        left_on='dropoff_location_id', 
-        right_on='location_id', 
-        how='left'
-        ).rename(columns={'location_key': 'dropoff_location_key'}).drop('location_id', axis=1)
+    # Location keys come straight from the dense id -> key index, no merge needed; the index
+    # is built once per zone lookup version, not for every month
+    location_index = get_location_index(location_dim)
+    trip_fact['pickup_location_key'] = location_index.keys(trip_fact['pickup_location_id'].to_numpy())
+    trip_fact['dropoff_location_key'] = location_index.keys(trip_fact['dropoff_location_id'].to_numpy())
     
     # Create a clean version of the fact table
     logger.info("Cleaning up fact table columns")
@@ -171,7 +198,12 @@ def trip_fact_creation(df, datetime_dim, vendor_dim, ratecode_dim, payment_dim,
     'airport_fee',
     'cbd_congestion_fee'
     ]
+    # Derived measures from the cleaner (duration_sec int32, avg_mph float32)
+    fact_columns += [col for col in ('duration_sec', 'avg_mph') if col in trip_fact.columns]
+    # Source fleet is carried along when the loader tagged the batch with it
+    if 'fleet' in trip_fact.columns:
+        fact_columns.append('fleet')
     trip_fact = trip_fact[fact_columns]
     logger.info("Trip Fact Table created successfully ✅")
-    logger.info(trip_fact.info())
-    return trip_fact
\ No newline at end of file
+    log_frame_info(logger, trip_fact, 'trip_fact')
+    return trip_fact
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from engine.logger_config import setup_logger
+
+logger = setup_logger('zones')
+
+ZONE_LOOKUP_URL = "https://d37ci6vzurychx.cloudfront.net/misc/taxi_zone_lookup.csv"
+REFERENCE_DIR = os.path.join('data', 'reference')
+ZONE_LOOKUP_FILE = 'taxi_zone_lookup.csv'
+ZONE_META_FILE = 'taxi_zone_lookup.json'
+# The lookup changes a few times a decade, so only revalidate it once a day
+REVALIDATE_SECONDS = int(os.environ.get('ZONE_REVALIDATE_SECONDS', 24 * 3600))
+
+_lock = threading.Lock()
+_lookup_cache = {}
+_index_cache = {}
+
+def _read_meta(meta_path):
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+def _write_atomic(path, data, mode='wb'):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _download_zone_lookup(meta):
+    """Conditional GET of the zone lookup, returns (status_code, content, headers)"""
+    # Through the fetcher's shared session, like every other request to CloudFront
+    from engine.fetcher import get_session
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    resp = get_session().get(ZONE_LOOKUP_URL, headers=headers, timeout=30)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+    return resp.status_code, resp.content, resp.headers
+
+def sync_zone_lookup(reference_dir=REFERENCE_DIR, force=False):
+    """Make sure a local copy of the zone lookup exists and is fresh, returns (path, meta)"""
+    os.makedirs(reference_dir, exist_ok=True)
+    csv_path = os.path.join(reference_dir, ZONE_LOOKUP_FILE)
+    meta_path = os.path.join(reference_dir, ZONE_META_FILE)
+    meta = _read_meta(meta_path)
+    have_cache = os.path.exists(csv_path) and 'sha256' in meta
+
+    if have_cache and not force and time.time() - meta.get('checked_at', 0) < REVALIDATE_SECONDS:
+        return csv_path, meta
+
+    try:
+        status, content, headers = _download_zone_lookup(meta if have_cache else {})
+    except Exception as e:
+        if have_cache:
+            logger.warning("⚠️ Zone lookup revalidation failed, using cached version %s: %s", meta['version'], e)
+            return csv_path, meta
+        raise
+
+    if status == 304:
+        logger.info("✅ Zone lookup not modified (version %s)", meta['version'])
+    else:
+        sha256 = hashlib.sha256(content).hexdigest()
+        if sha256 != meta.get('sha256'):
+            _write_atomic(csv_path, content)
+            meta['version'] = meta.get('version', 0) + 1
+            meta['sha256'] = sha256
+            logger.info("✅ Zone lookup updated to version %s (%s)", meta['version'], sha256[:12])
+        meta['etag'] = headers.get('ETag')
+        meta['last_modified'] = headers.get('Last-Modified')
+    meta['checked_at'] = time.time()
+    _write_atomic(meta_path, json.dumps(meta, indent=2), mode='w')
+    return csv_path, meta
+
+def load_zone_lookup(reference_dir=REFERENCE_DIR):
+    """Zone lookup with columns renamed for the location dimension, cached per content hash"""
+    csv_path, meta = sync_zone_lookup(reference_dir)
+    with _lock:
+        location_dim = _lookup_cache.get(meta['sha256'])
+        if location_dim is None:
+            location_dim = pd.read_csv(csv_path)
+            location_dim.rename(columns={
+                'LocationID': 'location_id',
+                'Borough': 'borough',
+                'Zone': 'zone'}, inplace=True)
+            # Carried along by copies and column selections, so get_location_index can tell
+            # which lookup version a location dimension was built from
+            location_dim.attrs['sha256'] = meta['sha256']
+            _lookup_cache.clear()
+            _lookup_cache[meta['sha256']] = location_dim
+    # Callers add columns to the frame, so never hand out the cached object itself
+    return location_dim.copy(), meta
+
+class LocationIndex:
+    """Read-only dense arrays indexed by location_id for O(1) vectorized lookups"""
+
+    def __init__(self, location_dim, version=None):
+        ids = location_dim['location_id'].to_numpy(dtype=np.int64)
+        if 'location_key' in location_dim.columns:
+            keys = location_dim['location_key'].to_numpy(dtype=np.int32)
+        else:
+            # Same positional rule as transformer.location_creation
+            keys = np.arange(1, len(location_dim) + 1, dtype=np.int32)
+        size = int(ids.max()) + 1 if len(ids) else 1
+        self.version = version
+        self.location_key = np.zeros(size, dtype=np.int32)
+        self.location_key[ids] = keys
+        self.borough = np.full(size, None, dtype=object)
+        self.zone = np.full(size, None, dtype=object)
+        self.borough[ids] = location_dim['borough'].to_numpy()
+        self.zone[ids] = location_dim['zone'].to_numpy()
+        for array in (self.location_key, self.borough, self.zone):
+            array.setflags(write=False)
+
+    def __len__(self):
+        return int((self.location_key > 0).sum())
+
+    def _positions(self, location_ids):
+        ids = np.asarray(location_ids)
+        if ids.dtype.kind == 'f':
+            ids = np.nan_to_num(ids, nan=-1)
+        ids = ids.astype(np.int64)
+        known = (ids >= 0) & (ids < len(self.location_key))
+        return np.where(known, ids, 0), known
+
+    def keys(self, location_ids):
+        """location_key per id, NaN for ids missing from the lookup (like a left merge)"""
+        positions, known = self._positions(location_ids)
+        keys = self.location_key[positions]
+        known &= keys > 0
+        if known.all():
+            return keys.astype(np.int64)
+        return np.where(known, keys, np.nan)
+
+    def boroughs(self, location_ids):
+        positions, known = self._positions(location_ids)
+        return np.where(known, self.borough[positions], None)
+
+    def zones(self, location_ids):
+        positions, known = self._positions(location_ids)
+        return np.where(known, self.zone[positions], None)
+
+def build_location_index(location_dim, version=None):
+    return LocationIndex(location_dim, version=version)
+
+def get_location_index(location_dim=None, reference_dir=REFERENCE_DIR):
+    """Process-wide location index, rebuilt only when the lookup content changes.
+
+    location_dim defaults to the cached zone lookup. Frames that came from load_zone_lookup
+    share the index of their lookup version; any other frame gets an index of its own.
+    """
+    if location_dim is None:
+        location_dim, _ = load_zone_lookup(reference_dir)
+    version = location_dim.attrs.get('sha256')
+    if version is None:
+        return build_location_index(location_dim)
+    with _lock:
+        index = _index_cache.get(version)
+        if index is None:
+            index = build_location_index(location_dim, version=version)
+            _index_cache.clear()
+            _index_cache[version] = index
+    return index
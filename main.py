@@ -1,87 +1,143 @@
-from engine.fetcher import get_all_new_tripdata_urls, mark_file_as_stored
-from engine.loader import trip_data, location_data
-from engine.cleaner import clean_negative_fees, clean_trip_duration, remove_duplicates
-from engine.transformer import vendor_creation, ratecode_creation, payment_creation, datetime_creation, distance_creation, location_creation, trip_fact_creation
-from engine.checker import key_validator
-import engine.storer as storer
+from engine.fetcher import get_all_new_tripdata_urls, mark_file_as_stored, download_source, load_registry, remove_raw
+from engine.registry import claim_file, fail_file
 from engine.logger_config import setup_logger, log_execution_time
+from engine.config import load_config
+from engine.runner import run_stages, clear_cache
+from engine.memory import get_governor
+from engine.profiling import start_profiling, stop_profiling
 from datetime import datetime
+import importlib
+import json
 import time
 import gc
+import argparse
 
 logger = setup_logger('main_pipeline')
 
+# Stage functions are imported on first use, so the "no new files" path never pays
+# for importing pandas, pyarrow and holidays. Name -> module that provides it.
+_LAZY_STAGES = {
+    'trip_data': 'engine.loader',
+    'location_data': 'engine.loader',
+    'clean_negative_fees': 'engine.cleaner',
+    'clean_trip_duration': 'engine.cleaner',
+    'remove_duplicates': 'engine.cleaner',
+    'vendor_creation': 'engine.transformer',
+    'ratecode_creation': 'engine.transformer',
+    'payment_creation': 'engine.transformer',
+    'datetime_creation': 'engine.transformer',
+    'distance_creation': 'engine.transformer',
+    'location_creation': 'engine.transformer',
+    'trip_fact_creation': 'engine.transformer',
+    'key_validator': 'engine.checker',
+    'storer': 'engine.storer',
+    'routes': 'engine.routes',
+    'rejects': 'engine.rejects',
+    'sketches': 'engine.sketches'
+}
+
+def __getattr__(name):
+    module_name = _LAZY_STAGES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(module_name)
+    value = module if module_name.endswith(f'.{name}') else getattr(module, name)
+    globals()[name] = value
+    return value
+
+def _load_stages():
+    """Import every stage once there is work to do (keeps patched names in place)"""
+    for name in _LAZY_STAGES:
+        if name not in globals():
+            __getattr__(name)
+
+def _resolve_stage(fn_name):
+    """Stage function by config name; looked up in this module so patched names apply"""
+    module_name, _, attr = fn_name.rpartition('.')
+    if module_name:
+        return getattr(globals()[module_name], attr)
+    return globals()[fn_name]
+
 @log_execution_time
-def main():
+def main(config_path=None, only=None, skip=None, profile=None):
     try:
         # Start timing and logging the pipeline execution
         pipeline_start_time = time.time()
         start_timestamp = datetime.now()
         logger.info("🚀 Initiating main pipeline...")
         logger.info("=" * 50)
+        config = load_config(config_path)
+        # PIPELINE_PROFILE / --profile: per-stage profiles in logs/profiles/<run>/
+        session = start_profiling(profile)
+        max_workers = config['max_workers']
+        if session is not None and session.single_threaded:
+            # Only one cProfile profiler can be active per process on this Python
+            logger.info("🔬 cProfile on Python 3.12+: running stages one at a time")
+            max_workers = 1
         
         # PHASE 1: LOADING NEW DATA
         logger.info("PHASE 1: Start loading protocol...")
         logger.info("🔍 Checking for previously stored files")
-        logger.info(f"🔍 Fetching new trip data URLs")
+        logger.info("🔍 Fetching new trip data URLs")
         new_files = get_all_new_tripdata_urls()
         if not new_files:
             logger.info("✅ No new trip data files found. Exiting pipeline.")
             return "No new trip data files found."
+        _load_stages()
+        governor = get_governor()
         
         for url, fname in new_files:
             try:
-                logger.info(f"📥 Loading file {fname}...")
-                df = trip_data(url)
-                location_dim = location_data()
-                logger.info("✅ All data loaded successfully")
-                gc.collect()
-
-                # PHASE 2: DATA CLEANING
-                logger.info("🧹 PHASE 2: Perform validation and data cleaning...")
-                df = clean_negative_fees(df) # Clean negative value in all fees columns
-                df = clean_trip_duration(df) # Clean trip duration less than 2 minutes or more than 3 hours
-                df = remove_duplicates(df) # Remove duplicate records and create trip_id
-                logger.info("✅ Data cleaning completed")
-                gc.collect()
-
-                # PHASE 3: TRANSFORMING INTO STAR SCHEMA
-                logger.info("⭐ PHASE 3: Transforming data into star schema...")
-                vendor_dim = vendor_creation(df)
-                ratecode_dim = ratecode_creation(df)
-                payment_dim = payment_creation(df)
-                datetime_dim = datetime_creation(df, base_dir='data')
-                distance_dim = distance_creation(df, base_dir='data')
-                location_dim = location_creation(location_dim)
-                trip_fact = trip_fact_creation(df, datetime_dim, vendor_dim, ratecode_dim, payment_dim, distance_dim, 
-                                               location_dim, base_dir='data')
-                logger.info("✅ Star schema transformation completed")
-                del df
-                gc.collect()
-                
-                # PHASE 4: DATA QUALITY CHECKS
-                logger.info("🔍 PHASE 4: Data Quality checks before storing...")
-                key_validator(trip_fact)
-                logger.info("✅ Data Quality checks passed")
-                gc.collect()
-
-                # PHASE 5: STORING DATA
-                logger.info("💾 PHASE 5: Storing dataframes to Parquet and CSV formats...")
-                storer.store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, 
-                                        location_dim, base_dir='data', append_mode=True)
-                logger.info("✅ Data stored successfully in Parquet format")
-                gc.collect()
-                storer.store_to_csv(vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, trip_fact, 
-                                    location_dim, base_dir='data', append_mode=True)
-                logger.info("✅ Data stored successfully in CSV format")
+                # Several pipeline processes can share the registry; each month goes to one of them,
+                # and one that another worker stored since this worker looked is left alone
+                seen = load_registry().get(fname)
+                if not claim_file(fname, seen=seen):
+                    logger.info("⏭️ %s is being processed or was just stored by another worker, skipping", fname)
+                    continue
+                # Read after the claim: while it is held no other worker writes this row.
+                # Republished months are only reprocessed when the content actually changed
+                stored = load_registry().get(fname)
+                logger.info("📥 Processing file %s...", fname)
+                governor.reset()
+                source, version = download_source(url, fname, stored)
+                if source is None:
+                    logger.info("✅ %s is unchanged since it was stored, skipping", fname)
+                    previous = stored or {}
+                    mark_file_as_stored(fname, rows_loaded=previous.get('rows_loaded'),
+                                        rows_stored=previous.get('rows_stored'), **version)
+                    continue
+                if stored is not None:
+                    logger.info("♻️ %s changed, replacing its previously stored rows", fname)
+                # Load, clean, transform, check and store as configured in pipeline.json;
+                # independent stages (dimensions, Parquet/CSV writes) run concurrently
+                period = fname.replace('.parquet', '')
+                variables = {'base_dir': config['base_dir'], 'append_mode': config['append_mode'],
+                             'strict_quality': config['strict_quality'], 'fee_cents': config['fee_cents'],
+                             'exports': config['exports'], 'period': period}
+                result = run_stages(config['stages'], resolve=_resolve_stage, seeds={'url': source, 'fname': fname},
+                                    variables=variables, max_workers=max_workers, only=only, skip=skip,
+                                    cache_dir=config['cache_dir'], run_key=period, governor=governor)
                 logger.info("🎉 Pipeline completed successfully!")
+                # Calibrated per-row costs size the next run's batches
+                governor.save()
                 gc.collect()
                 
-                # Mark files as stored
-                mark_file_as_stored(fname)
+                # A failed run keeps its stage cache so "--only parquet" can resume from it;
+                # --only runs leave the file to be processed in full later
+                if not only:
+                    if not config['keep_cache']:
+                        clear_cache(config['cache_dir'], period)
+                    mark_file_as_stored(fname, rows_loaded=result['rows'].get('trips'),
+                                        rows_stored=result['rows'].get('trip_fact'), **version)
+                    # The stored partitions replace the download; a failed or partial run keeps
+                    # it for the retry
+                    remove_raw(fname)
+                else:
+                    fail_file(fname, f"partial run ({', '.join(only)}), not stored in full")
                 
             except Exception as e:
-                logger.error(f"❌ Error processing file {fname}: {e}")
+                logger.error("❌ Error processing file %s: %s", fname, e)
+                fail_file(fname, e)
                 continue # Continue to the next file if there's an error
         
         # End timing and logging calculation
@@ -90,10 +146,10 @@ def main():
         total_duration = pipeline_end_time - pipeline_start_time
         logger.info("=" * 50)
         logger.info("⏱️ PIPELINE TIMING SUMMARY:")
-        logger.info(f"🚀 Started:  {start_timestamp.strftime('%H:%M:%S.%f')[:-3]}")
-        logger.info(f"🎉 Finished: {end_timestamp.strftime('%H:%M:%S.%f')[:-3]}")
-        logger.info(f"⏰ TOTAL DURATION: {total_duration:.2f} seconds")
-        logger.info(f"⏰ TOTAL DURATION: {int(total_duration//60)}m {total_duration%60:.2f}s")
+        logger.info("🚀 Started:  %s", start_timestamp.strftime('%H:%M:%S.%f')[:-3])
+        logger.info("🎉 Finished: %s", end_timestamp.strftime('%H:%M:%S.%f')[:-3])
+        logger.info("⏰ TOTAL DURATION: %.2f seconds", total_duration)
+        logger.info("⏰ TOTAL DURATION: %sm %.2fs", int(total_duration//60), total_duration%60)
         logger.info("=" * 50)
         return "Pipeline completed successfully"
         
@@ -101,11 +157,81 @@ def main():
         # Handle errors with timing
         if 'pipeline_start_time' in locals():
             error_duration = time.time() - pipeline_start_time
-            logger.error(f"💥 PIPELINE FAILED AFTER: {error_duration:.2f} seconds: {str(e)}")
+            logger.error("💥 PIPELINE FAILED AFTER: %.2f seconds: %s", error_duration, e)
         else:
-            logger.error(f"💥 PIPELINE FAILED: {str(e)}")
+            logger.error("💥 PIPELINE FAILED: %s", e)
         logger.error("=" * 50)
         raise
+    finally:
+        # Writes the profiles and logs the hotspot summary when profiling was on
+        stop_profiling()
+
+def parse_months(values):
+    """['2025-01', '2025-03:2025-05'] -> [(2025, 1), (2025, 3), (2025, 4), (2025, 5)]"""
+    from engine.storer import month_range
+    months = []
+    for value in values:
+        first, _, last = value.partition(':')
+        first = tuple(int(part) for part in first.split('-'))
+        last = tuple(int(part) for part in last.split('-')) if last else first
+        months += month_range(first, last)
+    return months
+
+@log_execution_time
+def export(formats, tables=None, months=None, config_path=None):
+    """Export stored tables on demand, e.g. CSV of trip_fact for a few months only"""
+    from engine.storer import export_tables
+    config = load_config(config_path)
+    periods = parse_months(months) if months else None
+    logger.info("📤 Exporting %s as %s%s", ', '.join(tables or ['all tables']), ', '.join(formats),
+                f" for {len(periods)} month(s)" if periods else "")
+    return export_tables(formats, tables=tables, periods=periods, base_dir=config['base_dir'])
+
+def stats(months=None, config_path=None):
+    """Distinct counts and p50/p95/p99 over the given months from the stored sketches, no fact scan"""
+    from engine.sketches import load_sketches
+    config = load_config(config_path)
+    periods = parse_months(months) if months else None
+    summary = load_sketches(config['base_dir'], periods).summary()
+    logger.info("📊 Trip statistics for %s:\n%s", ', '.join(months) if months else 'all months',
+                json.dumps(summary, indent=2))
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NYC Taxi star schema pipeline")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running and poll for new TLC files instead of exiting")
+    parser.add_argument('--interval', type=int, default=None,
+                        help="seconds between polls in daemon mode (PIPELINE_POLL_INTERVAL)")
+    parser.add_argument('--health-port', type=int, default=None,
+                        help="localhost port of the /health and /status endpoint (PIPELINE_HEALTH_PORT)")
+    parser.add_argument('--config', default=None,
+                        help="pipeline stage config (PIPELINE_CONFIG, default pipeline.json)")
+    parser.add_argument('--only', nargs='+', default=None, metavar='STAGE',
+                        help="run only these stages (plus what they need, cached outputs are reused)")
+    parser.add_argument('--skip', nargs='+', default=None, metavar='STAGE',
+                        help="skip these stages and everything that depends on them, e.g. --skip csv")
+    parser.add_argument('--profile', nargs='?', const='cprofile', default=None, choices=['cprofile', 'pyinstrument'],
+                        help="profile every stage into logs/profiles/<run>/ (PIPELINE_PROFILE)")
+    parser.add_argument('--export', nargs='+', default=None, metavar='FORMAT',
+                        help="export stored tables (arrow, feather, csv) instead of running the pipeline")
+    parser.add_argument('--tables', nargs='+', default=None, metavar='TABLE',
+                        help="tables to export (default: all)")
+    parser.add_argument('--stats', action='store_true',
+                        help="print distinct counts and percentiles from the stored sketches")
+    parser.add_argument('--months', nargs='+', default=None, metavar='YYYY-MM[:YYYY-MM]',
+                        help="months or month ranges to export or summarize (default: all)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.export:
+        export(args.export, args.tables, args.months, args.config)
+    elif args.stats:
+        stats(args.months, args.config)
+    elif args.daemon:
+        from engine.scheduler import run_scheduler, POLL_INTERVAL, HEALTH_PORT
+        run_scheduler(lambda: main(args.config, args.only, args.skip, args.profile), interval=args.interval or POLL_INTERVAL,
+                      health_port=args.health_port if args.health_port is not None else HEALTH_PORT)
+    else:
+        main(args.config, args.only, args.skip, args.profile)
\ No newline at end of file
@@ -166,8 +166,8 @@ def sample_distance_dim():
 def sample_datetime_dim():
     return pd.DataFrame({
         'datetime_key': [1, 2],
-        'pickup_datetime': [pd.Timestamp('2024-01-01 10:00:00'), 
-                            pd.Timestamp('2024-01-01 11:00:00')]
+        'pickup_datetime': [pd.Timestamp('2025-01-01 10:00:00'), 
+                            pd.Timestamp('2025-01-01 11:00:00')]
     })
 
 @pytest.fixture
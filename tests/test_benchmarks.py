@@ -0,0 +1,73 @@
+from benchmarks import stages as bench
+
+BASELINE = {'rows': 1000, 'stages': {
+    'trips': {'seconds': 0.50, 'peak_mb': 40.0},
+    'trip_fact': {'seconds': 0.20, 'peak_mb': 30.0},
+    'parquet': {'seconds': 0.001, 'peak_mb': 0.1}
+}}
+
+class TestCompare:
+    """Test cases for the stage benchmark comparison"""
+
+    def test_regression_past_tolerance(self):
+        """Test that only stages slower or larger than the tolerance are flagged"""
+        current = {'rows': 1000, 'stages': {
+            'trips': {'seconds': 0.55, 'peak_mb': 40.0},     # +10% time: within tolerance
+            'trip_fact': {'seconds': 0.20, 'peak_mb': 45.0},  # +50% memory
+            'parquet': {'seconds': 0.004, 'peak_mb': 0.1}     # 4x, but below the noise floor
+        }}
+
+        rows = bench.compare(BASELINE, current, time_tolerance=0.25, memory_tolerance=0.10)
+        status = {(name, metric): status for name, metric, _, _, _, status in rows}
+
+        assert status[('trips', 'seconds')] == 'ok'
+        assert status[('trip_fact', 'peak_mb')] == 'REGRESSED'
+        assert status[('parquet', 'seconds')] == 'ok'
+        assert [key for key, value in status.items() if value == 'REGRESSED'] == [('trip_fact', 'peak_mb')]
+
+    def test_slower_host_is_not_a_regression(self):
+        """Test that timings are scaled by the reference workload before comparing"""
+        baseline = {**BASELINE, 'calibration_seconds': 0.10}
+        slower = {'rows': 1000, 'calibration_seconds': 0.15, 'stages': {
+            'trips': {'seconds': 0.75, 'peak_mb': 40.0},      # +50%, same as the host
+            'trip_fact': {'seconds': 0.45, 'peak_mb': 30.0},  # +125%, more than the host
+            'parquet': BASELINE['stages']['parquet']
+        }}
+
+        rows = bench.compare(baseline, slower)
+        status = {(name, metric): status for name, metric, _, _, _, status in rows}
+
+        assert round(bench.host_speed(baseline, slower), 6) == 1.5
+        assert status[('trips', 'seconds')] == 'ok'
+        assert status[('trip_fact', 'seconds')] == 'REGRESSED'
+        assert bench.host_speed(BASELINE, slower) == 1.0
+
+    def test_new_and_missing_stages(self):
+        """Test that added and removed stages are reported in the diff"""
+        current = {'rows': 1000, 'stages': {
+            'trips': BASELINE['stages']['trips'],
+            'trip_fact': BASELINE['stages']['trip_fact'],
+            'zone_pairs': {'seconds': 0.1, 'peak_mb': 8.0}
+        }}
+
+        rows = bench.compare(BASELINE, current)
+        diff = bench.format_diff(rows)
+
+        assert {row[5] for row in rows if row[0] == 'parquet'} == {'missing'}
+        assert {row[5] for row in rows if row[0] == 'zone_pairs'} == {'new'}
+        assert 'zone_pairs' in diff and 'missing' in diff
+
+class TestMeasure:
+    """Test cases for running the stage graph offline on synthetic trips"""
+
+    def test_measure_every_stage(self):
+        """Test that every enabled stage of pipeline.json is timed and traced"""
+        from engine.config import load_config
+        enabled = {stage['name'] for stage in load_config()['stages'] if stage.get('enabled', True)}
+
+        result = bench.measure(2000, repeat=1)
+
+        assert result['rows'] == 2000
+        assert set(result['stages']) == enabled
+        assert all(values['seconds'] >= 0 and values['peak_mb'] >= 0 for values in result['stages'].values())
+        assert result['stages']['trips']['peak_mb'] > 0
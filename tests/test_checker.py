@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import pytest
+import engine.checker as checker
+
+@pytest.fixture
+def star_schema():
+    """Small fact table with matching dimensions"""
+    trip_fact = pd.DataFrame({
+        'trip_id': [1, 2, 3, 4],
+        'datetime_key': [1, 2, 3, 4],
+        'vendor_key': [1, 2, 1, 2],
+        'ratecode_key': [1, 1, 1, 1],
+        'payment_key': [1, 2, 1, 1],
+        'distance_key': [1, 2, 3, 4],
+        'pickup_location_key': [1, 2, 2, 1],
+        'dropoff_location_key': [2, 1, 1, 2],
+        'fare_amount': [10.0, 12.5, 7.0, 30.0],
+        'tip_amount': [1.0, 0.0, 2.0, 5.0]
+    })
+    dimensions = {
+        'vendor_dim': pd.DataFrame({'vendor_key': [1, 2]}),
+        'ratecode_dim': pd.DataFrame({'ratecode_key': [1]}),
+        'payment_dim': pd.DataFrame({'payment_key': [1, 2]}),
+        'distance_dim': pd.DataFrame({'distance_key': [1, 2, 3, 4]}),
+        'datetime_dim': pd.DataFrame({'datetime_key': [1, 2, 3, 4]}),
+        'location_dim': pd.DataFrame({'location_key': [1, 2]})
+    }
+    return trip_fact, dimensions
+
+class TestQualityReport:
+    """Test cases for quality_report function"""
+
+    def test_clean_batch_passes(self, star_schema):
+        """Test a consistent star schema passes every check"""
+        trip_fact, dimensions = star_schema
+        report = checker.quality_report(trip_fact, dimensions)
+
+        assert report['passed']
+        assert report['rows'] == 4
+        assert set(report['null_keys']) == set(checker.KEY_COLUMNS)
+        assert report['fees']['fare_amount']['max'] == 30.0
+
+    def test_nulls_orphans_and_negative_fees_fail(self, star_schema):
+        """Test missing keys, orphan keys and negative fees are reported"""
+        trip_fact, dimensions = star_schema
+        trip_fact['vendor_key'] = [1, np.nan, 1, 2]
+        trip_fact['payment_key'] = [1, 2, 9, 1]
+        trip_fact.loc[0, 'tip_amount'] = -1.0
+
+        report = checker.quality_report(trip_fact, dimensions, max_workers=2)
+
+        assert report['null_keys']['vendor_key'] == 1
+        assert report['referential_integrity']['vendor_key'] == 0
+        assert report['referential_integrity']['payment_key'] == 1
+        assert report['fees']['tip_amount']['below_range'] == 1
+        assert len(report['failures']) == 3
+        assert not report['passed']
+
+    def test_orphans_of_large_keys(self):
+        """Test keys around 10^9 are checked without a bitmap sized to the absolute key"""
+        import tracemalloc
+        dim_keys = np.arange(1_000_000_000, 1_000_010_000, dtype=np.int64)
+        values = np.r_[dim_keys[::2], [999_999_999, 1_000_010_000]].astype(np.float64)
+        stray = np.r_[values, [4e12, np.nan]]
+
+        tracemalloc.start()
+        try:
+            dense = checker._orphan_count(values, dim_keys)
+            sparse = checker._orphan_count(stray, dim_keys)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert dense == 2
+        assert sparse == 3
+        assert peak < 10_000_000
+
+class TestKeyValidator:
+    """Test cases for key_validator function"""
+
+    def test_strict_mode_raises(self, star_schema):
+        """Test strict mode turns failures into errors"""
+        trip_fact, dimensions = star_schema
+        trip_fact['ratecode_key'] = [1, 1, 2, 1]
+
+        assert not checker.key_validator(trip_fact, dimensions)['passed']
+        with pytest.raises(ValueError):
+            checker.key_validator(trip_fact, dimensions, strict=True)
+
+class TestSampledQuality:
+    """Test cases for the sampled quality mode"""
+
+    def test_stratified_sample_is_proportional(self):
+        """Test each stratum gets its proportional share of the sample"""
+        trip_fact = pd.DataFrame({'vendor_key': [1] * 8000 + [2] * 2000})
+        positions = checker.stratified_sample(trip_fact, sample_size=1000, seed=1)
+        sampled = trip_fact.take(positions)['vendor_key'].value_counts()
+
+        assert len(positions) == 1000
+        assert len(np.unique(positions)) == 1000
+        assert sampled[1] == 800 and sampled[2] == 200
+
+    def test_rate_interval_bounds(self):
+        """Test the interval brackets the observed rate and is exact for a full scan"""
+        rate, low, high = checker.rate_interval(10, 10_000, 1_000_000)
+        assert low < rate < high
+        assert checker.rate_interval(3, 100, 100) == (0.03, 0.03, 0.03)
+
+    def test_clean_batch_stays_sampled(self, star_schema):
+        """Test no exhaustive fallback when every estimate is under the threshold"""
+        trip_fact, dimensions = star_schema
+        big = trip_fact.loc[np.repeat(trip_fact.index, 50_000)].reset_index(drop=True)
+
+        report, sample = checker.sampled_quality_report(big, dimensions, sample_size=100_000, seed=0)
+
+        assert report['mode'] == 'sampled'
+        assert report['rows'] == len(big)
+        assert len(sample) == report['sample_rows']
+
+    def test_violations_trigger_exhaustive_fallback(self, star_schema):
+        """Test an estimate crossing the threshold falls back to the full check"""
+        trip_fact, dimensions = star_schema
+        trip_fact['payment_key'] = [1, 2, 9, 1]
+        big = trip_fact.loc[np.repeat(trip_fact.index, 1_000)].reset_index(drop=True)
+
+        report, _ = checker.sampled_quality_report(big, dimensions, sample_size=1_000, seed=0)
+
+        assert report['mode'] == 'exhaustive_fallback'
+        assert report['referential_integrity']['payment_key'] == 1_000
+
+class TestDriftReport:
+    """Test cases for month-over-month drift detection"""
+
+    def test_drift_against_previous_month(self, star_schema, temp_dir):
+        """Test summaries are stored per period and compared with the previous one"""
+        trip_fact, dimensions = star_schema
+        checker.key_validator(trip_fact, dimensions, period='yellow_tripdata_2025-01', base_dir=temp_dir)
+        trip_fact['fare_amount'] = trip_fact['fare_amount'] * 10
+        report = checker.key_validator(trip_fact, dimensions, period='yellow_tripdata_2025-02', base_dir=temp_dir)
+
+        assert report['drift_baseline'] == 'yellow_tripdata_2025-01'
+        assert report['drift']['fare_amount']['drifted']
+        assert not report['drift']['tip_amount']['drifted']
+        assert report['drift']['fare_amount']['mean_change'] == pytest.approx(9.0)
+
+class TestFeeCents:
+    """Test cases for quality checks on int32 cent fees"""
+
+    def test_cents_are_checked_in_dollars(self, star_schema):
+        """Test fee ranges and summaries see dollars when the fact holds cents"""
+        trip_fact, dimensions = star_schema
+        cents = trip_fact.assign(fare_amount=(trip_fact['fare_amount'] * 100).astype('int32'),
+                                 tip_amount=(trip_fact['tip_amount'] * 100).astype('int32'))
+
+        report = checker.quality_report(cents, dimensions)
+
+        assert report['passed'] and not report['warnings']
+        assert report['fees']['fare_amount']['max'] == 30.0
+        assert checker.fee_summary(cents) == checker.fee_summary(trip_fact)
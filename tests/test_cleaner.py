@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import engine.cleaner as cleaner
+from engine.rejects import RejectCollector, REJECT_REASONS
 
 class TestCleanNegativeFees:
     """Test cases for clean_negative_fees function"""
@@ -61,6 +62,25 @@ class TestCleanTripDuration:
         
         # Should only keep valid duration trips (2 out of 4)
         assert len(result) == 2
+        assert result['duration_sec'].tolist() == [1800, 2700]
+        assert str(result['duration_sec'].dtype) == 'int32'
+        assert result['avg_mph'].isna().all()
+
+    def test_clean_trip_duration_speed_measures(self):
+        """Test average speed is derived once and implausible speeds are removed"""
+        pickup = pd.to_datetime(['2024-01-01 10:00:00'] * 3)
+        df = pd.DataFrame({
+            'pickup_datetime': pickup,
+            'dropoff_datetime': pickup + pd.to_timedelta([30, 30, 10], unit='min'),
+            'trip_distance': [6.0, np.nan, 40.0]  # 12 mph, unknown, 240 mph
+        })
+
+        result = cleaner.clean_trip_duration(df)
+
+        assert len(result) == 2
+        assert str(result['avg_mph'].dtype) == 'float32'
+        assert result['avg_mph'].iloc[0] == 12.0
+        assert np.isnan(result['avg_mph'].iloc[1])
 
 class TestRemoveDuplicates:
     """Test cases for remove_duplicates function"""
@@ -87,4 +107,51 @@ class TestRemoveDuplicates:
         result = cleaner.remove_duplicates(df)
         
         # Should remove duplicates
-        assert len(result) == 2  # Only 2 unique records
\ No newline at end of file
+        assert len(result) == 2  # Only 2 unique records
+
+class TestRejectedRows:
+    """Test cases for handing rejected rows to a RejectCollector"""
+
+    def test_rejects_with_reason_bits(self, corrupted_trip_data):
+        """Test each stage hands over exactly the rows it drops, tagged with its reasons"""
+        df = corrupted_trip_data.copy()
+        df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'])
+        df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'])
+        df = pd.concat([df, df.iloc[[0]]], ignore_index=True)  # duplicate of a valid trip
+        rejects = RejectCollector()
+
+        result = cleaner.clean_negative_fees(df, rejects=rejects)
+        result = cleaner.clean_trip_duration(result, rejects=rejects)
+        result = cleaner.remove_duplicates(result, rejects=rejects)
+        rejected = rejects.to_frame()
+
+        assert len(result) + len(rejected) == len(df)
+        assert 'fee_invalid' not in rejected.columns
+        reasons = rejected['reject_reason'].tolist()
+        assert reasons.count(REJECT_REASONS['negative_fee']) == 3
+        assert reasons[-1] == REJECT_REASONS['duplicate']
+        assert str(rejected['reject_reason'].dtype) == 'uint8'
+
+    def test_duration_reasons_combine(self):
+        """Test a row failing several duration rules carries all their bits"""
+        pickup = pd.to_datetime(['2024-01-01 10:00:00'] * 3)
+        df = pd.DataFrame({
+            'pickup_datetime': pickup,
+            'dropoff_datetime': pickup + pd.to_timedelta([1, 30, 300], unit='min'),
+            'trip_distance': [10.0, 60.0, 1.0]  # 600 mph and short, 120 mph, long
+        })
+        rejects = RejectCollector()
+
+        result = cleaner.clean_trip_duration(df, rejects=rejects)
+
+        assert len(result) == 0
+        assert rejects.to_frame()['reject_reason'].tolist() == [
+            REJECT_REASONS['short_trip'] | REJECT_REASONS['implausible_speed'],
+            REJECT_REASONS['implausible_speed'],
+            REJECT_REASONS['long_trip']]
+
+    def test_without_collector_unchanged(self, sample_trip_data):
+        """Test remove_duplicates without a collector drops the same rows"""
+        df = pd.concat([sample_trip_data, sample_trip_data.head(5)], ignore_index=True)
+
+        assert cleaner.remove_duplicates(df).equals(cleaner.remove_duplicates(df, rejects=RejectCollector()))
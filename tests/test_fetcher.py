@@ -0,0 +1,79 @@
+import engine.fetcher as fetcher
+
+class _Response:
+    def __init__(self, status_code, headers=None, body=b''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+class _Session:
+    """Records request headers and answers with canned responses"""
+
+    def __init__(self, get=None, head=None):
+        self.get_response, self.head_response = get, head
+        self.sent_headers = None
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent_headers = headers
+        return self.get_response
+
+    def head(self, url, **kwargs):
+        return self.head_response
+
+class TestHasChanged:
+    """Test cases for has_changed function"""
+
+    def test_has_changed(self):
+        """Test ETag wins over Last-Modified and unknown versions are trusted"""
+        assert fetcher.has_changed({'etag': '"a"'}, {'etag': '"b"'})
+        assert not fetcher.has_changed({'etag': '"a"', 'last_modified': 'x'}, {'etag': '"a"', 'last_modified': 'y'})
+        assert fetcher.has_changed({'last_modified': 'x'}, {'etag': None, 'last_modified': 'y'})
+        assert not fetcher.has_changed({}, {'etag': '"b"'})
+
+class TestDownloadSource:
+    """Test cases for download_source function"""
+
+    def test_not_modified_skips_download(self, temp_dir, monkeypatch):
+        """Test a 304 on the conditional GET means nothing is reprocessed"""
+        session = _Session(get=_Response(304))
+        monkeypatch.setattr(fetcher, 'get_session', lambda: session)
+        monkeypatch.setattr(fetcher, 'RAW_DIR', temp_dir)
+
+        path, version = fetcher.download_source('https://example/x.parquet', 'x.parquet',
+                                                {'etag': '"a"', 'sha256': 'ff'})
+
+        assert path is None
+        assert session.sent_headers == {'If-None-Match': '"a"'}
+        assert version['sha256'] == 'ff'
+
+    def test_same_content_is_not_reprocessed(self, temp_dir, monkeypatch):
+        """Test new validators over identical bytes are recognised by the content hash"""
+        import hashlib
+        body = b'PAR1 same bytes'
+        session = _Session(get=_Response(200, {'ETag': '"new"'}, body))
+        monkeypatch.setattr(fetcher, 'get_session', lambda: session)
+        monkeypatch.setattr(fetcher, 'RAW_DIR', temp_dir)
+
+        stored = {'etag': '"old"', 'sha256': hashlib.sha256(body).hexdigest()}
+        path, version = fetcher.download_source('https://example/x.parquet', 'x.parquet', stored)
+        assert path is None
+        assert version['etag'] == '"new"'
+
+        path, version = fetcher.download_source('https://example/x.parquet', 'x.parquet',
+                                                {'etag': '"old"', 'sha256': 'different'})
+        assert path.endswith('x.parquet')
+        with open(path, 'rb') as f:
+            assert f.read() == body
@@ -1,3 +1,4 @@
+import os
 import pytest
 import requests
 from unittest.mock import patch
@@ -36,7 +37,8 @@ class TestLocationData:
     
     def test_location_data_network_error(self):
         """Test handling of network errors for location data"""
-        with patch('pandas.read_csv') as mock_read:
+        with patch('pandas.read_csv') as mock_read, \
+             patch('engine.zones.sync_zone_lookup', return_value=('taxi_zone_lookup.csv', {'sha256': 'network-error'})):
             mock_read.side_effect = requests.exceptions.ConnectionError("Network error")
             
             with pytest.raises(requests.exceptions.ConnectionError):
@@ -44,7 +46,8 @@ class TestLocationData:
     
     def test_location_data_column_renaming(self, sample_raw_location_data):
         """Test location data column renaming"""
-        with patch('pandas.read_csv') as mock_read:
+        with patch('pandas.read_csv') as mock_read, \
+             patch('engine.zones.sync_zone_lookup', return_value=('taxi_zone_lookup.csv', {'sha256': 'renaming'})):
             mock_read.return_value = sample_raw_location_data
             
             result = loader.location_data()
@@ -52,4 +55,49 @@ class TestLocationData:
             # Check if columns are properly renamed
             expected_columns = ['location_id', 'borough', 'zone', 'service_zone']
             for col in expected_columns:
-                assert col in result.columns
\ No newline at end of file
+                assert col in result.columns
+
+class TestIterTripBatches:
+    """Test cases for iter_trip_batches function"""
+
+    def test_iter_trip_batches_conforms_each_batch(self, sample_raw_trip_data, temp_dir):
+        """Test local files are streamed in batches mapped to the common schema"""
+        path = os.path.join(temp_dir, 'yellow_tripdata_2025-01.parquet')
+        sample_raw_trip_data.to_parquet(path, index=False)
+
+        batches = list(loader.iter_trip_batches(path, batch_size=40))
+
+        assert [len(batch) for batch in batches] == [40, 40, 20]
+        for batch in batches:
+            assert 'pickup_datetime' in batch.columns
+            assert 'airport_fee' in batch.columns
+            assert (batch['fleet'] == 'yellow').all()
+
+    def test_trip_data_assembles_batches(self, sample_raw_trip_data, temp_dir):
+        """Test the month assembled from Arrow batches equals the batches concatenated in pandas"""
+        import pandas as pd
+        path = os.path.join(temp_dir, 'yellow_tripdata_2025-01.parquet')
+        sample_raw_trip_data.to_parquet(path, index=False)
+
+        result = loader.trip_data(path, batch_size=40)
+        expected = pd.concat(loader.iter_trip_batches(path, batch_size=40), ignore_index=True)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    def test_remote_file_is_removed_after_reading(self, sample_raw_trip_data, temp_dir, monkeypatch):
+        """Test a URL is downloaded by the fetcher and its raw copy deleted once read"""
+        import shutil
+        import engine.fetcher as fetcher
+        fname = 'yellow_tripdata_2025-01.parquet'
+        source = os.path.join(temp_dir, fname)
+        sample_raw_trip_data.to_parquet(source, index=False)
+        raw_dir = os.path.join(temp_dir, 'raw')
+        os.makedirs(raw_dir)
+        monkeypatch.setattr(fetcher, 'RAW_DIR', raw_dir)
+        monkeypatch.setattr(fetcher, 'download_source',
+                            lambda url, name, stored=None: (shutil.copy(source, os.path.join(raw_dir, name)), {}))
+
+        batches = list(loader.iter_trip_batches(f'https://example/{fname}', batch_size=40))
+
+        assert sum(len(batch) for batch in batches) == len(sample_raw_trip_data)
+        assert os.listdir(raw_dir) == []
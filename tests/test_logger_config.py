@@ -0,0 +1,49 @@
+import json
+import logging
+import queue
+import pandas as pd
+import engine.logger_config as logger_config
+
+class TestJsonFormatter:
+    """Test cases for JsonFormatter"""
+
+    def test_json_formatter_merges_args(self):
+        """Test records are rendered as one JSON document with merged %-args"""
+        record = logging.LogRecord('loader', logging.INFO, __file__, 10, "Loaded %s records", (1000,), None)
+        payload = json.loads(logger_config.JsonFormatter().format(record))
+
+        assert payload['message'] == "Loaded 1000 records"
+        assert payload['logger'] == 'loader'
+        assert payload['level'] == 'INFO'
+
+class TestQueueLogging:
+    """Test cases for the queue-based logging mode"""
+
+    def test_deferred_handler_does_not_format(self):
+        """Test the calling thread only enqueues the unformatted record"""
+        records = queue.SimpleQueue()
+        logger = logging.getLogger('test_deferred_queue')
+        logger.addHandler(logger_config._DeferredQueueHandler(records))
+        logger.setLevel(logging.INFO)
+
+        logger.info("Loaded %s records", 1000)
+        record = records.get_nowait()
+
+        assert record.msg == "Loaded %s records"
+        assert record.args == (1000,)
+        assert record.getMessage() == "Loaded 1000 records"
+
+    def test_frame_info_only_at_debug(self):
+        """Test DataFrame.info() is not rendered when DEBUG is disabled"""
+        records = queue.SimpleQueue()
+        logger = logging.getLogger('test_frame_info')
+        logger.addHandler(logger_config._DeferredQueueHandler(records))
+        df = pd.DataFrame({'a': [1, 2]})
+
+        logger.setLevel(logging.INFO)
+        logger_config.log_frame_info(logger, df, 'df')
+        assert records.empty()
+
+        logger.setLevel(logging.DEBUG)
+        logger_config.log_frame_info(logger, df, 'df')
+        assert 'RangeIndex' in records.get_nowait().getMessage()
@@ -0,0 +1,115 @@
+import os
+import pandas as pd
+import engine.memory as memory
+import engine.loader as loader
+
+MB = 1024 ** 2
+
+class _Rss:
+    """Settable RSS reading for the governor"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+class TestLimits:
+    """Test cases for cgroup and size helpers"""
+
+    def test_parse_size(self):
+        """Test human readable sizes are converted to bytes"""
+        assert memory.parse_size('2G') == 2 * 1024 ** 3
+        assert memory.parse_size('1536M') == 1536 * MB
+        assert memory.parse_size('4096') == 4096
+
+    def test_cgroup_v2_limit(self, temp_dir):
+        """Test memory.max is read, 'max' meaning unlimited"""
+        path = os.path.join(temp_dir, 'memory.max')
+        with open(path, 'w') as f:
+            f.write('2147483648\n')
+        assert memory.cgroup_memory_limit(temp_dir) == 2 * 1024 ** 3
+        with open(path, 'w') as f:
+            f.write('max\n')
+        assert memory.cgroup_memory_limit(temp_dir) is None
+
+    def test_cgroup_v1_unlimited(self, temp_dir):
+        """Test the cgroup v1 'unlimited' sentinel is treated as no limit"""
+        os.makedirs(os.path.join(temp_dir, 'memory'))
+        with open(os.path.join(temp_dir, 'memory', 'memory.limit_in_bytes'), 'w') as f:
+            f.write('9223372036854771712\n')
+        assert memory.cgroup_memory_limit(temp_dir) is None
+
+class TestMemoryGovernor:
+    """Test cases for MemoryGovernor"""
+
+    def test_batch_size_from_calibration(self, temp_dir):
+        """Test batches are sized so calibrated rows fit in the free budget"""
+        rss = _Rss(100 * MB)
+        governor = memory.MemoryGovernor(budget=1000 * MB, high_water=0.5, rss=rss,
+                                         calibration_path=os.path.join(temp_dir, 'calibration.json'))
+        assert governor.batch_size('trips', default=123_456) == 123_456
+
+        governor.record('trips', pd.DataFrame({'a': [1.0] * 1000, 'b': [2.0] * 1000}))
+        assert governor.row_costs['trips'] == 16
+        expected = int((500 - 100) * MB / (16 * memory.BATCH_OVERHEAD))
+        governor.reset()
+        assert governor.batch_size('trips', default=123_456, max_rows=10 ** 9) == expected
+
+    def test_batches_shrink_under_pressure(self):
+        """Test batch sizes halve once RSS crosses the high-water mark"""
+        rss = _Rss(100 * MB)
+        governor = memory.MemoryGovernor(budget=1000 * MB, rss=rss, calibration_path=None)
+        first = governor.batch_size('trips', default=400_000)
+        rss.value = 900 * MB
+        assert governor.batch_size('trips', default=400_000) == first // 2
+        assert governor.batch_size('trips', default=400_000, min_rows=150_000) == 150_000
+
+    def test_can_start_holds_stages_under_pressure(self):
+        """Test new stages wait for running ones when memory is tight, but never deadlock"""
+        rss = _Rss(900 * MB)
+        governor = memory.MemoryGovernor(budget=1000 * MB, rss=rss, calibration_path=None)
+        assert governor.can_start(0)
+        assert not governor.can_start(2)
+        rss.value = 100 * MB
+        assert governor.can_start(2)
+
+    def test_calibration_persisted(self, temp_dir):
+        """Test per-row costs survive to the next run"""
+        path = os.path.join(temp_dir, 'memory', 'calibration.json')
+        governor = memory.MemoryGovernor(budget=1000 * MB, calibration_path=path)
+        governor.record('df', pd.DataFrame({'a': [1.0, 2.0]}))
+        governor.record('quality', {'passed': True})
+        governor.save()
+
+        assert memory.MemoryGovernor(budget=1000 * MB, calibration_path=path).row_costs == {'df': 8.0}
+
+class TestGovernedLoading:
+    """Test cases for governor-sized loader batches"""
+
+    def test_governed_batches_cover_file(self, sample_raw_trip_data, temp_dir, monkeypatch):
+        """Test adaptive batching still yields every row once"""
+        monkeypatch.setattr(loader, 'MIN_BATCH_SIZE', 10)
+        path = os.path.join(temp_dir, 'yellow_tripdata_2025-01.parquet')
+        sample_raw_trip_data.to_parquet(path, index=False)
+        governor = memory.MemoryGovernor(budget=1000 * MB, rss=_Rss(0), calibration_path=None)
+
+        batches = list(loader.iter_trip_batches(path, batch_size=30, governor=governor))
+
+        assert sum(len(batch) for batch in batches) == len(sample_raw_trip_data)
+        assert 'trips' in governor.row_costs
+
+    def test_month_over_budget_fails_before_loading(self, sample_raw_trip_data, temp_dir, monkeypatch):
+        """Test trip_data refuses a month whose projected size exceeds the free budget"""
+        import pytest
+        path = os.path.join(temp_dir, 'yellow_tripdata_2025-01.parquet')
+        sample_raw_trip_data.to_parquet(path, index=False)
+        governor = memory.MemoryGovernor(budget=1 * MB, high_water=1.0, rss=_Rss(0), calibration_path=None)
+        governor.row_costs['trips'] = 20_000.0
+        monkeypatch.setattr(loader, 'get_governor', lambda: governor)
+
+        with pytest.raises(MemoryError, match='trips needs'):
+            loader.trip_data(path)
+
+        governor.row_costs['trips'] = 100.0
+        assert len(loader.trip_data(path)) == len(sample_raw_trip_data)
@@ -0,0 +1,112 @@
+import cProfile
+import os
+import threading
+import pytest
+import engine.profiling as profiling
+from engine.logger_config import log_execution_time, setup_logger
+
+logger = setup_logger('test_profiling')
+
+def _busy(n):
+    return sum(i * i for i in range(n))
+
+@log_execution_time
+def inner_stage(n):
+    return _busy(n)
+
+@log_execution_time
+def outer_stage(n):
+    return inner_stage(n) + _busy(n // 10)
+
+@log_execution_time
+def waiting_stage(barrier):
+    # Both stages are running once the barrier lets them through
+    barrier.wait(timeout=5)
+    return _busy(1_000)
+
+class TestProfileSession:
+    """Test cases for per-stage profiling through log_execution_time"""
+
+    def test_disabled_without_mode(self, temp_dir, monkeypatch):
+        """Test no session and no files without a profiling mode"""
+        monkeypatch.setattr(profiling, 'PROFILE', None)
+
+        assert profiling.start_profiling(None, profile_dir=temp_dir) is None
+        assert outer_stage(100) > 0
+        assert profiling.stop_profiling() is None
+        assert os.listdir(temp_dir) == []
+
+    def test_nested_stages_get_their_own_profiles(self, temp_dir):
+        """Test inner stages are attributed to themselves and files land in the run dir"""
+        session = profiling.start_profiling('cprofile', profile_dir=temp_dir)
+        try:
+            assert outer_stage(20_000) > 0
+            thread = threading.Thread(target=inner_stage, args=(1_000,))
+            thread.start()
+            thread.join()
+        finally:
+            summary = profiling.stop_profiling(top_n=5)
+
+        stats = session.stage_stats()
+        def busy_calls(stage):
+            return sum(entry[1] for (_, _, function), entry in stats[stage].stats.items() if function == '_busy')
+        # The outer profile is paused while inner_stage runs, on either thread
+        assert busy_calls('inner_stage') == 2
+        assert busy_calls('outer_stage') == 1
+        assert session.timings['inner_stage'][0] == 2
+        assert sorted(os.listdir(session.run_dir)) == ['inner_stage.prof', 'outer_stage.prof', 'summary.txt']
+        assert 'hotspots' in summary and 'inner_stage /' in summary
+
+    @pytest.mark.parametrize('single_profiler', [False, True])
+    def test_concurrent_stages(self, temp_dir, monkeypatch, single_profiler):
+        """Test two stages running at once both finish, with one profiler per process when required"""
+        monkeypatch.setattr(profiling, 'SINGLE_PROFILER', single_profiler)
+        barrier = threading.Barrier(2)
+        results, errors = [], []
+        def run():
+            try:
+                results.append(waiting_stage(barrier))
+            except Exception as e:
+                errors.append(e)
+
+        session = profiling.start_profiling('cprofile', profile_dir=temp_dir)
+        try:
+            threads = [threading.Thread(target=run) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            profiling.stop_profiling()
+
+        assert errors == [] and len(results) == 2
+        assert session.single_threaded == single_profiler
+        assert session.timings['waiting_stage'][0] == 2
+        assert len(session.profiles['waiting_stage']) == (1 if single_profiler else 2)
+
+    def test_failed_enable_resumes_outer_profile(self, temp_dir, monkeypatch):
+        """Test a profiler that cannot start leaves the stack as it was and the stage fails"""
+        class BusyProfile(cProfile.Profile):
+            def enable(self, *args, **kwargs):
+                if profiles and self not in profiles:
+                    raise ValueError("Another profiling tool is already active")
+                profiles.append(self)
+                return super().enable(*args, **kwargs)
+        profiles = []
+        monkeypatch.setattr(cProfile, 'Profile', BusyProfile)
+
+        session = profiling.start_profiling('cprofile', profile_dir=temp_dir)
+        try:
+            with pytest.raises(ValueError, match='already active'):
+                outer_stage(1_000)
+        finally:
+            profiling.stop_profiling()
+
+        assert session._stack() == []
+        assert list(session.profiles) == ['outer_stage']
+        assert session.timings['inner_stage'][0] == 1
+
+    def test_unknown_mode(self, temp_dir):
+        """Test unknown modes are rejected"""
+        with pytest.raises(ValueError):
+            profiling.start_profiling('perf', profile_dir=temp_dir)
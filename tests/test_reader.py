@@ -0,0 +1,72 @@
+import os
+import pandas as pd
+import engine.reader as reader
+
+class TestReadDimension:
+    """Test cases for reading dimensions with read_stored_table"""
+
+    def test_read_dimension_prefers_arrow_copy(self, sample_vendor_dim, temp_dir):
+        """Test Arrow IPC copies are read back as Arrow-backed frames"""
+        path = reader.write_dimension_arrow(sample_vendor_dim, 'vendor_dim', temp_dir)
+        result = reader.read_stored_table('vendor_dim', base_dir=temp_dir)
+
+        assert path.endswith('vendor_dim.arrow')
+        assert isinstance(result['vendor_id'].dtype, pd.ArrowDtype)
+        assert result['vendor_id'].tolist() == [1, 2]
+
+    def test_read_dimension_falls_back_to_parquet(self, sample_payment_dim, temp_dir):
+        """Test Parquet is used when no Arrow copy exists"""
+        path = reader.parquet_path('payment_dim', temp_dir)
+        os.makedirs(os.path.dirname(path))
+        sample_payment_dim.to_parquet(path, index=False)
+
+        result = reader.read_stored_table('payment_dim', base_dir=temp_dir, arrow_dtypes=False)
+
+        pd.testing.assert_frame_equal(result, sample_payment_dim)
+
+    def test_rewritten_arrow_file_is_reloaded(self, sample_vendor_dim, temp_dir):
+        """Test the memory-map cache notices a replaced file"""
+        reader.write_dimension_arrow(sample_vendor_dim, 'vendor_dim', temp_dir)
+        reader.read_stored_table('vendor_dim', base_dir=temp_dir)
+        updated = pd.DataFrame({'vendor_id': [1, 2, 7], 'vendor_name': ['A', 'B', 'Helix']})
+        reader.write_dimension_arrow(updated, 'vendor_dim', temp_dir)
+
+        assert len(reader.read_stored_table('vendor_dim', base_dir=temp_dir)) == 3
+
+class TestMaxValue:
+    """Test cases for max_value function"""
+
+    def test_max_value_from_statistics(self, sample_trip_fact, temp_dir):
+        """Test max key lookup on Parquet files with several row groups"""
+        path = os.path.join(temp_dir, 'trip_fact.parquet')
+        sample_trip_fact.to_parquet(path, index=False, row_group_size=1)
+
+        assert reader.max_value(path, 'trip_id') == 3
+
+class TestFeeView:
+    """Test cases for fee_view and mixed fee representations"""
+
+    def test_fee_views(self, temp_dir):
+        """Test cents are read back as cents, dollars and exact decimals"""
+        from decimal import Decimal
+        path = os.path.join(temp_dir, 'trip_fact.parquet')
+        pd.DataFrame({'trip_id': [1, 2], 'fare_amount': pd.array([1234, None], dtype='Int32')}).to_parquet(path)
+
+        assert reader.read_table(path, fees='cents', arrow_dtypes=False)['fare_amount'].tolist()[0] == 1234
+        assert reader.read_table(path, fees='float', arrow_dtypes=False)['fare_amount'].tolist()[0] == 12.34
+        assert reader.read_table(path, fees='decimal', arrow_dtypes=False)['fare_amount'].tolist() == [Decimal('12.34'), None]
+
+    def test_mixed_months_are_read_as_dollars(self, temp_dir):
+        """Test partitions stored as float and as cents concatenate as float dollars"""
+        from engine.storer import replace_partition
+        replace_partition(2025, 1, 'yellow_tripdata_2025-01.parquet',
+                          {'trip_fact': pd.DataFrame({'trip_id': [1], 'fare_amount': [10.5]})}, temp_dir)
+        replace_partition(2025, 2, 'yellow_tripdata_2025-02.parquet',
+                          {'trip_fact': pd.DataFrame({'trip_id': [2], 'fare_amount': pd.Series([725], dtype='int32')})},
+                          temp_dir)
+
+        result = reader.read_stored_table('trip_fact', base_dir=temp_dir, arrow_dtypes=False)
+        cents = reader.read_stored_table('trip_fact', base_dir=temp_dir, fees='cents', arrow_dtypes=False)
+
+        assert result['fare_amount'].tolist() == [10.5, 7.25]
+        assert cents['fare_amount'].tolist() == [1050, 725]
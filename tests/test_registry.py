@@ -0,0 +1,99 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import engine.registry as registry
+
+MONTHS = [f'yellow_tripdata_2025-{month:02d}.parquet' for month in range(1, 13)]
+
+@pytest.fixture
+def registry_db(temp_dir, monkeypatch):
+    path = os.path.join(temp_dir, 'registry.sqlite3')
+    monkeypatch.setattr(registry, 'REGISTRY_DB', path)
+    monkeypatch.setattr(registry, 'LEGACY_REGISTER', os.path.join(temp_dir, 'stored_files.json'))
+    return path
+
+def _claim_all(path, worker):
+    registry.REGISTRY_DB = path
+    registry.LEGACY_REGISTER = os.path.join(os.path.dirname(path), 'stored_files.json')
+    return [fname for fname in MONTHS if registry.claim_file(fname, worker=worker)]
+
+class TestLegacyImport:
+    """Test cases for importing stored_files.json"""
+
+    def test_json_registries_are_imported(self, registry_db, temp_dir):
+        """Test both the list and the versioned JSON formats end up as stored rows"""
+        legacy_path = os.path.join(temp_dir, 'stored_files.json')
+        with open(legacy_path, 'w') as f:
+            json.dump({MONTHS[0]: {'etag': '"a"', 'sha256': 'ff'}}, f)
+
+        stored = registry.stored_files()
+
+        assert stored[MONTHS[0]]['etag'] == '"a"'
+        assert stored[MONTHS[0]]['status'] == 'stored'
+        assert not os.path.exists(legacy_path)
+        assert os.path.exists(legacy_path + '.migrated')
+
+class TestClaims:
+    """Test cases for claim/commit semantics"""
+
+    def test_claim_is_exclusive(self, registry_db):
+        """Test a running claim keeps other workers out until it is committed or failed"""
+        assert registry.claim_file(MONTHS[0], worker='a')
+        assert not registry.claim_file(MONTHS[0], worker='b')
+        # The holder may re-claim (retry inside the same worker)
+        assert registry.claim_file(MONTHS[0], worker='a')
+
+        registry.fail_file(MONTHS[0], RuntimeError('download failed'))
+        row = registry.get_file(MONTHS[0])
+        assert row['status'] == 'failed'
+        assert row['error'] == 'download failed'
+        assert registry.claim_file(MONTHS[0], worker='b')
+
+    def test_abandoned_claim_expires(self, registry_db):
+        """Test claims of crashed workers can be taken over after the timeout"""
+        assert registry.claim_file(MONTHS[0], worker='crashed')
+        assert registry.claim_file(MONTHS[0], worker='b', claim_timeout=0)
+
+    def test_commit_records_version_and_counts(self, registry_db):
+        """Test committing stores the version, row counts and timing"""
+        registry.claim_file(MONTHS[0], worker='a')
+        registry.commit_file(MONTHS[0], rows_loaded=100, rows_stored=90, etag='"e"', sha256='ab')
+
+        row = registry.stored_files()[MONTHS[0]]
+        assert (row['rows_loaded'], row['rows_stored'], row['etag'], row['sha256']) == (100, 90, '"e"', 'ab')
+        assert row['claimed_by'] is None
+        assert row['duration_sec'] is not None
+
+    def test_parallel_workers_split_months(self, registry_db):
+        """Test worker processes racing over the same month list never claim a month twice"""
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            claimed = list(pool.map(_claim_all, [registry_db] * 4, ['w1', 'w2', 'w3', 'w4']))
+
+        all_claims = [fname for claims in claimed for fname in claims]
+        assert sorted(all_claims) == sorted(MONTHS)
+
+    def test_month_stored_since_it_was_seen_is_refused(self, registry_db):
+        """Test a worker that saw an older registry state cannot claim a month stored since"""
+        assert registry.claim_file(MONTHS[0], worker='a')
+        registry.commit_file(MONTHS[0], etag='"new"', sha256='ab')
+
+        # Worker b listed the month as new before a committed it
+        assert not registry.claim_file(MONTHS[0], worker='b', seen=None)
+        assert not registry.claim_file(MONTHS[0], worker='b', seen={'etag': '"old"'})
+        current = registry.stored_files()[MONTHS[0]]
+        assert registry.claim_file(MONTHS[0], worker='b', seen=current)
+        assert registry.get_file(MONTHS[0])['status'] == 'stored'
+
+    def test_failed_republish_keeps_stored_status(self, registry_db):
+        """Test a failed reprocessing records its error without un-storing the month"""
+        registry.claim_file(MONTHS[0], worker='a')
+        registry.commit_file(MONTHS[0], rows_stored=90, etag='"e"')
+        registry.claim_file(MONTHS[0], worker='a', seen=registry.stored_files()[MONTHS[0]])
+
+        registry.fail_file(MONTHS[0], RuntimeError('partial run (parquet), not stored in full'))
+
+        row = registry.get_file(MONTHS[0])
+        assert (row['status'], row['rows_stored'], row['claimed_by']) == ('stored', 90, None)
+        assert row['error'].startswith('partial run')
+        assert MONTHS[0] in registry.stored_files()
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pandas as pd
+import engine.rejects as rejects
+
+class TestStoreRejects:
+    """Test cases for the rejected rows quarantine table"""
+
+    JANUARY = 'yellow_tripdata_2025-01.parquet'
+    FEBRUARY = 'yellow_tripdata_2025-02.parquet'
+
+    def _collector(self, fares, reasons):
+        collector = rejects.RejectCollector()
+        collector.add(pd.DataFrame({'fare_amount': fares}), reasons)
+        return collector
+
+    def test_one_file_per_month(self, temp_dir):
+        """Test each month is written once to its partition and read back with its reasons"""
+        bits = rejects.REJECT_REASONS
+        rejects.store_rejects(self._collector([-1.0, 5.0], [bits['negative_fee'], bits['duplicate']]),
+                              self.JANUARY, temp_dir)
+        counts = rejects.store_rejects(self._collector([7.0], [bits['short_trip'] | bits['implausible_speed']]),
+                                       self.FEBRUARY, temp_dir)
+
+        assert counts['short_trip'] == 1 and counts['implausible_speed'] == 1
+        assert rejects.rejects_path(self.FEBRUARY, temp_dir).endswith(
+            'rejected_trips/year=2025/month=02/yellow_tripdata_2025-02.parquet'.replace('/', os.sep))
+        stored = rejects.read_rejects(temp_dir)
+        assert len(stored) == 3
+        january = rejects.read_rejects(temp_dir, periods=[(2025, 1)])
+        assert january['fare_amount'].tolist() == [-1.0, 5.0]
+        speed = rejects.read_rejects(temp_dir, reasons=['implausible_speed'])
+        assert speed['source'].tolist() == [self.FEBRUARY]
+        assert rejects.reason_names(speed['reject_reason'].iloc[0]) == ['short_trip', 'implausible_speed']
+
+    def test_republished_month_replaces_its_rows(self, temp_dir):
+        """Test storing a month again overwrites its rejected rows"""
+        rejects.store_rejects(self._collector([-1.0, -2.0], [1, 1]), self.JANUARY, temp_dir)
+        rejects.store_rejects(self._collector([], []), self.JANUARY, temp_dir)
+
+        stored = rejects.read_rejects(temp_dir)
+        assert len(stored) == 0
+        assert stored['reject_reason'].dtype == np.uint8
+
+    def test_cached_month_keeps_its_rows(self, temp_dir):
+        """Test a collector no cleaner ran for does not overwrite the stored rows"""
+        rejects.store_rejects(self._collector([-1.0, -2.0], [1, 1]), self.JANUARY, temp_dir)
+        assert rejects.store_rejects(rejects.RejectCollector(), self.JANUARY, temp_dir) is None
+
+        assert rejects.read_rejects(temp_dir)['fare_amount'].tolist() == [-1.0, -2.0]
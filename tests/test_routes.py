@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import engine.routes as routes
+
+@pytest.fixture
+def month():
+    """Three trips over two zone pairs with their datetime and distance dimensions"""
+    trip_fact = pd.DataFrame({
+        'trip_id': [1, 2, 3],
+        'datetime_key': [11, 12, 13],
+        'distance_key': [2, 1, 2],
+        'pickup_location_key': [161, 161, 1],
+        'dropoff_location_key': [237, 237, 265],
+        'fare_amount': [10.0, 14.0, 70.0],
+        'total_amount': [15.0, 20.0, 90.0]
+    })
+    pickups = pd.to_datetime(['2025-01-01 10:00', '2025-01-01 11:00', '2025-01-01 12:00'])
+    datetime_dim = pd.DataFrame({'datetime_key': [13, 11, 12], 'pickup_datetime': pickups[[2, 0, 1]],
+                                 'dropoff_datetime': (pickups + pd.to_timedelta([600, 1200, 3600], unit='s'))[[2, 0, 1]]})
+    distance_dim = pd.DataFrame({'distance_key': [1, 2], 'trip_distance': [3.0, 2.0]})
+    return trip_fact, datetime_dim, distance_dim
+
+class TestZonePairMatrix:
+    """Test cases for zone_pair_matrix and pair lookups"""
+
+    def test_pair_sums_and_averages(self, month):
+        """Test trips, duration, distance and fares are summed per pair"""
+        matrix = routes.zone_pair_matrix(*month)
+        pair = matrix.pair(161, 237)
+
+        assert pair['trips'] == 2
+        assert pair['duration_sec'] == 1800
+        assert pair['trip_distance'] == 5.0
+        assert pair['fare_amount'] == 24.0
+        assert pair['avg_duration_sec'] == 900
+        assert pair['avg_mph'] == pytest.approx(10.0)
+        assert matrix.pair(1, 265)['total_amount'] == 90.0
+        assert matrix.pair(2, 2)['avg_fare'] is None
+
+    def test_unknown_zones_are_left_out(self, month):
+        """Test trips without a location key are not counted"""
+        trip_fact, datetime_dim, distance_dim = month
+        trip_fact['dropoff_location_key'] = [237, np.nan, 265]
+
+        matrix = routes.zone_pair_matrix(trip_fact, datetime_dim, distance_dim)
+
+        assert matrix.measure('trips').sum() == 2
+
+    def test_to_frame_lists_non_empty_pairs(self, month):
+        """Test the long format has one row per used pair"""
+        frame = routes.zone_pair_matrix(*month).top_routes(5)
+
+        assert list(frame[['pickup_location_key', 'dropoff_location_key']].itertuples(index=False, name=None)) == \
+            [(161, 237), (1, 265)]
+        assert frame['fare_per_mile'].iloc[0] == pytest.approx(24.0 / 5.0)
+
+class TestUpdateZonePairs:
+    """Test cases for the incremental running total"""
+
+    def test_months_add_up_and_republish_replaces(self, month, temp_dir):
+        """Test months are folded into the total and a republished month replaces its share"""
+        trip_fact, datetime_dim, distance_dim = month
+        routes.update_zone_pairs(*month, source='yellow_tripdata_2025-01.parquet', base_dir=temp_dir)
+        routes.update_zone_pairs(*month, source='yellow_tripdata_2025-02.parquet', base_dir=temp_dir)
+        assert routes.load_zone_pairs(temp_dir).pair(161, 237)['trips'] == 4
+
+        routes.update_zone_pairs(trip_fact.head(1), datetime_dim, distance_dim,
+                                 source='yellow_tripdata_2025-01.parquet', base_dir=temp_dir)
+
+        assert routes.load_zone_pairs(temp_dir).pair(161, 237)['trips'] == 3
+        assert routes.load_zone_pairs(temp_dir).pair(1, 265)['trips'] == 1
+        assert routes.load_zone_pairs(temp_dir, periods=[(2025, 1)]).pair(161, 237)['trips'] == 1
+        np.testing.assert_array_equal(routes.rebuild_zone_pairs(temp_dir).values,
+                                      routes.load_zone_pairs(temp_dir).values)
+
+    def test_crash_between_month_and_total(self, month, temp_dir):
+        """Test a month saved without its total is not applied twice when the month is stored again"""
+        trip_fact, datetime_dim, distance_dim = month
+        january = 'yellow_tripdata_2025-01.parquet'
+        routes.update_zone_pairs(*month, source=january, base_dir=temp_dir)
+        # The run republishing January stops after saving the month matrix
+        republished = routes.zone_pair_matrix(trip_fact.head(1), datetime_dim, distance_dim)
+        total_saved = os.stat(routes._total_path(temp_dir)).st_mtime_ns
+        routes._save(routes._month_path(january, temp_dir), republished.values)
+        os.utime(routes._month_path(january, temp_dir), ns=(total_saved + 1, total_saved + 1))
+
+        assert routes.load_zone_pairs(temp_dir).pair(161, 237)['trips'] == 1
+        routes.update_zone_pairs(trip_fact.head(1), datetime_dim, distance_dim, source=january, base_dir=temp_dir)
+
+        assert routes.load_zone_pairs(temp_dir).pair(161, 237)['trips'] == 1
+        assert routes.load_zone_pairs(temp_dir).pair(1, 265)['trips'] == 0
@@ -0,0 +1,137 @@
+import json
+import threading
+import pandas as pd
+import pytest
+import engine.runner as runner
+from engine.config import load_config
+
+def _functions(calls=None):
+    calls = calls if calls is not None else []
+
+    def record(name, fn):
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    return {
+        'load': record('load', lambda url: pd.DataFrame({'x': [1, 2, 3]})),
+        'double': record('double', lambda df: df.assign(x=df['x'] * 2)),
+        'total': record('total', lambda df: int(df['x'].sum())),
+        'store': record('store', lambda df, total, suffix='': f"{len(df)}:{total}{suffix}")
+    }
+
+STAGES = [
+    {'name': 'raw', 'fn': 'load', 'inputs': ['url']},
+    {'name': 'df', 'fn': 'double', 'inputs': ['raw'], 'cache': True},
+    {'name': 'total', 'fn': 'total', 'inputs': ['df']},
+    {'name': 'stored', 'fn': 'store', 'inputs': ['df', 'total'], 'kwargs': {'suffix': '$suffix'}}
+]
+
+class TestValidateStages:
+    """Test cases for validate_stages function"""
+
+    def test_unknown_reference_rejected(self):
+        """Test a stage reading an undefined output is rejected"""
+        with pytest.raises(ValueError, match="unknown stage"):
+            runner.validate_stages([{'name': 'a', 'fn': 'f', 'inputs': ['missing']}])
+
+    def test_cycle_rejected(self):
+        """Test cyclic graphs are rejected"""
+        stages = [{'name': 'a', 'fn': 'f', 'inputs': ['b']},
+                  {'name': 'b', 'fn': 'f', 'kwargs': {'other': '@a'}}]
+        with pytest.raises(ValueError, match="cycle"):
+            runner.validate_stages(stages)
+
+    def test_seeds_are_not_stages(self):
+        """Test seed values such as the url can be used as inputs"""
+        by_name = runner.validate_stages(STAGES, seeds={'url'})
+        assert list(by_name) == ['raw', 'df', 'total', 'stored']
+
+    def test_shipped_config_is_valid(self):
+        """Test pipeline.json describes a valid graph"""
+        config = load_config()
+        runner.validate_stages(config['stages'], seeds={'url', 'fname'})
+
+class TestRunStages:
+    """Test cases for run_stages function"""
+
+    def test_runs_graph_and_resolves_arguments(self):
+        """Test outputs flow between stages and $variables are resolved"""
+        result = runner.run_stages(STAGES, _functions().get, seeds={'url': 'u'}, variables={'suffix': '!'})
+        assert result['outputs']['stored'] == '3:12!'
+        assert set(result['timings']) == {'raw', 'df', 'total', 'stored'}
+
+    def test_intermediate_outputs_released(self):
+        """Test frames nobody reads any more are not kept"""
+        result = runner.run_stages(STAGES, _functions().get, seeds={'url': 'u'}, variables={'suffix': ''})
+        assert 'raw' not in result['outputs']
+        assert 'df' not in result['outputs']
+
+    def test_independent_stages_run_concurrently(self):
+        """Test stages without dependencies between them overlap"""
+        barrier = threading.Barrier(2, timeout=5)
+        stages = [{'name': 'a', 'fn': 'wait'}, {'name': 'b', 'fn': 'wait'}]
+        result = runner.run_stages(stages, {'wait': barrier.wait}.get, max_workers=2)
+        assert set(result['plan']) == {'a', 'b'}
+
+    def test_after_orders_stages(self):
+        """Test after makes a stage wait without passing data"""
+        calls = []
+        stages = [{'name': 'first', 'fn': 'first'}, {'name': 'second', 'fn': 'second', 'after': ['first']}]
+        functions = {'first': lambda: calls.append('first'), 'second': lambda: calls.append('second')}
+        runner.run_stages(stages, functions.get, max_workers=4)
+        assert calls == ['first', 'second']
+
+    def test_skip_cascades_to_dependents(self):
+        """Test skipping a stage also skips what reads its output"""
+        calls = []
+        result = runner.run_stages(STAGES, _functions(calls).get, seeds={'url': 'u'}, variables={'suffix': ''},
+                                   skip=['total'])
+        assert 'total' not in calls and 'store' not in calls
+        assert 'stored' not in result['plan']
+
+    def test_failure_propagates(self):
+        """Test a failing stage stops the run with its exception"""
+        def boom(url):
+            raise RuntimeError("download failed")
+        functions = {**_functions(), 'load': boom}
+        with pytest.raises(RuntimeError, match="download failed"):
+            runner.run_stages(STAGES, functions.get, seeds={'url': 'u'}, variables={'suffix': ''})
+
+class TestStageCache:
+    """Test cases for partial reruns from the stage cache"""
+
+    def test_only_reuses_cached_output(self, tmp_path):
+        """Test --only runs the target and loads cached inputs instead of recomputing them"""
+        cache_dir = str(tmp_path)
+        runner.run_stages(STAGES, _functions().get, seeds={'url': 'u'}, variables={'suffix': ''},
+                          cache_dir=cache_dir, run_key='2025-01')
+        assert (tmp_path / '2025-01' / 'df.parquet').exists()
+
+        calls = []
+        result = runner.run_stages(STAGES, _functions(calls).get, seeds={'url': 'u'}, variables={'suffix': ''},
+                                   only=['stored'], cache_dir=cache_dir, run_key='2025-01')
+        assert result['plan'] == {'stored': 'run', 'df': 'load', 'total': 'run'}
+        assert calls == ['total', 'store']
+        assert result['outputs']['stored'] == '3:12'
+
+    def test_clear_cache(self, tmp_path):
+        """Test clear_cache removes one run's cached outputs"""
+        runner.run_stages(STAGES, _functions().get, seeds={'url': 'u'}, variables={'suffix': ''},
+                          cache_dir=str(tmp_path), run_key='2025-01')
+        runner.clear_cache(str(tmp_path), '2025-01')
+        assert not (tmp_path / '2025-01').exists()
+
+class TestLoadConfig:
+    """Test cases for load_config function"""
+
+    def test_defaults_and_env_override(self, tmp_path, monkeypatch):
+        """Test missing keys fall back to defaults and PIPELINE_STRICT_QUALITY wins"""
+        path = tmp_path / 'pipeline.json'
+        path.write_text(json.dumps({'max_workers': 2, 'stages': []}))
+        monkeypatch.setenv('PIPELINE_STRICT_QUALITY', '1')
+        config = load_config(str(path))
+        assert config['max_workers'] == 2
+        assert config['base_dir'] == 'data'
+        assert config['strict_quality'] is True
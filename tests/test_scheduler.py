@@ -0,0 +1,64 @@
+import json
+import threading
+import urllib.request
+import engine.scheduler as scheduler
+
+class TestNextDelay:
+    """Test cases for next_delay function"""
+
+    def test_backoff_doubles_and_caps(self):
+        """Test the poll interval doubles per failure up to the cap"""
+        assert scheduler.next_delay(0, interval=60, max_backoff=600) == 60
+        assert scheduler.next_delay(1, interval=60, max_backoff=600) == 120
+        assert scheduler.next_delay(2, interval=60, max_backoff=600) == 240
+        assert scheduler.next_delay(5, interval=60, max_backoff=600) == 600
+
+class TestRunScheduler:
+    """Test cases for run_scheduler function"""
+
+    def test_cycles_run_and_failures_are_counted(self):
+        """Test the loop keeps running through failures and records status"""
+        results = iter([RuntimeError("CloudFront down"), "No new trip data files found."])
+
+        def run_cycle():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        status = scheduler.run_scheduler(run_cycle, interval=0, max_backoff=0, health_port=None, max_cycles=2)
+
+        assert status['cycles'] == 2
+        assert status['consecutive_failures'] == 0
+        assert status['last_result'] == "No new trip data files found."
+        assert status['state'] == 'stopped'
+
+    def test_stop_event_ends_loop(self):
+        """Test setting the stop event ends the daemon after the current cycle"""
+        stop_event = threading.Event()
+        status = scheduler.run_scheduler(stop_event.set, interval=3600, health_port=None, stop_event=stop_event)
+
+        assert status['cycles'] == 1
+
+class TestHealthServer:
+    """Test cases for the health endpoint"""
+
+    def test_health_and_status_endpoints(self):
+        """Test /health reflects consecutive failures and /status returns the snapshot"""
+        status = scheduler.SchedulerStatus()
+        server = scheduler.start_health_server(status, port=0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            with urllib.request.urlopen(f"{base}/health") as resp:
+                assert json.load(resp) == {'status': 'ok'}
+            status.update(consecutive_failures=scheduler.UNHEALTHY_AFTER)
+            try:
+                urllib.request.urlopen(f"{base}/health")
+                assert False, "expected HTTP 503"
+            except urllib.error.HTTPError as e:
+                assert e.code == 503
+            with urllib.request.urlopen(f"{base}/status") as resp:
+                assert json.load(resp)['consecutive_failures'] == scheduler.UNHEALTHY_AFTER
+        finally:
+            server.shutdown()
+            server.server_close()
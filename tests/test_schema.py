@@ -0,0 +1,109 @@
+import logging
+import pandas as pd
+import pytest
+import engine.schema as schema
+
+class TestFleetFromSource:
+    """Test cases for fleet_from_source function"""
+
+    def test_fleet_from_source_names_and_urls(self):
+        """Test fleet inference from file names and URLs"""
+        assert schema.fleet_from_source('yellow_tripdata_2025-01.parquet') == 'yellow'
+        assert schema.fleet_from_source('https://host/trip-data/fhv_tripdata_2025-01.parquet') == 'fhv'
+        assert schema.fleet_from_source('fhvhv_tripdata_2025-01.parquet') == 'fhvhv'
+
+    def test_fleet_from_source_unknown(self):
+        """Test unknown file names are rejected"""
+        with pytest.raises(ValueError):
+            schema.fleet_from_source('taxi_zone_lookup.csv')
+
+class TestConformToSchema:
+    """Test cases for conform_to_schema function"""
+
+    def test_conform_yellow(self, sample_raw_trip_data):
+        """Test yellow raw columns are mapped to the common schema"""
+        result = schema.conform_to_schema(sample_raw_trip_data, 'yellow')
+
+        assert list(result.columns) == schema.COMMON_COLUMNS + ['fleet']
+        assert len(result) == len(sample_raw_trip_data)
+        assert (result['airport_fee'] == sample_raw_trip_data['Airport_fee']).all()
+        assert (result['fleet'] == 'yellow').all()
+
+    def test_conform_fhvhv(self):
+        """Test HVFHV license codes, fees and missing columns are mapped"""
+        raw = pd.DataFrame({
+            'hvfhs_license_num': ['HV0003', 'HV0005'],
+            'pickup_datetime': pd.to_datetime(['2025-01-01 10:00', '2025-01-01 11:00']),
+            'dropoff_datetime': pd.to_datetime(['2025-01-01 10:20', '2025-01-01 11:30']),
+            'PULocationID': [161, 239],
+            'DOLocationID': [239, None],
+            'trip_miles': [2.5, 4.0],
+            'base_passenger_fare': [12.0, 20.0],
+            'tolls': [0.0, 6.94],
+            'bcf': [0.3, 0.5],
+            'sales_tax': [1.0, 1.8],
+            'congestion_surcharge': [2.75, 2.75],
+            'airport_fee': [0.0, 0.0],
+            'tips': [2.0, 0.0],
+            'cbd_congestion_fee': [1.5, 0.0]
+        })
+        result = schema.conform_to_schema(raw, 'fhvhv')
+
+        assert list(result['vendor_id']) == [103, 105]
+        assert list(result['dropoff_location_id']) == [239, schema.UNKNOWN_LOCATION_ID]
+        assert result['total_amount'].iloc[0] == pytest.approx(12.0 + 0.3 + 1.0 + 2.75 + 2.0 + 1.5)
+        assert (result['payment_id'] == 5).all()
+        for column, dtype in schema.COMMON_DTYPES.items():
+            assert str(result[column].dtype) == dtype
+
+    def test_get_fleets_env_override(self, monkeypatch):
+        """Test TLC_FLEETS selects fleets and rejects unknown ones"""
+        monkeypatch.setenv('TLC_FLEETS', 'yellow, fhvhv')
+        assert schema.get_fleets() == ['yellow', 'fhvhv']
+        monkeypatch.setenv('TLC_FLEETS', 'purple')
+        with pytest.raises(ValueError):
+            schema.get_fleets()
+
+class TestFeeCents:
+    """Test cases for the int32 cents fee representation"""
+
+    def test_conform_with_fee_cents(self, sample_raw_trip_data):
+        """Test fees become exact int32 cents and convert back to the same dollars"""
+        raw = sample_raw_trip_data.round(2)
+        dollars = schema.conform_to_schema(raw, 'yellow')
+        cents = schema.conform_to_schema(raw, 'yellow', fee_cents=True)
+
+        for column in schema.FEE_COLUMNS:
+            assert str(cents[column].dtype) in ('int32', 'Int32')
+            assert list(schema.to_dollars(cents[column])) == list(dollars[column])
+        assert cents.memory_usage(index=False)[schema.FEE_COLUMNS].sum() < \
+            dollars.memory_usage(index=False)[schema.FEE_COLUMNS].sum()
+
+    def test_missing_values_stay_missing(self):
+        """Test nulls become a nullable Int32 column"""
+        result = schema.to_cents(pd.Series([2.75, None, 0.1 + 0.2], name='extra'))
+
+        assert str(result.dtype) == 'Int32'
+        assert result.isna().tolist() == [False, True, False]
+        assert result[0] == 275 and result[2] == 30
+
+    def test_sub_cent_values_are_rounded(self, caplog):
+        """Test sub-cent amounts are rounded to the nearest cent and counted in a warning"""
+        with caplog.at_level(logging.WARNING, logger='schema'):
+            result = schema.to_cents(pd.Series([1.004, 2.50, 0.126], name='fare_amount'))
+
+        assert result.tolist() == [100, 250, 13]
+        assert "fare_amount: 2 values with fractions of a cent" in caplog.text
+
+    def test_overflow_is_rejected(self):
+        """Test amounts beyond int32 cents raise"""
+        with pytest.raises(ValueError, match='int32'):
+            schema.to_cents(pd.Series([30_000_000.0], name='fare_amount'))
+
+    def test_fees_like_follows_reference(self):
+        """Test appended rows are converted to the stored file's representation"""
+        stored = pd.DataFrame({'fare_amount': pd.Series([1050], dtype='int32')})
+        new = pd.DataFrame({'fare_amount': [12.5]})
+
+        assert schema.fees_like(new, stored)['fare_amount'].tolist() == [1250]
+        assert schema.fees_like(stored, new)['fare_amount'].tolist() == [10.5]
@@ -0,0 +1,72 @@
+import os
+import pickle
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import engine.shared as shared
+
+def _worker_total(handle):
+    with handle.attached(columns=['fare_amount']) as df:
+        return float(df['fare_amount'].sum()), handle.references()
+
+class TestPublish:
+    """Test cases for publish and SharedFrame.attach"""
+
+    def test_attach_is_zero_copy(self, sample_trip_data, temp_dir):
+        """Test attached columns are Arrow-backed views of the mapped file"""
+        handle = shared.publish(sample_trip_data, name='2025-01', scratch_dir=temp_dir)
+        df = handle.attach()
+
+        assert isinstance(df['fare_amount'].dtype, pd.ArrowDtype)
+        assert df['fare_amount'].tolist() == sample_trip_data['fare_amount'].tolist()
+        assert handle.references() == 1
+        handle.release()
+
+    def test_numpy_attach_round_trips(self, sample_trip_data, temp_dir):
+        """Test arrow_dtypes=False gives back the original frame"""
+        handle = shared.publish(sample_trip_data, scratch_dir=temp_dir)
+        with handle.attached(arrow_dtypes=False) as df:
+            pd.testing.assert_frame_equal(df, sample_trip_data.reset_index(drop=True))
+
+    def test_pickled_handle_carries_no_reference(self, sample_trip_data, temp_dir):
+        """Test only the name and directory travel to workers"""
+        handle = shared.publish(sample_trip_data, scratch_dir=temp_dir)
+        copy = pickle.loads(pickle.dumps(handle))
+
+        assert copy.name == handle.name
+        copy.release()
+        assert handle.references() == 1
+        handle.release()
+
+class TestReferenceCounting:
+    """Test cases for cross-process reference counting"""
+
+    def test_workers_share_one_copy(self, sample_trip_data, temp_dir):
+        """Test worker processes attach the published file and the last release removes it"""
+        handle = shared.publish(sample_trip_data, scratch_dir=temp_dir)
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(_worker_total, [handle, handle]))
+
+        for total, references in results:
+            assert abs(total - sample_trip_data['fare_amount'].sum()) < 1e-6
+            # The publisher's reference plus the worker's own
+            assert references >= 2
+        assert os.path.exists(handle.path)
+
+        handle.release()
+        assert not os.path.exists(handle.path)
+        assert not os.path.exists(handle.refs_dir)
+
+    def test_sweep_drops_dead_processes(self, sample_trip_data, temp_dir):
+        """Test references left by crashed workers do not keep the frame alive"""
+        handle = shared.publish(sample_trip_data, scratch_dir=temp_dir)
+        handle.release()
+        handle = shared.publish(sample_trip_data, name='orphan', scratch_dir=temp_dir)
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        os.rename(os.path.join(handle.refs_dir, handle._token),
+                  os.path.join(handle.refs_dir, f'{dead.pid}-crashed'))
+
+        assert shared.sweep_scratch(temp_dir) == ['orphan']
+        assert not os.path.exists(handle.path)
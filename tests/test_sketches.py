@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+import engine.sketches as sketches
+
+@pytest.fixture
+def trips():
+    """Cleaned trips of two months whose zone pairs partly overlap"""
+    rng = np.random.default_rng(7)
+    def month(n, first_zone):
+        return pd.DataFrame({
+            'pickup_location_id': rng.integers(first_zone, first_zone + 100, n),
+            'dropoff_location_id': rng.integers(1, 101, n),
+            'fare_amount': rng.integers(250, 9000, n) / 100,
+            'trip_distance': rng.lognormal(0.8, 0.7, n).round(2),
+            'duration_sec': rng.integers(121, 10799, n).astype('int32')
+        })
+    return month(20000, 1), month(30000, 51)
+
+class TestHyperLogLog:
+    """Test cases for the distinct counter"""
+
+    def test_count_within_error(self, trips):
+        """Test estimates stay within a few standard errors and merging is a union"""
+        january, february = trips
+        both = pd.concat([january, february])
+        columns = sketches.DISTINCT_KEYS['zone_pairs']
+        exact = len(both[list(columns)].drop_duplicates())
+
+        merged = (sketches.HyperLogLog().add_hashes(sketches.hash_rows(january, columns))
+                  | sketches.HyperLogLog().add_hashes(sketches.hash_rows(february, columns)))
+        direct = sketches.HyperLogLog().add_hashes(sketches.hash_rows(both, columns))
+
+        assert abs(merged.count() - exact) / exact < 0.03
+        assert np.array_equal(merged.registers, direct.registers)
+
+    def test_small_counts(self):
+        """Test linear counting answers small cardinalities"""
+        hll = sketches.HyperLogLog().add_hashes(sketches.hash_rows(pd.DataFrame({'a': [1, 2, 3, 3, 2]}), ['a']))
+        assert hll.count() == 3
+
+class TestQuantileSketch:
+    """Test cases for the mergeable quantile sketch"""
+
+    def test_relative_accuracy(self, trips):
+        """Test percentiles are within the configured relative error of the exact ones"""
+        values = pd.concat(trips)['trip_distance'].to_numpy()
+        sketch = sketches.QuantileSketch().add(values)
+
+        for q in (0.5, 0.95, 0.99):
+            assert sketch.quantile(q) == pytest.approx(np.quantile(values, q), rel=2 * sketches.RELATIVE_ACCURACY)
+        assert sketch.quantile([0, 1]) == [values.min(), values.max()]
+
+    def test_merge_equals_single_pass(self, trips):
+        """Test merging month sketches gives the sketch of all values"""
+        january, february = trips
+        merged = sketches.QuantileSketch().add(january['fare_amount']) + sketches.QuantileSketch().add(february['fare_amount'])
+        direct = sketches.QuantileSketch().add(pd.concat(trips)['fare_amount'])
+
+        assert np.array_equal(merged.counts, direct.counts)
+        assert merged.quantile(0.5) == direct.quantile(0.5)
+
+    def test_zero_negative_and_empty(self):
+        """Test zeros and negative values keep their order, empty sketches answer None"""
+        sketch = sketches.QuantileSketch().add([-5.0, 0.0, 0.0, 3.0, np.nan])
+
+        assert sketch.count() == 4
+        assert sketch.quantile([0, 0.5]) == [-5.0, 0.0]
+        assert sketches.QuantileSketch().quantile(0.5) is None
+
+class TestMonthSketches:
+    """Test cases for persisting sketches per month and merging ranges"""
+
+    def test_months_merge_on_load(self, trips, temp_dir):
+        """Test ranges are answered from the month files only"""
+        january, february = trips
+        sketches.update_sketches(january, 'yellow_tripdata_2025-01.parquet', temp_dir)
+        sketches.update_sketches(february, 'yellow_tripdata_2025-02.parquet', temp_dir)
+
+        january_only = sketches.load_sketches(temp_dir, periods=[(2025, 1)])
+        both = sketches.load_sketches(temp_dir)
+
+        assert january_only.quantiles['fare_amount'].count() == len(january)
+        assert both.quantiles['duration_sec'].count() == len(january) + len(february)
+        assert abs(both.count_distinct('pickup_zones') - 150) <= 2
+        assert set(both.summary()['quantiles']['trip_distance']) == {'p50', 'p95', 'p99'}
+
+    def test_fees_in_cents_are_sketched_as_dollars(self, trips):
+        """Test int32 cents and float dollars give the same fee sketch"""
+        from engine.schema import to_cents
+        january = trips[0]
+        dollars = sketches.sketch_trips(january)
+        cents = sketches.sketch_trips(january.assign(fare_amount=to_cents(january['fare_amount'])))
+
+        assert np.array_equal(dollars.quantiles['fare_amount'].counts, cents.quantiles['fare_amount'].counts)
@@ -1,6 +1,9 @@
+import pandas as pd
 import engine.storer as storer
 from pathlib import Path
 
+FEBRUARY_PICKUPS = pd.to_datetime(['2025-02-01 10:00:00', '2025-02-01 11:00:00'])
+
 class TestStoreToParquet:
     """Test cases for store_to_parquet function"""
     
@@ -43,4 +46,274 @@ class TestStoreToCsv:
 
         # Check if CSV files were created
         csv_dir = Path(temp_dir) / 'csv'
-        assert csv_dir.exists()
\ No newline at end of file
+        assert csv_dir.exists()
+
+class TestSourceReplacement:
+    """Test cases for partitioned storage and replacing a republished source file's slice"""
+
+    JANUARY = 'yellow_tripdata_2025-01.parquet'
+    FEBRUARY = 'yellow_tripdata_2025-02.parquet'
+
+    def _store(self, temp_dir, trip_fact, datetime_dim, distance_dim, dims, source, csv=False):
+        vendor_dim, ratecode_dim, payment_dim, location_dim = dims
+        storer.store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim,
+                                location_dim, base_dir=temp_dir, source=source)
+        if csv:
+            storer.store_to_csv(vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, trip_fact,
+                                location_dim, base_dir=temp_dir, source=source)
+
+    def test_republished_source_replaces_its_partition(self, sample_trip_fact, temp_dir,
+        sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_distance_dim, sample_datetime_dim, sample_location_dim):
+        """Test re-storing a month swaps only its partition and keeps its key ranges"""
+        import os
+        import pandas as pd
+        import engine.reader as reader
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        self._store(temp_dir, sample_trip_fact, sample_datetime_dim, sample_distance_dim, dims, self.JANUARY, csv=True)
+        february = sample_trip_fact.assign(trip_id=sample_trip_fact['trip_id'] + 3,
+                                           datetime_key=sample_trip_fact['datetime_key'] + 2)
+        self._store(temp_dir, february, sample_datetime_dim.assign(datetime_key=[3, 4], pickup_datetime=FEBRUARY_PICKUPS),
+                    sample_distance_dim.assign(distance_key=[3, 4]), dims, self.FEBRUARY, csv=True)
+        february_file = reader.stored_table_files('trip_fact', temp_dir, periods=[(2025, 2)])[0]
+        february_mtime = os.stat(february_file).st_mtime_ns
+
+        # January republished with one trip less; the transformer numbered it after everything stored
+        january = sample_trip_fact.head(2).assign(trip_id=[7, 8], datetime_key=[5, 6])
+        self._store(temp_dir, january, sample_datetime_dim.assign(datetime_key=[5, 6]),
+                    sample_distance_dim.assign(distance_key=[5, 6]), dims, self.JANUARY, csv=True)
+
+        fact = reader.read_stored_table('trip_fact', temp_dir, arrow_dtypes=False)
+        datetime_dim = reader.read_stored_table('datetime_dim', temp_dir, arrow_dtypes=False)
+        assert sorted(fact['trip_id']) == [1, 2, 4, 5, 6]
+        assert fact['datetime_key'].isin(datetime_dim['datetime_key']).all()
+        assert os.stat(february_file).st_mtime_ns == february_mtime
+
+        manifest = storer.load_source_manifest(reader.star_schema_dir(temp_dir))
+        assert manifest[self.JANUARY]['version'] == 2
+        assert manifest[self.JANUARY]['ranges']['trip_fact'] == [1, 2]
+        january_dir = Path(storer.partition_dir('trip_fact', 2025, 1, temp_dir))
+        assert [path.name for path in january_dir.iterdir()] == ['yellow_tripdata_2025-01.v2.parquet']
+
+        # The CSV copy places the keys the same way
+        csv_fact = pd.read_csv(Path(temp_dir) / 'csv' / 'star_schema' / 'trip_fact.csv')
+        assert sorted(csv_fact['trip_id']) == [1, 2, 4, 5, 6]
+
+    def test_without_source_appends(self, sample_trip_fact, temp_dir,
+        sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_distance_dim, sample_datetime_dim, sample_location_dim):
+        """Test callers that do not name the source keep the single-file append behaviour"""
+        import pandas as pd
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        for _ in range(2):
+            self._store(temp_dir, sample_trip_fact, sample_datetime_dim, sample_distance_dim, dims, None)
+
+        fact = pd.read_parquet(Path(temp_dir) / 'parquet' / 'star_schema' / 'trip_fact.parquet')
+        assert len(fact) == 2 * len(sample_trip_fact)
+
+    def test_legacy_tables_are_migrated(self, sample_trip_fact, temp_dir,
+        sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_distance_dim, sample_datetime_dim, sample_location_dim):
+        """Test rows of known sources move from single-file tables into their partitions"""
+        import engine.reader as reader
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        self._store(temp_dir, sample_trip_fact, sample_datetime_dim, sample_distance_dim, dims, None)
+        storer.save_source_manifest(reader.star_schema_dir(temp_dir), {
+            self.JANUARY: {'trip_fact': [1, 3], 'datetime_dim': [1, 2], 'distance_dim': [1, 2]}})
+
+        february = sample_trip_fact.assign(trip_id=[4, 5, 6], datetime_key=[3, 4, 3])
+        self._store(temp_dir, february, sample_datetime_dim.assign(datetime_key=[3, 4], pickup_datetime=FEBRUARY_PICKUPS),
+                    sample_distance_dim.assign(distance_key=[3, 4]), dims, self.FEBRUARY)
+
+        assert not Path(reader.parquet_path('trip_fact', temp_dir)).exists()
+        january = reader.read_stored_table('trip_fact', temp_dir, periods=[(2025, 1)], arrow_dtypes=False)
+        assert sorted(january['trip_id']) == [1, 2, 3]
+        assert reader.stored_max_key('trip_fact', 'trip_id', temp_dir) == 6
+
+    def test_interleaved_months_get_disjoint_keys(self, sample_trip_fact, sample_datetime_dim,
+        sample_distance_dim, temp_dir):
+        """Test two months transformed against the same stored maximum commit disjoint key ranges"""
+        import engine.reader as reader
+        january = {'trip_fact': sample_trip_fact, 'datetime_dim': sample_datetime_dim,
+                   'distance_dim': sample_distance_dim}
+        # Both workers read the same stored max key (0) before either committed
+        february = {'trip_fact': sample_trip_fact.copy(), 'distance_dim': sample_distance_dim.copy(),
+                    'datetime_dim': sample_datetime_dim.assign(pickup_datetime=FEBRUARY_PICKUPS)}
+
+        storer.replace_partition(2025, 1, self.JANUARY, january, temp_dir)
+        storer.replace_partition(2025, 2, self.FEBRUARY, february, temp_dir)
+
+        manifest = reader.load_source_manifest(reader.star_schema_dir(temp_dir))
+        for table_name in ('trip_fact', 'datetime_dim', 'distance_dim'):
+            first = manifest[self.JANUARY]['ranges'][table_name]
+            second = manifest[self.FEBRUARY]['ranges'][table_name]
+            assert first[1] < second[0], table_name
+        stored = reader.read_stored_table('trip_fact', temp_dir, periods=[(2025, 2)], arrow_dtypes=False)
+        datetime_dim = reader.read_stored_table('datetime_dim', temp_dir, periods=[(2025, 2)], arrow_dtypes=False)
+        # Fact references moved along with their dimension rows
+        assert set(stored['datetime_key']) <= set(datetime_dim['datetime_key'])
+        assert sorted(stored['trip_id']) == [4, 5, 6]
+
+    def test_concurrent_csv_copy_gets_the_parquet_keys(self, sample_trip_fact, sample_datetime_dim,
+        sample_distance_dim, sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_location_dim, temp_dir):
+        """Test two months stored at once by two workers get the same keys in the CSV copy"""
+        import threading
+        import engine.reader as reader
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        # Both workers transformed against the same stored max key (0)
+        months = {self.JANUARY: (sample_trip_fact, sample_datetime_dim, sample_distance_dim),
+                  self.FEBRUARY: (sample_trip_fact.copy(), sample_datetime_dim.assign(pickup_datetime=FEBRUARY_PICKUPS),
+                                  sample_distance_dim.copy())}
+        errors = []
+        def worker(source):
+            try:
+                trip_fact, datetime_dim, distance_dim = months[source]
+                vendor_dim, ratecode_dim, payment_dim, location_dim = dims
+                entry = storer.store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_dim,
+                                                datetime_dim, location_dim, base_dir=temp_dir, source=source)
+                storer.store_to_csv(vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim, trip_fact,
+                                    location_dim, base_dir=temp_dir, source=source, partition=entry)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(source,)) for source in months]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        csv_dir = Path(temp_dir) / 'csv' / 'star_schema'
+        for table_name, key in (('trip_fact', 'trip_id'), ('datetime_dim', 'datetime_key'),
+                                ('distance_dim', 'distance_key')):
+            stored = reader.read_stored_table(table_name, temp_dir, arrow_dtypes=False)
+            csv_copy = pd.read_csv(csv_dir / f'{table_name}.csv')
+            assert sorted(csv_copy[key]) == sorted(stored[key]), table_name
+        fact = pd.read_csv(csv_dir / 'trip_fact.csv').sort_values('trip_id')
+        stored = reader.read_stored_table('trip_fact', temp_dir, arrow_dtypes=False).sort_values('trip_id')
+        # Fact references follow their dimension rows in both copies
+        assert fact['datetime_key'].tolist() == stored['datetime_key'].tolist()
+
+class TestExportTables:
+    """Test cases for exporting stored tables to other formats"""
+
+    JANUARY = 'yellow_tripdata_2025-01.parquet'
+    FEBRUARY = 'yellow_tripdata_2025-02.parquet'
+
+    def _store_two_months(self, temp_dir, trip_fact, datetime_dim, distance_dim, dims):
+        vendor_dim, ratecode_dim, payment_dim, location_dim = dims
+        storer.store_to_parquet(trip_fact, vendor_dim, ratecode_dim, payment_dim, distance_dim, datetime_dim,
+                                location_dim, base_dir=temp_dir, source=self.JANUARY)
+        storer.store_to_parquet(trip_fact.assign(trip_id=trip_fact['trip_id'] + 3,
+                                                  datetime_key=trip_fact['datetime_key'] + 2), vendor_dim, ratecode_dim,
+                                payment_dim, distance_dim.assign(distance_key=[3, 4]),
+                                datetime_dim.assign(datetime_key=[3, 4], pickup_datetime=FEBRUARY_PICKUPS), location_dim,
+                                base_dir=temp_dir, source=self.FEBRUARY)
+
+    def test_csv_only_for_requested_tables_and_months(self, sample_trip_fact, temp_dir,
+        sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_distance_dim, sample_datetime_dim, sample_location_dim):
+        """Test lazy CSV export writes just the asked-for slice, once"""
+        import pandas as pd
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        self._store_two_months(temp_dir, sample_trip_fact, sample_datetime_dim, sample_distance_dim, dims)
+
+        written = storer.export_tables(['csv'], tables=['trip_fact'], periods=[(2025, 2)], base_dir=temp_dir)
+        again = storer.export_tables(['csv'], tables=['trip_fact'], periods=[(2025, 2)], base_dir=temp_dir)
+
+        csv_dir = Path(storer.export_dir('csv', temp_dir))
+        assert [Path(path).relative_to(csv_dir).as_posix() for path in written['csv']] == \
+            ['trip_fact/year=2025/month=02/yellow_tripdata_2025-02.csv']
+        assert again == {'csv': []}
+        assert sorted(pd.read_csv(written['csv'][0])['trip_id']) == [4, 5, 6]
+
+    def test_arrow_layout_is_a_hive_dataset(self, sample_trip_fact, temp_dir,
+        sample_vendor_dim, sample_ratecode_dim, sample_payment_dim,
+        sample_distance_dim, sample_datetime_dim, sample_location_dim):
+        """Test the Arrow export can be scanned as one partitioned dataset"""
+        import pyarrow.dataset as ds
+        import engine.reader as reader
+        dims = (sample_vendor_dim, sample_ratecode_dim, sample_payment_dim, sample_location_dim)
+        self._store_two_months(temp_dir, sample_trip_fact, sample_datetime_dim, sample_distance_dim, dims)
+
+        storer.export_source(['arrow'], self.JANUARY, base_dir=temp_dir)
+        storer.export_tables(['arrow'], tables=['trip_fact'], base_dir=temp_dir)
+
+        dataset = ds.dataset(Path(storer.export_dir('arrow', temp_dir)) / 'trip_fact', format='ipc',
+                             partitioning='hive')
+        table = dataset.to_table(filter=ds.field('month') == 1)
+        assert sorted(table.column('trip_id').to_pylist()) == [1, 2, 3]
+        assert dataset.count_rows() == 6
+        assert Path(storer.export_dir('arrow', temp_dir), 'vendor_dim.arrow').exists()
+        # The export never replaces the dimension copy the reader memory-maps
+        assert Path(storer.export_dir('arrow', temp_dir), 'vendor_dim.arrow') != \
+            Path(reader.arrow_path('vendor_dim', temp_dir))
+
+    def test_unknown_format(self, temp_dir):
+        """Test unknown formats are rejected"""
+        import pytest
+        with pytest.raises(ValueError):
+            storer.export_tables(['xlsx'], base_dir=temp_dir)
+
+    def test_month_range(self):
+        """Test month ranges cross year boundaries"""
+        assert storer.month_range((2024, 11), (2025, 2)) == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+
+class TestPickupRouting:
+    """Test cases for routing trip rows to the partition of their pickup month"""
+
+    JANUARY = 'yellow_tripdata_2025-01.parquet'
+
+    def _tables(self):
+        pickups = pd.to_datetime(['2025-01-05 10:00', '2024-12-31 23:50', '2002-01-01 00:00',
+                                  '2025-01-20 08:00', '2098-05-01 12:00', None])
+        datetime_dim = pd.DataFrame({'datetime_key': range(1, 7), 'pickup_datetime': pickups})
+        # Facts refer to their trip's datetime row in a different order
+        trip_fact = pd.DataFrame({'trip_id': range(1, 7), 'datetime_key': [6, 5, 4, 3, 2, 1],
+                                  'fare_amount': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+        distance_dim = pd.DataFrame({'distance_key': [1], 'trip_distance': [1.5]})
+        return {'trip_fact': trip_fact, 'datetime_dim': datetime_dim, 'distance_dim': distance_dim}
+
+    def test_split_by_pickup_month(self, temp_dir):
+        """Test stragglers go to their own month and impossible dates to quarantine"""
+        import engine.reader as reader
+        entry = storer.replace_partition(2025, 1, self.JANUARY, self._tables(), temp_dir)
+
+        assert sorted(entry['files']['trip_fact']) == ['2024-12', '2025-01', 'quarantine']
+        assert list(entry['files']['distance_dim']) == ['2025-01']
+        january = reader.read_stored_table('trip_fact', temp_dir, periods=[(2025, 1)], arrow_dtypes=False)
+        december = reader.read_stored_table('trip_fact', temp_dir, periods=[(2024, 12)], arrow_dtypes=False)
+        everything = reader.read_stored_table('trip_fact', temp_dir, arrow_dtypes=False)
+        assert january['trip_id'].tolist() == [3, 6]
+        assert december['trip_id'].tolist() == [5]
+        assert sorted(everything['trip_id']) == [1, 2, 3, 4, 5, 6]
+        assert Path(storer.quarantine_dir('trip_fact', temp_dir), 'yellow_tripdata_2025-01.v1.parquet').exists()
+        december_dim = reader.read_stored_table('datetime_dim', temp_dir, periods=[(2024, 12)], arrow_dtypes=False)
+        assert december_dim['datetime_key'].tolist() == [2]
+
+    def test_republish_drops_old_partitions(self, temp_dir):
+        """Test a republished month without stragglers leaves no files or exports behind"""
+        import engine.reader as reader
+        storer.replace_partition(2025, 1, self.JANUARY, self._tables(), temp_dir)
+        storer.export_source(['arrow'], self.JANUARY, base_dir=temp_dir)
+        december_export = Path(storer.export_dir('arrow', temp_dir), 'trip_fact', 'year=2024', 'month=12',
+                               'yellow_tripdata_2025-01.arrow')
+        assert december_export.exists()
+
+        tables = self._tables()
+        tables['datetime_dim']['pickup_datetime'] = pd.Timestamp('2025-01-10 09:00')
+        storer.replace_partition(2025, 1, self.JANUARY, tables, temp_dir)
+        storer.export_source(['arrow'], self.JANUARY, base_dir=temp_dir)
+
+        assert reader.stored_table_files('trip_fact', temp_dir, periods=[(2024, 12)]) == []
+        assert len(reader.stored_table_files('trip_fact', temp_dir)) == 1
+        assert not december_export.exists()
+
+    def test_split_partitions_keeps_row_order(self):
+        """Test the group-by split is stable within a partition"""
+        df = pd.DataFrame({'value': range(6)})
+        parts = storer.split_partitions(df, [3, 1, 3, -1, 1, 3])
+
+        assert {code: part['value'].tolist() for code, part in parts.items()} == \
+            {-1: [3], 1: [1, 4], 3: [0, 2, 5]}
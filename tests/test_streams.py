@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from engine import streams
+
+class TestPrefetch:
+    """Test cases for reading an iterable ahead in a reader thread"""
+
+    def test_items_in_order(self):
+        """Test that every item arrives once and in order, also inline"""
+        assert list(streams.prefetch(range(100), depth=2)) == list(range(100))
+        assert list(streams.prefetch(range(5), depth=0)) == list(range(5))
+
+    def test_reader_error_raised_in_consumer(self):
+        """Test that the reader's exception reaches the consumer after the items before it"""
+        def failing():
+            yield 1
+            raise ValueError("corrupt row group")
+
+        received = []
+        with pytest.raises(ValueError, match="corrupt row group"):
+            for item in streams.prefetch(failing()):
+                received.append(item)
+
+        assert received == [1]
+
+    def test_backpressure_and_early_stop(self):
+        """Test that the reader stays at most depth items ahead and stops when the consumer does"""
+        produced = []
+        def source():
+            for i in range(1000):
+                produced.append(i)
+                yield i
+
+        items = streams.prefetch(source(), depth=2)
+        assert next(items) == 0
+        time.sleep(0.2)
+        # One handed out, two queued and one waiting to be queued
+        assert len(produced) <= 4
+        items.close()
+
+        assert len(produced) <= 4
+        assert not any(thread.name == 'prefetch' for thread in threading.enumerate())
+
+class TestWriteBehind:
+    """Test cases for writer threads fed through bounded queues"""
+
+    def test_writes_per_sink(self):
+        """Test that every sink gets its own writes and all are done when the block exits"""
+        written = {'arrow': [], 'csv': []}
+        sinks = {fmt: written[fmt].append for fmt in written}
+
+        with streams.WriteBehind(sinks, depth=1) as writer:
+            for i in range(20):
+                writer.submit('arrow', i)
+                writer.submit('csv', -i)
+
+        assert written['arrow'] == list(range(20))
+        assert written['csv'] == [-i for i in range(20)]
+
+    def test_write_error_raised_on_exit(self):
+        """Test that a failed write is raised and the writes queued after it are dropped"""
+        written = []
+        def write(i):
+            if i == 3:
+                raise OSError("disk full")
+            written.append(i)
+
+        with pytest.raises(OSError, match="disk full"):
+            with streams.WriteBehind({'parquet': write}, depth=2) as writer:
+                for i in range(10):
+                    writer.submit('parquet', i)
+
+        assert written == [0, 1, 2]
@@ -1,5 +1,6 @@
 import pandas as pd
 import engine.transformer as transformer
+import engine.cleaner as cleaner
 
 class TestVendorCreation:
     """Test cases for vendor_creation function"""
@@ -16,6 +17,25 @@ class TestVendorCreation:
         # Check for unique vendor keys 
         assert result['vendor_key'].nunique() == len(result)
 
+    def test_keys_survive_other_fleets(self, temp_dir):
+        """Test a yellow month's vendor keys still resolve after an FHV month stored the dimension"""
+        import engine.reader as reader
+        from engine.storer import store_to_parquet
+        yellow = pd.DataFrame({'vendor_id': [2, 1, 2]})
+        fhv = pd.DataFrame({'vendor_id': [103, 2, 105]})
+        empty = pd.DataFrame()
+
+        january = transformer.vendor_creation(yellow, base_dir=temp_dir)
+        store_to_parquet(empty, january, empty, empty, empty, empty, empty, base_dir=temp_dir, append_mode=False)
+        february = transformer.vendor_creation(fhv, base_dir=temp_dir)
+        store_to_parquet(empty, february, empty, empty, empty, empty, empty, base_dir=temp_dir, append_mode=False)
+
+        stored = reader.read_stored_table('vendor_dim', temp_dir, arrow_dtypes=False)
+        january_keys = dict(zip(january['vendor_key'], january['vendor_id']))
+        assert dict(zip(stored['vendor_key'], stored['vendor_id'])).items() >= january_keys.items()
+        assert stored.set_index('vendor_id').loc[103, 'vendor_name'] == 'Uber'
+        assert stored['vendor_key'].is_unique and len(stored) == 4
+
 class TestDatetimeCreation:
     """Test cases for datetime_creation function"""
     
@@ -152,4 +172,34 @@ class TestTripFactCreation:
         assert isinstance(result, pd.DataFrame)
         # Check for unique primary keys
         assert result['trip_id'].nunique() == len(result)
-        assert len(result) > 0
\ No newline at end of file
+        assert len(result) > 0
+
+    def test_trip_fact_keeps_cleaner_measures(self, sample_trip_data, sample_location_data):
+        """Test duration_sec and avg_mph from the cleaner are carried into the fact"""
+        df = cleaner.clean_trip_duration(sample_trip_data)
+        location_dim = transformer.location_creation(sample_location_data)
+
+        result = transformer.trip_fact_creation(
+            df, transformer.datetime_creation(df), transformer.vendor_creation(df),
+            transformer.ratecode_creation(df), transformer.payment_creation(df),
+            transformer.distance_creation(df), location_dim
+        )
+
+        assert result['duration_sec'].tolist() == df['duration_sec'].tolist()
+        assert str(result['avg_mph'].dtype) == 'float32'
+
+class TestVectorizedHelpers:
+    """Test cases for the vectorized is_holiday and distance_category helpers"""
+
+    def test_holiday_flags_match_scalar(self):
+        """Test holiday_flags agrees with is_holiday row by row"""
+        datetimes = pd.Series(pd.date_range('2024-12-20', '2025-01-05 23:00', freq='7h'))
+        expected = datetimes.apply(transformer.is_holiday)
+        assert (transformer.holiday_flags(datetimes) == expected).all()
+        assert transformer.holiday_flags(datetimes).any()
+
+    def test_distance_categories_match_scalar(self):
+        """Test distance_categories agrees with distance_category, NaN included"""
+        distances = pd.Series([0.0, 2.0, 2.01, 6.0, 6.5, float('nan')])
+        expected = distances.apply(transformer.distance_category)
+        assert transformer.distance_categories(distances).tolist() == expected.tolist()
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+import engine.zones as zones
+
+ZONE_CSV = b"LocationID,Borough,Zone,service_zone\n1,EWR,Newark Airport,EWR\n2,Queens,Jamaica Bay,Boro Zone\n"
+
+class TestSyncZoneLookup:
+    """Test cases for sync_zone_lookup function"""
+
+    def test_sync_downloads_then_uses_cache(self, temp_dir):
+        """Test first sync downloads and stores a hashed version, later syncs hit the cache"""
+        with patch('engine.zones._download_zone_lookup',
+                   return_value=(200, ZONE_CSV, {'ETag': '"abc"'})) as mock_download:
+            path, meta = zones.sync_zone_lookup(temp_dir)
+            zones.sync_zone_lookup(temp_dir)
+
+        assert mock_download.call_count == 1
+        assert meta['version'] == 1
+        assert meta['etag'] == '"abc"'
+        with open(path, 'rb') as f:
+            assert f.read() == ZONE_CSV
+
+    def test_sync_revalidates_with_conditional_request(self, temp_dir):
+        """Test a forced revalidation sends the stored ETag and keeps the version on 304"""
+        with patch('engine.zones._download_zone_lookup', return_value=(200, ZONE_CSV, {'ETag': '"abc"'})):
+            zones.sync_zone_lookup(temp_dir)
+        with patch('engine.zones._download_zone_lookup', return_value=(304, b'', {})) as mock_download:
+            path, meta = zones.sync_zone_lookup(temp_dir, force=True)
+
+        assert mock_download.call_args[0][0]['etag'] == '"abc"'
+        assert meta['version'] == 1
+
+    def test_sync_falls_back_to_cache_when_offline(self, temp_dir):
+        """Test network failures reuse the cached copy"""
+        with patch('engine.zones._download_zone_lookup', return_value=(200, ZONE_CSV, {})):
+            zones.sync_zone_lookup(temp_dir)
+        with patch('engine.zones._download_zone_lookup', side_effect=ConnectionError("offline")):
+            path, meta = zones.sync_zone_lookup(temp_dir, force=True)
+
+        assert os.path.exists(path)
+        assert meta['version'] == 1
+
+    def test_download_uses_shared_session(self):
+        """Test the conditional GET goes through the fetcher's process-wide session"""
+        session = MagicMock()
+        session.get.return_value.status_code = 304
+        with patch('engine.fetcher.get_session', return_value=session):
+            status, _, _ = zones._download_zone_lookup({'etag': '"abc"'})
+
+        assert status == 304
+        session.get.assert_called_once_with(zones.ZONE_LOOKUP_URL, headers={'If-None-Match': '"abc"'}, timeout=30)
+
+    def test_sync_without_cache_raises_when_offline(self, temp_dir):
+        """Test network failures without a cached copy are raised"""
+        with patch('engine.zones._download_zone_lookup', side_effect=ConnectionError("offline")):
+            with pytest.raises(ConnectionError):
+                zones.sync_zone_lookup(temp_dir)
+
+class TestLocationIndex:
+    """Test cases for LocationIndex"""
+
+    def test_keys_match_location_dim(self, sample_location_dim):
+        """Test vectorized id -> key/borough lookups"""
+        index = zones.build_location_index(sample_location_dim)
+
+        assert list(index.keys([2, 1, 2])) == [2, 1, 2]
+        assert list(index.boroughs([1, 2])) == ['Manhattan', 'Brooklyn']
+        assert len(index) == 2
+
+    def test_unknown_ids_are_nan(self, sample_location_dim):
+        """Test ids missing from the lookup behave like a left merge"""
+        index = zones.build_location_index(sample_location_dim)
+        keys = index.keys([1, 7, np.nan])
+
+        assert keys[0] == 1
+        assert np.isnan(keys[1]) and np.isnan(keys[2])
+
+    def test_index_is_read_only(self, sample_location_dim):
+        """Test the shared index cannot be modified in place"""
+        index = zones.build_location_index(sample_location_dim)
+        with pytest.raises(ValueError):
+            index.location_key[1] = 5
+
+    def test_index_shared_per_lookup_version(self, sample_location_dim, temp_dir):
+        """Test location dimensions built from the same lookup share one index, other frames do not"""
+        from engine.transformer import location_creation
+        with patch('engine.zones._download_zone_lookup', return_value=(200, ZONE_CSV, {})):
+            january = location_creation(zones.load_zone_lookup(temp_dir)[0])
+            february = location_creation(zones.load_zone_lookup(temp_dir)[0])
+
+        index = zones.get_location_index(january)
+        assert zones.get_location_index(february) is index
+        assert list(index.zones([2, 1])) == ['Jamaica Bay', 'Newark Airport']
+        assert zones.get_location_index(sample_location_dim) is not index